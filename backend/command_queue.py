@@ -0,0 +1,262 @@
+"""
+Geräte-Commands (hardware_commands): einreihen, abholen, nachliefern
+Ein Command wird genau einmal ausgeliefert: das Abholen ist ein einziges
+UPDATE ... SET status = 'sent' ... RETURNING (SQLite >= 3.35, gleiche Syntax wie
+Postgres). Zwei Worker oder ein wiederholter Modem-Request können dieselbe Zeile
+nicht beide von 'queued' auf 'sent' setzen. Eine leere Queue (der Normalfall)
+wird vorher per Lesezugriff erkannt, ohne Schreibsperre. Ältere SQLite-Versionen
+setzen jede Zeile einzeln mit Bedingung status = 'queued' um; geprüft mit
+backend/scripts/check_command_claim.py.
+
+Lebenszyklus: queued -> sent -> done (ack). Jedes Command läuft nach expires_at
+ab (expired), ein Gerät, das tagelang offline war, bewegt die Schranke also
+nicht Stunden zu spät. Ohne ack wird ein gesendetes Command mit exponentiellem
+Backoff erneut eingereiht, nach COMMAND_MAX_ATTEMPTS Zustellungen landet es in
+'dead'. Der Sweeper arbeitet nur über partielle Indizes auf den Zeitstempeln.
+
+Jedes Command trägt eine pro Gerät fortlaufende seq. Ein Gerät bestätigt mit
+einem Request mehrere Commands (ack_batch: Liste von IDs und/oder "alles bis
+seq N"), umgesetzt als ein einziges UPDATE.
+
+Fan-out: ein Command an viele Geräte (Liste, alle eines Owners, alle auf
+bestimmten Plätzen) ist ein Job in command_jobs. Die Zeilen entstehen mit einem
+executemany in einer Transaktion und tragen die job_id; der Job-Status ist der
+Status dieser Zeilen pro Gerät.
+"""
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Lifetime of a command unless the caller sets one; a barrier move is stale after minutes
+COMMAND_DEFAULT_TTL_SECONDS = float(os.getenv("COMMAND_DEFAULT_TTL_SECONDS", "300"))
+# Unacked "sent" commands are queued again after base * 2^(attempts-1), capped
+COMMAND_REDELIVERY_BASE_SECONDS = float(os.getenv("COMMAND_REDELIVERY_BASE_SECONDS", "30"))
+COMMAND_REDELIVERY_MAX_SECONDS = float(os.getenv("COMMAND_REDELIVERY_MAX_SECONDS", "600"))
+COMMAND_MAX_ATTEMPTS = int(os.getenv("COMMAND_MAX_ATTEMPTS", "5"))
+COMMAND_SWEEP_INTERVAL_SECONDS = float(os.getenv("COMMAND_SWEEP_INTERVAL_SECONDS", "15"))
+COMMAND_SWEEP_BATCH = 500
+# Upper bound of ids per batch ack (one SQL variable each)
+COMMAND_ACK_MAX_IDS = 100
+COMMAND_FANOUT_MAX_DEVICES = int(os.getenv("COMMAND_FANOUT_MAX_DEVICES", "5000"))
+# SQL variables per IN (...) when resolving fan-out targets (old SQLite: 999 max)
+_IN_CHUNK = 500
+
+# Statements as run below; backend/hot_queries.py checks the plans of these same strings
+
+# max(seq) is read inside the INSERT, i.e. under the write lock
+INSERT_SQL = '''
+    INSERT INTO hardware_commands (hardware_id, command, parameters, issued_by, expires_at, seq, job_id)
+    VALUES (?, ?, ?, ?, ?, (SELECT coalesce(max(seq), 0) + 1 FROM hardware_commands WHERE hardware_id = ?), ?)
+'''
+ANY_QUEUED_SQL = "SELECT 1 FROM hardware_commands WHERE hardware_id = ? AND status = 'queued' LIMIT 1"
+# attempts on the right-hand side is the value before this claim
+_MARK_SENT = '''
+    UPDATE hardware_commands SET status = 'sent', claimed_at = ?, attempts = attempts + 1,
+        next_attempt_at = ? + min(?, ? * (1 << attempts))
+'''
+CLAIM_SQL = _MARK_SENT + '''
+    WHERE hardware_id = ? AND status = 'queued' AND (expires_at IS NULL OR expires_at > ?)
+    RETURNING id, command, parameters, created_at, seq
+'''
+CLAIM_SELECT_SQL = '''
+    SELECT id, command, parameters, created_at, seq FROM hardware_commands
+    WHERE hardware_id = ? AND status = 'queued' AND (expires_at IS NULL OR expires_at > ?)
+    ORDER BY created_at ASC
+'''
+CLAIM_ROW_SQL = _MARK_SENT + "WHERE id = ? AND status = 'queued'"
+EXPIRE_SQL = '''
+    UPDATE hardware_commands SET status = 'expired'
+    WHERE id IN (
+        SELECT id FROM hardware_commands
+        WHERE status = 'queued' AND expires_at <= ? ORDER BY expires_at LIMIT ?
+    )
+'''
+_REDELIVER_OUTCOME = '''CASE
+        WHEN expires_at IS NOT NULL AND expires_at <= ? THEN 'expired'
+        WHEN attempts >= ? THEN 'dead'
+        ELSE 'queued' END'''
+_REDELIVER_DUE = "SELECT id FROM hardware_commands WHERE status = 'sent' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?"
+REDELIVER_SQL = (f"UPDATE hardware_commands SET status = {_REDELIVER_OUTCOME} WHERE id IN ({_REDELIVER_DUE}) "
+                 "RETURNING id, hardware_id, status")
+REDELIVER_SELECT_SQL = f"SELECT id, hardware_id, {_REDELIVER_OUTCOME} FROM hardware_commands WHERE id IN ({_REDELIVER_DUE})"
+TARGETS_BY_OWNER_SQL = "SELECT hardware_id FROM hardware_devices WHERE owner_email = ?"
+INSERT_JOB_SQL = '''
+    INSERT INTO command_jobs (command, parameters, target, devices, issued_by, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+JOB_SQL = "SELECT command, parameters, target, devices, created_at FROM command_jobs WHERE id = ?"
+JOB_COMMANDS_SQL = '''
+    SELECT hardware_id, id, seq, status, attempts, claimed_at, executed_at FROM hardware_commands
+    WHERE job_id = ? ORDER BY hardware_id
+'''
+
+
+def ack_sql(ids: int, watermark: bool) -> str:
+    """Batch ack for ``ids`` listed ids and/or a seq watermark (one UPDATE)."""
+    terms = ([f"id IN ({','.join('?' * ids)})"] if ids else []) + (["seq <= ?"] if watermark else [])
+    return f'''
+        UPDATE hardware_commands SET status = 'done', executed_at = ?
+        WHERE hardware_id = ? AND status IN ('queued', 'sent') AND attempts > 0 AND ({' OR '.join(terms)})
+    '''
+
+
+def targets_sql(column: str, n: int) -> str:
+    """Registered devices by ``hardware_id`` or ``parking_spot_id`` IN (n values)."""
+    return f"SELECT hardware_id FROM hardware_devices WHERE {column} IN ({','.join('?' * n)})"
+
+
+def enqueue(cursor, hardware_id: str, command: str, parameters=None, issued_by: Optional[str] = None,
+            ttl_seconds: Optional[float] = None, now: Optional[float] = None) -> Tuple[int, int]:
+    """Queue one command; it expires ``ttl_seconds`` (default COMMAND_DEFAULT_TTL_SECONDS) from now.
+
+    Returns ``(id, seq)``; seq is the next number of the device (idx_hardware_commands_seq).
+    """
+    now = time.time() if now is None else now
+    ttl = COMMAND_DEFAULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    cursor.execute(INSERT_SQL, (hardware_id, command, json.dumps(parameters) if parameters is not None else None,
+                                issued_by, now + ttl, hardware_id, None))
+    cmd_id = cursor.lastrowid
+    cursor.execute("SELECT seq FROM hardware_commands WHERE id = ?", (cmd_id,))
+    return cmd_id, cursor.fetchone()[0]
+
+
+def _command(row) -> dict:
+    cmd_id, command, parameters, created_at, seq = row
+    params = None
+    if parameters:
+        try:
+            params = json.loads(parameters)
+        except Exception:
+            params = parameters
+    return {"id": cmd_id, "seq": seq, "command": command, "parameters": params, "created_at": created_at}
+
+
+def claim(cursor, hardware_id: str, now: Optional[datetime] = None, returning: bool = HAS_RETURNING) -> List[dict]:
+    """Mark every live queued command of the device as sent and return them, oldest first.
+
+    Each claim counts as a delivery attempt and arms the redelivery deadline.
+    """
+    now = now or datetime.now()
+    claimed_at, epoch = now.isoformat(), now.timestamp()
+    # Nearly every poll finds nothing: answer that from the covering index without
+    # taking the write lock (an UPDATE does even when it matches no row)
+    cursor.execute(ANY_QUEUED_SQL, (hardware_id,))
+    if cursor.fetchone() is None:
+        return []
+    backoff = (claimed_at, epoch, COMMAND_REDELIVERY_MAX_SECONDS, COMMAND_REDELIVERY_BASE_SECONDS)
+    if returning:
+        cursor.execute(CLAIM_SQL, (*backoff, hardware_id, epoch))
+        rows = cursor.fetchall()
+    else:
+        cursor.execute(CLAIM_SELECT_SQL, (hardware_id, epoch))
+        rows = []
+        for row in cursor.fetchall():
+            # Conditional per row: whoever flips it first owns it
+            cursor.execute(CLAIM_ROW_SQL, (*backoff, row[0]))
+            if cursor.rowcount == 1:
+                rows.append(row)
+    # RETURNING has no defined order
+    rows.sort(key=lambda r: (r[3] or "", r[0]))
+    return [_command(r) for r in rows]
+
+
+def ack_batch(cursor, hardware_id: str, ids=(), up_to_seq: Optional[int] = None,
+              now: Optional[datetime] = None) -> int:
+    """Mark the listed ids and/or every command with seq <= up_to_seq done, in one UPDATE.
+
+    Only commands still in flight and delivered at least once are touched, so a
+    watermark never acks something the device has not seen. Returns the row count.
+    """
+    ids = list(ids or ())
+    if not ids and up_to_seq is None:
+        return 0
+    params = ids + ([up_to_seq] if up_to_seq is not None else [])
+    cursor.execute(ack_sql(len(ids), up_to_seq is not None), (now or datetime.now(), hardware_id, *params))
+    return cursor.rowcount
+
+
+def expire_batch(cursor, now: Optional[float] = None, batch: int = COMMAND_SWEEP_BATCH) -> int:
+    """Queued commands past expires_at -> 'expired' (idx_hardware_commands_expiry)."""
+    cursor.execute(EXPIRE_SQL, (time.time() if now is None else now, batch))
+    return cursor.rowcount
+
+
+def redeliver_batch(cursor, now: Optional[float] = None, batch: int = COMMAND_SWEEP_BATCH) -> List[Tuple[int, str, str]]:
+    """Sent commands whose ack deadline passed (idx_hardware_commands_redelivery):
+    back to 'queued', or 'expired' / 'dead' (COMMAND_MAX_ATTEMPTS deliveries).
+    Returns ``(id, hardware_id, new status)`` of every command moved."""
+    now = time.time() if now is None else now
+    if HAS_RETURNING:
+        cursor.execute(REDELIVER_SQL, (now, COMMAND_MAX_ATTEMPTS, now, batch))
+        return cursor.fetchall()
+    cursor.execute(REDELIVER_SELECT_SQL, (now, COMMAND_MAX_ATTEMPTS, now, batch))
+    rows = cursor.fetchall()
+    # An ack may land in between; it wins
+    cursor.executemany("UPDATE hardware_commands SET status = ? WHERE id = ? AND status = 'sent'",
+                       [(status, cmd_id) for cmd_id, _, status in rows])
+    return rows
+
+
+def fan_out_targets(cursor, hardware_ids=None, owner_email: Optional[str] = None, spot_ids=None) -> List[str]:
+    """Registered devices selected by one of: ids, owner, spots (sorted, unique)."""
+    if owner_email is not None:
+        cursor.execute(TARGETS_BY_OWNER_SQL, (owner_email,))
+        return sorted(r[0] for r in cursor.fetchall())
+    column, values = ("hardware_id", hardware_ids) if hardware_ids is not None else ("parking_spot_id", spot_ids)
+    values = list(dict.fromkeys(values or ()))
+    found = set()
+    for i in range(0, len(values), _IN_CHUNK):
+        chunk = values[i:i + _IN_CHUNK]
+        cursor.execute(targets_sql(column, len(chunk)), chunk)
+        found.update(r[0] for r in cursor.fetchall())
+    return sorted(found)
+
+
+def fan_out(cursor, hardware_ids: List[str], command: str, parameters=None, issued_by: Optional[str] = None,
+            ttl_seconds: Optional[float] = None, target=None, now: Optional[float] = None) -> int:
+    """Create a job and queue the command for every device with one executemany.
+
+    Runs in the caller's transaction: the job appears with all its commands or
+    not at all. Returns the job id.
+    """
+    now = time.time() if now is None else now
+    ttl = COMMAND_DEFAULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    params = json.dumps(parameters) if parameters is not None else None
+    cursor.execute(INSERT_JOB_SQL, (command, params, json.dumps(target) if target is not None else None,
+                                    len(hardware_ids), issued_by, now))
+    job_id = cursor.lastrowid
+    cursor.executemany(INSERT_SQL, [(hw, command, params, issued_by, now + ttl, hw, job_id) for hw in hardware_ids])
+    return job_id
+
+
+def job_status(cursor, job_id: int) -> Optional[dict]:
+    """The job and the delivery status of its command on every device (idx_hardware_commands_job)."""
+    cursor.execute(JOB_SQL, (job_id,))
+    job = cursor.fetchone()
+    if job is None:
+        return None
+    command, parameters, target, devices, created_at = job
+    cursor.execute(JOB_COMMANDS_SQL, (job_id,))
+    rows = cursor.fetchall()
+    summary = {}
+    for row in rows:
+        summary[row[3]] = summary.get(row[3], 0) + 1
+    return {
+        "job_id": job_id,
+        "command": command,
+        "parameters": json.loads(parameters) if parameters else None,
+        "target": json.loads(target) if target else None,
+        "created_at": datetime.fromtimestamp(created_at).isoformat(),
+        "devices": devices,
+        "summary": summary,
+        "commands": [
+            {"hardware_id": hw, "id": cmd_id, "seq": seq, "status": status, "attempts": attempts,
+             "claimed_at": claimed_at, "executed_at": executed_at}
+            for hw, cmd_id, seq, status, attempts, claimed_at, executed_at in rows
+        ],
+    }
@@ -0,0 +1,92 @@
+"""
+Long-Polling für Geräte-Commands
+Ein GET /hardware/{id}/commands?wait=<s> ohne wartende Commands parkt auf einem
+asyncio.Event pro Anfrage statt sofort leer zu antworten. queue_hardware_command
+weckt die Wartenden des Geräts direkt; Commands, die ein anderer Worker (oder ein
+Hintergrund-Job) eingereiht hat, findet ein Watch-Task über die neuen
+hardware_commands-IDs. Die Zahl der Wartenden ist begrenzt (gesamt und pro
+Gerät); darüber hinaus wird wie bisher sofort geantwortet.
+"""
+import asyncio
+import os
+from typing import Dict, Optional, Set
+
+# Upper bound of ?wait=; stays below typical proxy read timeouts (nginx: 60 s)
+COMMAND_LONGPOLL_MAX_WAIT_SECONDS = float(os.getenv("COMMAND_LONGPOLL_MAX_WAIT_SECONDS", "25"))
+COMMAND_LONGPOLL_MAX_WAITERS = int(os.getenv("COMMAND_LONGPOLL_MAX_WAITERS", "10000"))
+# How often each worker looks for commands queued elsewhere
+COMMAND_LONGPOLL_WATCH_INTERVAL_MS = int(os.getenv("COMMAND_LONGPOLL_WATCH_INTERVAL_MS", "500"))
+# A device reconnecting before its old request timed out briefly has two
+COMMAND_LONGPOLL_MAX_PER_DEVICE = 2
+
+
+class CommandWaiters:
+    """Parked long-poll requests per device; only touched from the event loop."""
+
+    def __init__(self, max_waiters: int = COMMAND_LONGPOLL_MAX_WAITERS,
+                 max_per_device: int = COMMAND_LONGPOLL_MAX_PER_DEVICE):
+        self.max_waiters = max_waiters
+        self.max_per_device = max_per_device
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+        self._count = 0
+        self._peak = 0
+        self._woken = 0
+        self._timeouts = 0
+        self._rejected = 0
+        self._notified = 0
+        self.closing = False
+
+    def acquire(self, hardware_id: str) -> Optional[asyncio.Event]:
+        """Register a waiter, or None when a limit is reached (caller answers right away)."""
+        events = self._waiters.get(hardware_id)
+        if self._count >= self.max_waiters or (events and len(events) >= self.max_per_device):
+            self._rejected += 1
+            return None
+        event = asyncio.Event()
+        self._waiters.setdefault(hardware_id, set()).add(event)
+        self._count += 1
+        self._peak = max(self._peak, self._count)
+        return event
+
+    def release(self, hardware_id: str, event: asyncio.Event, woken: bool):
+        events = self._waiters.get(hardware_id)
+        if events is None or event not in events:
+            return
+        events.discard(event)
+        if not events:
+            del self._waiters[hardware_id]
+        self._count -= 1
+        if woken:
+            self._woken += 1
+        else:
+            self._timeouts += 1
+
+    def notify(self, hardware_id: str) -> int:
+        """Wake every request parked for the device; returns how many there were."""
+        events = self._waiters.get(hardware_id)
+        if not events:
+            return 0
+        for event in events:
+            event.set()
+        self._notified += 1
+        return len(events)
+
+    def wake_all(self):
+        """Shutdown: let every parked request answer now."""
+        self.closing = True
+        for events in self._waiters.values():
+            for event in events:
+                event.set()
+
+    def stats(self) -> dict:
+        return {
+            "waiting": self._count,
+            "devices": len(self._waiters),
+            "peak": self._peak,
+            "max_waiters": self.max_waiters,
+            "max_per_device": self.max_per_device,
+            "woken": self._woken,
+            "timeouts": self._timeouts,
+            "rejected": self._rejected,
+            "notifications": self._notified,
+        }
@@ -0,0 +1,136 @@
+"""
+Gebundener Thread-Executor für blockierende DB-Arbeit
+Die async-Endpunkte in server_gashis führen sqlite3-/SQLAlchemy-Aufrufe und
+bcrypt nicht mehr direkt auf dem Event-Loop aus, sondern über diesen Executor.
+Die Anzahl wartender Jobs ist begrenzt (Backpressure statt unbeschränkter
+Queue) und wird als Metrik exportiert.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+DB_EXECUTOR_MAX_PENDING = int(os.getenv("DB_EXECUTOR_MAX_PENDING", "256"))
+
+# Optional Prometheus gauges (prometheus_client kommt mit dem Instrumentator)
+try:
+    from prometheus_client import Counter, Gauge  # type: ignore
+    _QUEUE_DEPTH = Gauge("db_executor_queue_depth", "DB jobs submitted but not yet started")
+    _RUNNING = Gauge("db_executor_running", "DB jobs currently executing")
+    _COMPLETED = Counter("db_executor_completed", "DB jobs finished (success or error)")
+except Exception:
+    _QUEUE_DEPTH = _RUNNING = _COMPLETED = None
+
+
+class DBExecutor:
+    """Dedicated thread pool for blocking database calls.
+
+    ``await executor.run(fn, *args)`` runs ``fn`` on one of ``workers`` threads.
+    At most ``max_pending`` jobs may be queued or running at once; further
+    callers wait on the event loop until a slot frees up.
+    """
+
+    def __init__(self, workers: int = DB_EXECUTOR_WORKERS, max_pending: int = DB_EXECUTOR_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max(max_pending, workers)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        self._lock = threading.Lock()
+        self._slots = None
+        self._slots_loop = None
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._errors = 0
+        self._waiting_for_slot = 0
+        self._max_queued = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives are bound to one loop; recreate if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._slots_loop = loop
+        return self._slots
+
+    def _call(self, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        if _QUEUE_DEPTH is not None:
+            _QUEUE_DEPTH.dec()
+            _RUNNING.inc()
+        try:
+            return fn(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+            if _RUNNING is not None:
+                _RUNNING.dec()
+                _COMPLETED.inc()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the DB thread pool and await the result."""
+        slots = self._semaphore()
+        self._waiting_for_slot += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting_for_slot -= 1
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        if _QUEUE_DEPTH is not None:
+            _QUEUE_DEPTH.inc()
+        try:
+            future = self._pool.submit(self._call, fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            if _QUEUE_DEPTH is not None:
+                _QUEUE_DEPTH.dec()
+            slots.release()
+            raise
+        # The slot belongs to the job, not to this caller: a cancelled caller
+        # (client gone) must not free it while the thread is still working
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: self._release(loop, slots))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Job never started: undo the queue accounting done for it
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+                if _QUEUE_DEPTH is not None:
+                    _QUEUE_DEPTH.dec()
+            raise
+
+    @staticmethod
+    def _release(loop, slots):
+        # Runs on the worker thread (or here, if cancelled before it started)
+        try:
+            loop.call_soon_threadsafe(slots.release)
+        except RuntimeError:
+            pass  # loop already closed (shutdown), nobody waits for the slot
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "waiting_for_slot": self._waiting_for_slot,
+                "max_queue_depth_seen": self._max_queued,
+                "completed": self._completed,
+                "errors": self._errors,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
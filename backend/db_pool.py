@@ -0,0 +1,118 @@
+"""
+SQLite-Verbindungspool für server_gashis
+Hält pro Thread eine langlebige Verbindung offen (WAL, synchronous=NORMAL,
+grosser Page-Cache, mmap), statt bei jedem Request neu zu verbinden.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "16384"))  # 16 MiB Page-Cache pro Verbindung
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+class SQLitePool:
+    """Per-thread connection pool for a single SQLite file.
+
+    Every thread gets exactly one connection, opened lazily on first use and
+    kept for the lifetime of the process. ``connection()`` hands it out as a
+    unit of work: commit on success, rollback on error. Nested ``connection()``
+    blocks on the same thread share the outer transaction.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._opened = 0
+        self._checkouts = 0
+        self._commits = 0
+        self._rollbacks = 0
+        self._created_at = time.time()
+
+    def _open(self) -> sqlite3.Connection:
+        # check_same_thread=False only so close_all() may close connections
+        # owned by other threads at shutdown; normal use stays thread-local.
+        conn = sqlite3.connect(
+            self.path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+            check_same_thread=False,
+            cached_statements=SQLITE_STATEMENT_CACHE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        with self._lock:
+            self._connections.append(conn)
+            self._opened += 1
+        return conn
+
+    def _get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Yield this thread's connection as one transaction."""
+        conn = self._get()
+        outer = self._local.depth == 0
+        self._local.depth += 1
+        with self._lock:
+            self._checkouts += 1
+        try:
+            yield conn
+            if outer:
+                conn.commit()
+                with self._lock:
+                    self._commits += 1
+        except BaseException:
+            if outer:
+                conn.rollback()
+                with self._lock:
+                    self._rollbacks += 1
+            raise
+        finally:
+            self._local.depth -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "connections": len(self._connections),
+                "opened_total": self._opened,
+                "checkouts": self._checkouts,
+                "commits": self._commits,
+                "rollbacks": self._rollbacks,
+                "reuse_ratio": round(1 - (self._opened / self._checkouts), 4) if self._checkouts else 0.0,
+                "uptime_seconds": int(time.time() - self._created_at),
+                "settings": {
+                    "journal_mode": "wal",
+                    "synchronous": "normal",
+                    "cache_size_kib": SQLITE_CACHE_SIZE_KIB,
+                    "mmap_size": SQLITE_MMAP_SIZE,
+                    "statement_cache": SQLITE_STATEMENT_CACHE,
+                },
+            }
+
+    def close_all(self):
+        """Close every pooled connection (used on shutdown)."""
+        with self._lock:
+            conns, self._connections = self._connections, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
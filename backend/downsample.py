@@ -0,0 +1,114 @@
+"""
+Downsampling von Zeitreihen für Charts
+Reduziert eine Messreihe serverseitig auf höchstens N Punkte, bevor sie
+serialisiert wird: LTTB (Largest-Triangle-Three-Buckets, erhält die Form) oder
+Min/Max pro Bucket (erhält Ausschläge). Vektorisiert mit NumPy, wenn
+installiert; sonst dieselben Verfahren (gleiche Buckets) in reinem Python.
+"""
+import math
+import os
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
+METHODS = ("lttb", "minmax")
+
+# /hardware/{id}/telemetry/series: upper bound of points per metric, and the
+# widest output step still computed from raw readings (wider steps read rollups)
+SERIES_MAX_POINTS = int(os.getenv("SERIES_MAX_POINTS", "5000"))
+SERIES_RAW_MAX_STEP_SECONDS = float(os.getenv("SERIES_RAW_MAX_STEP_SECONDS", "120"))
+
+
+def lttb(x, y, n: int):
+    """Largest-Triangle-Three-Buckets on numpy arrays; keeps first and last point.
+
+    The point chosen in a bucket depends on the previous choice, so buckets are
+    walked in order, but each bucket is evaluated as one vector operation.
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return x, y
+    # n-2 buckets between the fixed first and last point
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    # Mean of every bucket (the "next bucket" average), the last point closes the series
+    sums_x = np.add.reduceat(x[1:size - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:size - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    idx = np.empty(n, dtype=np.int64)
+    idx[0], idx[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - avg_x[i + 1]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (avg_y[i + 1] - ay))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return x[idx], y[idx]
+
+
+def minmax(x, y, n: int):
+    """Min and max point of each of n/2 equal-count buckets, in time order."""
+    size = len(x)
+    if n >= size or n < 2:
+        return x, y
+    width = math.ceil(size / (n // 2))
+    rows = math.ceil(size / width)
+    padded = np.full(rows * width, np.nan)
+    padded[:size] = y
+    grid = padded.reshape(rows, width)
+    base = np.arange(rows) * width
+    idx = np.unique(np.concatenate((base + np.nanargmin(grid, axis=1), base + np.nanargmax(grid, axis=1))))
+    return x[idx], y[idx]
+
+
+def _lttb_py(x: Sequence[float], y: Sequence[float], n: int) -> Tuple[List[float], List[float]]:
+    size = len(x)
+    if n >= size or n < 3:
+        return list(x), list(y)
+    # Same bucket edges as lttb() (np.linspace truncated to int)
+    step = (size - 2) / (n - 2)
+    edges = [int(1 + k * step) for k in range(n - 2)] + [size - 1]
+    avg_x = [sum(x[lo:hi]) / (hi - lo) for lo, hi in zip(edges, edges[1:])] + [x[-1]]
+    avg_y = [sum(y[lo:hi]) / (hi - lo) for lo, hi in zip(edges, edges[1:])] + [y[-1]]
+    idx = [0]
+    a = 0
+    for i in range(n - 2):
+        ax, ay, bx, by = x[a], y[a], avg_x[i + 1], avg_y[i + 1]
+        a = max(range(edges[i], edges[i + 1]),
+                key=lambda j: abs((ax - bx) * (y[j] - ay) - (ax - x[j]) * (by - ay)))
+        idx.append(a)
+    idx.append(size - 1)
+    return [x[i] for i in idx], [y[i] for i in idx]
+
+
+def _minmax_py(x: Sequence[float], y: Sequence[float], n: int) -> Tuple[List[float], List[float]]:
+    size = len(x)
+    if n >= size or n < 2:
+        return list(x), list(y)
+    width = math.ceil(size / (n // 2))
+    keep = set()
+    for start in range(0, size, width):
+        bucket = range(start, min(start + width, size))
+        keep.add(min(bucket, key=y.__getitem__))
+        keep.add(max(bucket, key=y.__getitem__))
+    idx = sorted(keep)
+    return [x[i] for i in idx], [y[i] for i in idx]
+
+
+def downsample(ts: Sequence[float], values: Sequence, n: int, method: str = "lttb") -> Tuple[List[float], List[float]]:
+    """Drop missing values, reduce to at most ``n`` points, return plain lists for JSON."""
+    if np is None:
+        pairs = [(t, v) for t, v in zip(ts, values) if v is not None]
+        return (_lttb_py if method == "lttb" else _minmax_py)([p[0] for p in pairs], [float(p[1]) for p in pairs], n)
+    x = np.asarray(ts, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)  # None -> nan
+    keep = ~np.isnan(y)
+    x, y = x[keep], y[keep]
+    x, y = (lttb if method == "lttb" else minmax)(x, y, n)
+    return x.tolist(), y.tolist()
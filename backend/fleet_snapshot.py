@@ -0,0 +1,137 @@
+"""
+Inkrementeller Flotten-Snapshot für das Monitoring-Dashboard
+Wird bei jeder Telemetrie und jedem online/offline-Wechsel nachgeführt statt bei
+jedem Poll alle Geräte zu lesen: Zähler nach Status und Belegung, die Geräte mit
+tiefer Batterie und schwächstem Signal (sortierte Listen, bisect) sowie dieselben
+Zahlen pro Owner. Jeder Worker gleicht seinen Snapshot alle
+FLEET_SNAPSHOT_RESYNC_SECONDS mit der DB ab (Telemetrie verteilt sich auf Worker).
+"""
+import bisect
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+FLEET_LOW_BATTERY_LEVEL = float(os.getenv("FLEET_LOW_BATTERY_LEVEL", "3.5"))
+FLEET_SNAPSHOT_RESYNC_SECONDS = int(os.getenv("FLEET_SNAPSHOT_RESYNC_SECONDS", "60"))
+FLEET_SNAPSHOT_LIST_LIMIT = 20
+
+
+class _Ranked:
+    """(value, hardware_id) kept sorted; lowest values first."""
+
+    __slots__ = ("items",)
+
+    def __init__(self):
+        self.items: List[Tuple[float, str]] = []
+
+    def add(self, value, hardware_id):
+        if value is not None:
+            bisect.insort(self.items, (value, hardware_id))
+
+    def remove(self, value, hardware_id):
+        if value is None:
+            return
+        i = bisect.bisect_left(self.items, (value, hardware_id))
+        if i < len(self.items) and self.items[i] == (value, hardware_id):
+            del self.items[i]
+
+    def lowest(self, limit: int, below: Optional[float] = None) -> List[Tuple[float, str]]:
+        end = len(self.items) if below is None else bisect.bisect_left(self.items, (below, ""))
+        return self.items[:min(limit, end)]
+
+    def count_below(self, below: float) -> int:
+        return bisect.bisect_left(self.items, (below, ""))
+
+
+class _Bucket:
+    """Aggregates of one device set (whole fleet or one owner)."""
+
+    __slots__ = ("devices", "status", "occupancy", "battery", "rssi")
+
+    def __init__(self):
+        self.devices = 0
+        self.status: Counter = Counter()
+        self.occupancy: Counter = Counter()
+        self.battery = _Ranked()
+        self.rssi = _Ranked()
+
+    def apply(self, hardware_id: str, dev: dict, sign: int):
+        self.devices += sign
+        self.status[dev["status"] or "unknown"] += sign
+        self.occupancy[dev["occupancy"] or "unknown"] += sign
+        if sign > 0:
+            self.battery.add(dev["battery_level"], hardware_id)
+            self.rssi.add(dev["rssi"], hardware_id)
+        else:
+            self.battery.remove(dev["battery_level"], hardware_id)
+            self.rssi.remove(dev["rssi"], hardware_id)
+
+    def counts(self) -> dict:
+        return {
+            "devices": self.devices,
+            "status": {k: v for k, v in self.status.items() if v},
+            "occupancy": {k: v for k, v in self.occupancy.items() if v},
+            "low_battery": self.battery.count_below(FLEET_LOW_BATTERY_LEVEL),
+        }
+
+
+_FIELDS = ("owner_email", "status", "occupancy", "battery_level", "rssi")
+
+
+class FleetSnapshot:
+    """Only touched from the event loop; every update is O(log n) plus a list insert."""
+
+    def __init__(self):
+        self._devices: Dict[str, dict] = {}
+        self._all = _Bucket()
+        self._owners: Dict[str, _Bucket] = {}
+        self.updated_at = time.time()
+
+    def _buckets(self, owner: Optional[str]):
+        yield self._all
+        if owner:
+            bucket = self._owners.get(owner)
+            if bucket is None:
+                bucket = self._owners[owner] = _Bucket()
+            yield bucket
+
+    def update(self, hardware_id: str, **fields):
+        """Set any of owner_email, status, occupancy, battery_level, rssi for a device."""
+        old = self._devices.get(hardware_id)
+        new = dict(old) if old else dict.fromkeys(_FIELDS)
+        new.update((k, v) for k, v in fields.items() if k in _FIELDS)
+        if new == old:
+            return
+        if old is not None:
+            for bucket in self._buckets(old["owner_email"]):
+                bucket.apply(hardware_id, old, -1)
+            owner_bucket = self._owners.get(old["owner_email"])
+            if owner_bucket is not None and owner_bucket.devices == 0:
+                del self._owners[old["owner_email"]]
+        for bucket in self._buckets(new["owner_email"]):
+            bucket.apply(hardware_id, new, +1)
+        self._devices[hardware_id] = new
+        self.updated_at = time.time()
+
+    def load(self, rows: Iterable[Tuple[str, Optional[str], Optional[str], Optional[str], Optional[float], Optional[float]]]):
+        """Rebuild from ``(hardware_id, owner_email, status, occupancy, battery_level, rssi)`` rows."""
+        fresh = FleetSnapshot()
+        for hardware_id, owner_email, status, occupancy, battery_level, rssi in rows:
+            fresh.update(hardware_id, owner_email=owner_email, status=status, occupancy=occupancy,
+                         battery_level=battery_level, rssi=rssi)
+        self._devices, self._all, self._owners = fresh._devices, fresh._all, fresh._owners
+        self.updated_at = time.time()
+
+    def summary(self, owner: Optional[str] = None, limit: int = FLEET_SNAPSHOT_LIST_LIMIT) -> dict:
+        """Fleet (``owner=None``, with per-owner breakdown) or one owner's view."""
+        bucket = self._all if owner is None else self._owners.get(owner, _Bucket())
+        out = bucket.counts()
+        out["low_battery_threshold"] = FLEET_LOW_BATTERY_LEVEL
+        out["low_battery_devices"] = [{"hardware_id": hw, "battery_level": v}
+                                      for v, hw in bucket.battery.lowest(limit, below=FLEET_LOW_BATTERY_LEVEL)]
+        out["weakest_rssi_devices"] = [{"hardware_id": hw, "rssi": v} for v, hw in bucket.rssi.lowest(limit)]
+        if owner is None:
+            out["owners"] = {o: b.counts() for o, b in self._owners.items()}
+        out["updated_at"] = self.updated_at
+        return out
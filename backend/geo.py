@@ -0,0 +1,83 @@
+"""
+Räumliche Abfragen auf parking_spots (SQLite R*Tree)
+Die R*Tree-Tabelle parking_spots_rtree wird per Trigger synchron gehalten
+(siehe sqlite_migrations). Kandidaten kommen aus dem R*Tree, danach wird
+exakt gefiltert und nach Distanz sortiert.
+"""
+import math
+import os
+
+SPOT_SEARCH_DEFAULT_RADIUS_KM = float(os.getenv("SPOT_SEARCH_DEFAULT_RADIUS_KM", "5"))
+SPOT_SEARCH_MAX_RADIUS_KM = float(os.getenv("SPOT_SEARCH_MAX_RADIUS_KM", "200"))
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bbox_around(lat: float, lng: float, radius_km: float):
+    """Bounding box (min_lat, min_lng, max_lat, max_lng) enclosing the circle."""
+    dlat = radius_km / KM_PER_DEG_LAT
+    # Near the poles the longitude span degenerates -> take the full range
+    cos_lat = math.cos(math.radians(lat))
+    dlng = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (KM_PER_DEG_LAT * cos_lat))
+    return (max(-90.0, lat - dlat), max(-180.0, lng - dlng),
+            min(90.0, lat + dlat), min(180.0, lng + dlng))
+
+
+def parse_bbox(value: str):
+    """Parse ``minLng,minLat,maxLng,maxLat`` (GeoJSON order) -> (min_lat, min_lng, max_lat, max_lng)."""
+    parts = [p.strip() for p in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be minLng,minLat,maxLng,maxLat")
+    min_lng, min_lat, max_lng, max_lat = (float(p) for p in parts)
+    if not (-90.0 <= min_lat <= max_lat <= 90.0) or not (-180.0 <= min_lng <= max_lng <= 180.0):
+        raise ValueError("bbox out of range or min > max")
+    return min_lat, min_lng, max_lat, max_lng
+
+
+SPOT_COLUMNS = "p.id, p.name, p.address, p.latitude, p.longitude, p.status, p.price_per_hour"
+
+
+def bbox_sql(columns: str = SPOT_COLUMNS) -> str:
+    """R*Tree lookup run by spots_in_bbox (params: min/max lat, min/max lng, twice)."""
+    return f'''
+        SELECT {columns}
+        FROM parking_spots_rtree r
+        JOIN parking_spots p ON p.id = r.id
+        WHERE r.max_lat >= ? AND r.min_lat <= ?
+          AND r.max_lng >= ? AND r.min_lng <= ?
+          AND p.latitude BETWEEN ? AND ?
+          AND p.longitude BETWEEN ? AND ?
+    '''
+
+
+def spots_in_bbox(cursor, min_lat, min_lng, max_lat, max_lng, columns: str = SPOT_COLUMNS):
+    """Rows of parking_spots whose point lies inside the box (R*Tree lookup).
+
+    The R*Tree stores 32-bit floats rounded outwards, so the exact comparison
+    on the real columns removes the few false positives at the edges.
+    """
+    cursor.execute(bbox_sql(columns), (min_lat, max_lat, min_lng, max_lng, min_lat, max_lat, min_lng, max_lng))
+    return cursor.fetchall()
+
+
+def nearest_first(rows, lat: float, lng: float, radius_km: float = None, limit: int = None,
+                  lat_idx: int = 3, lng_idx: int = 4):
+    """[(distance_km, row)] sorted by distance, optionally cut to radius and limit."""
+    hits = []
+    for row in rows:
+        d = haversine_km(lat, lng, row[lat_idx], row[lng_idx])
+        if radius_km is None or d <= radius_km:
+            hits.append((d, row))
+    hits.sort(key=lambda h: h[0])
+    if limit is not None:
+        hits = hits[:limit]
+    return hits
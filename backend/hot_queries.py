@@ -0,0 +1,108 @@
+"""
+Heisse SQL-Statements von server_gashis und ihre Planprüfung
+Die Statements sind benannte Konstanten (bzw. Builder für dynamische WHERE/LIMIT):
+server_gashis, command_queue und die Hilfsmodule führen genau diese Strings aus,
+HOT_QUERIES verweist auf dieselben Objekte. backend/scripts/check_query_plans.py
+prüft damit die Pläne, die wirklich laufen, statt einer Kopie, die veraltet.
+"""
+from backend import command_queue
+from backend import geo
+from backend import spot_changes
+from backend import telemetry_rollups
+from backend import telemetry_store
+
+SPOT_COLUMNS = "id, name, address, latitude, longitude, status, price_per_hour"
+DEVICE_COLUMNS = ("hardware_id, owner_email, parking_spot_id, created_at, last_heartbeat, "
+                  "battery_level, rssi, occupancy, last_mag")
+
+COMMANDS_SINCE_SQL = "SELECT id, hardware_id FROM hardware_commands WHERE id > ? ORDER BY id"
+MAG_WINDOW_SQL = '''
+    SELECT hardware_id, mag_x, mag_y, mag_z, occupancy FROM telemetry_readings
+    WHERE ts > ? AND ts <= ? AND mag_x IS NOT NULL
+'''
+MAG_PUSH_CLAIM_SQL = '''
+    UPDATE mag_calibration SET pushed_x = ?, pushed_y = ?, pushed_z = ?, pushed_threshold = ?, pushed_at = ?
+    WHERE hardware_id = ? AND (pushed_at IS NULL OR pushed_at <= ?)
+'''
+SUPERSEDE_COMMANDS_SQL = '''
+    UPDATE hardware_commands SET status = 'superseded' WHERE hardware_id = ? AND status = 'queued' AND command = ?
+'''
+OCCUPANCY_EVENTS_SQL = '''
+    SELECT id, parking_spot_id, ts, from_state, to_state FROM occupancy_events
+    WHERE hardware_id = ? AND ts >= ? AND ts < ? ORDER BY ts LIMIT ?
+'''
+DEVICE_ID_SQL = "SELECT id FROM hardware_devices WHERE hardware_id = ?"
+SPOT_OWNER_SQL = "SELECT owner_id FROM parking_spots WHERE id = ?"
+SPOT_DEVICES_SQL = "SELECT hardware_id FROM hardware_devices WHERE parking_spot_id = ?"
+SPOT_LIST_VERSION_SQL = "SELECT version FROM data_versions WHERE name = 'parking_spots'"
+
+
+def _page(where: list, order: str, limit: bool) -> str:
+    return (f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+            f"ORDER BY {order}{' LIMIT ?' if limit else ''}")
+
+
+def spot_list_sql(after: bool, limit: bool) -> str:
+    """Keyset on (name, id): stable order, no OFFSET, uses idx_parking_spots_name.
+    Params: [name, id] if ``after``, then the limit."""
+    where = ["(name, id) > (?, ?)"] if after else []
+    return f"SELECT {SPOT_COLUMNS} FROM parking_spots {_page(where, 'name, id', limit)}"
+
+
+def owner_spots_sql(after: bool, limit: bool) -> str:
+    """Keyset on (name, id) within the owner: idx_parking_spots_owner (owner_id, name[, rowid]).
+    Params: owner_id, [name, id] if ``after``, then the limit."""
+    where = ["owner_id = ?"] + (["(name, id) > (?, ?)"] if after else [])
+    return f"SELECT {SPOT_COLUMNS}, owner_id FROM parking_spots {_page(where, 'name, id', limit)}"
+
+
+def devices_sql(owner: bool, after: bool, limit: bool) -> str:
+    """Keyset on hardware_id (unique); the owner listing walks idx_hardware_devices_owner.
+    Params: owner_email if ``owner``, hardware_id if ``after``, then the limit."""
+    where = (["owner_email = ?"] if owner else []) + (["hardware_id > ?"] if after else [])
+    return f"SELECT {DEVICE_COLUMNS} FROM hardware_devices {_page(where, 'hardware_id', limit)}"
+
+
+# (name, sql, sample params); checked by scripts/check_query_plans.py
+HOT_QUERIES = [
+    ("claim queued commands", command_queue.CLAIM_SQL,
+     ("2024-01-01T00:00:00", 0.0, 600.0, 30.0, "HW-1", 0.0)),
+    ("claim queued commands (select, old SQLite)", command_queue.CLAIM_SELECT_SQL, ("HW-1", 0.0)),
+    ("any queued command", command_queue.ANY_QUEUED_SQL, ("HW-1",)),
+    ("queue command (next seq)", command_queue.INSERT_SQL,
+     ("HW-1", "raise_barrier", None, None, 0.0, "HW-1", None)),
+    ("owner devices", devices_sql(owner=True, after=False, limit=False), ("owner@example.com",)),
+    ("owner parking spots", owner_spots_sql(after=False, limit=False), (1,)),
+    ("device by hardware_id", DEVICE_ID_SQL, ("HW-1",)),
+    ("spot owner lookup", SPOT_OWNER_SQL, (1,)),
+    ("devices on spot", SPOT_DEVICES_SQL, (1,)),
+    ("spots in bbox", geo.bbox_sql(), (47.3, 47.4, 8.5, 8.6, 47.3, 47.4, 8.5, 8.6)),
+    ("spot list version", SPOT_LIST_VERSION_SQL, ()),
+    ("spot changes page", spot_changes.CHANGES_PAGE_SQL, (0, 500)),
+    ("spot snapshot page", spot_changes.SNAPSHOT_PAGE_SQL, (0, 1001)),
+    ("spot list keyset page", spot_list_sql(after=True, limit=True), ("Bern", 3, 501)),
+    ("owner spots keyset page", owner_spots_sql(after=True, limit=True), (1, "Bern", 3, 501)),
+    ("owner devices keyset page", devices_sql(owner=True, after=True, limit=True),
+     ("owner@example.com", "HW-1", 501)),
+    ("all devices keyset page", devices_sql(owner=False, after=True, limit=True), ("HW-1", 501)),
+    ("telemetry series (raw)", telemetry_store.series_sql(list(telemetry_store.SERIES_METRICS)),
+     ("HW-1", 0.0, 1e10)),
+    ("telemetry retention batch", telemetry_store.PURGE_SQL, (0.0, 5000)),
+    ("telemetry rollup range", telemetry_rollups.ROLLUPS_SQL, ("HW-1", 3600, 0.0, 1e10)),
+    ("telemetry rollup series", telemetry_rollups.series_sql("battery_level"), ("HW-1", 3600, 0.0, 1e10)),
+    ("telemetry rollup series (min/max)", telemetry_rollups.series_sql("battery_level", extremes=True),
+     (3600, "HW-1", 3600, 0.0, 1e10)),
+    ("telemetry rollup retention batch", telemetry_rollups.PURGE_SQL, (60, 0.0, 5000)),
+    ("device occupancy events", OCCUPANCY_EVENTS_SQL, ("HW-1", 0.0, 1e10, 1000)),
+    ("mag classifier window", MAG_WINDOW_SQL, (0.0, 1e10)),
+    ("mag calibration push claim", MAG_PUSH_CLAIM_SQL, (0.0, 0.0, 0.0, 500.0, 0.0, "HW-1", 0.0)),
+    ("superseded calibration commands", SUPERSEDE_COMMANDS_SQL, ("HW-1", "calibrate_mag")),
+    ("fan-out devices by owner", command_queue.TARGETS_BY_OWNER_SQL, ("owner@example.com",)),
+    ("fan-out devices on spots", command_queue.targets_sql("parking_spot_id", 2), (1, 2)),
+    ("fan-out devices by id", command_queue.targets_sql("hardware_id", 2), ("HW-1", "HW-2")),
+    ("command job status", command_queue.JOB_COMMANDS_SQL, (1,)),
+    ("batch ack commands", command_queue.ack_sql(2, watermark=True), ("2025-01-01", "HW-1", 1, 2, 10)),
+    ("expire queued commands", command_queue.EXPIRE_SQL, (0.0, 500)),
+    ("redeliver unacked commands", command_queue.REDELIVER_SQL, (0.0, 5, 0.0, 500)),
+    ("commands queued since", COMMANDS_SINCE_SQL, (0,)),
+]
@@ -0,0 +1,69 @@
+"""
+Schnelle JSON-Kodierung und gestreamte Listen-Responses
+Grosse Listen werden nicht mehr als Liste von Dicts aufgebaut und durch das
+response_model validiert, sondern batchweise per Keyset aus SQLite gelesen und
+direkt als Chunks eines JSON-Arrays geschrieben. orjson wird verwendet, wenn
+installiert, sonst die Standardbibliothek.
+"""
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from starlette.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON, same shape as FastAPI's JSONResponse output."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson when available.
+
+    Returning a Response from an endpoint skips response_model validation, so
+    use this only on trusted paths where the rows come straight from our own DB.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# fetch_batch(after) -> (rows, next_after); next_after None = done
+BatchFetcher = Callable[[Optional[list]], Awaitable[Tuple[List[Any], Optional[list]]]]
+
+
+async def iter_json_array(fetch_batch: BatchFetcher, prefix: bytes = b"[", suffix: bytes = b"]") -> AsyncIterator[bytes]:
+    """Yield one JSON array as chunks, one chunk per fetched batch.
+
+    Each batch is a separate short DB read (keyset continuation), so no
+    connection or worker thread is held while the client reads. Rows changed
+    between batches appear in their latest state. No row is skipped or
+    duplicated only as long as its keyset columns do not change during the
+    stream: a row whose key moves behind the cursor is missed, one that moves
+    ahead of it is sent twice.
+    """
+    yield prefix
+    first = True
+    after = None
+    while True:
+        rows, after = await fetch_batch(after)
+        if rows:
+            body = b",".join(dumps(row) for row in rows)
+            yield body if first else b"," + body
+            first = False
+        if after is None:
+            break
+    yield suffix
+
+
+def streaming_json(fetch_batch: BatchFetcher, prefix: bytes = b"[", suffix: bytes = b"]", headers: dict = None) -> StreamingResponse:
+    return StreamingResponse(iter_json_array(fetch_batch, prefix, suffix), media_type="application/json", headers=headers)
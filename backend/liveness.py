@@ -0,0 +1,139 @@
+"""
+Geräte-Liveness mit Deadline-Heap
+Jeder Heartbeat setzt die Deadline des Geräts auf jetzt + LIVENESS_TIMEOUT_SECONDS
+und legt sie in einen Min-Heap (O(log n)). Ein Hintergrund-Task nimmt abgelaufene
+Einträge von oben weg und meldet das Gerät offline; veraltete Heap-Einträge
+(Gerät hat sich inzwischen wieder gemeldet) werden dabei übersprungen. Die
+Zähler online/offline werden laufend geführt, die Übersicht braucht keinen
+Tabellen-Scan. Wird von server_gashis.py und server.py verwendet.
+"""
+import heapq
+import os
+import time
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Firmware heartbeat is 30 s; offline after ~4 missed heartbeats
+LIVENESS_TIMEOUT_SECONDS = float(os.getenv("LIVENESS_TIMEOUT_SECONDS", "120"))
+LIVENESS_CHECK_INTERVAL_SECONDS = float(os.getenv("LIVENESS_CHECK_INTERVAL_SECONDS", "5"))
+
+
+class LivenessEvent(NamedTuple):
+    hardware_id: str
+    status: str  # "online" | "offline"
+    ts: float  # epoch seconds (offline: the missed deadline)
+
+
+class LivenessTracker:
+    """Heartbeat deadlines of all devices; only touched from the event loop."""
+
+    def __init__(self, timeout: float = LIVENESS_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._heap: List[Tuple[float, str]] = []
+        self._deadline: Dict[str, float] = {}
+        self._offline: Dict[str, Optional[float]] = {}  # hardware_id -> offline since
+        self.recent_events = deque(maxlen=100)
+
+    def seed(self, rows: Iterable[Tuple[str, Optional[float]]], now: Optional[float] = None):
+        """Initial state from the DB: ``(hardware_id, last heartbeat epoch or None)``; emits no events."""
+        now = time.time() if now is None else now
+        for hardware_id, last_seen in rows:
+            if hardware_id in self._deadline:
+                continue
+            deadline = (last_seen + self.timeout) if last_seen is not None else 0.0
+            self._deadline[hardware_id] = deadline
+            if deadline <= now:
+                self._offline[hardware_id] = deadline or None
+            else:
+                self._heap.append((deadline, hardware_id))
+        heapq.heapify(self._heap)
+
+    def beat(self, hardware_id: str, ts: Optional[float] = None) -> Optional[LivenessEvent]:
+        """Record a heartbeat; returns an "online" event if the device was offline or new."""
+        now = time.time() if ts is None else ts
+        deadline = now + self.timeout
+        previous = self._deadline.get(hardware_id)
+        if previous is not None and deadline <= previous:
+            return None
+        self._deadline[hardware_id] = deadline
+        heapq.heappush(self._heap, (deadline, hardware_id))
+        # Superseded deadlines stay in the heap until popped; rebuild if they pile up
+        if len(self._heap) > 4 * len(self._deadline) + 64:
+            self._compact()
+        if previous is None or hardware_id in self._offline:
+            self._offline.pop(hardware_id, None)
+            event = LivenessEvent(hardware_id, "online", now)
+            self.recent_events.append(event)
+            return event
+        return None
+
+    def due(self, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Pop every passed deadline; returns ``(hardware_id, deadline)`` of the devices
+        that went silent here. Nothing is marked yet: the caller settles each one
+        with confirm_offline() or rearm() (e.g. after asking the DB)."""
+        now = time.time() if now is None else now
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, hardware_id = heapq.heappop(heap)
+            if self._deadline.get(hardware_id) != deadline or hardware_id in self._offline:
+                continue  # stale entry, the device has checked in since
+            due.append((hardware_id, deadline))
+        return due
+
+    def confirm_offline(self, hardware_id: str, deadline: float) -> Optional[LivenessEvent]:
+        """Mark a device from due() offline; None if it has checked in since."""
+        if self._deadline.get(hardware_id) != deadline or hardware_id in self._offline:
+            return None
+        self._offline[hardware_id] = deadline
+        event = LivenessEvent(hardware_id, "offline", deadline)
+        self.recent_events.append(event)
+        return event
+
+    def rearm(self, hardware_id: str, last_seen: float):
+        """New deadline from a heartbeat seen elsewhere (another worker); records no event.
+
+        Also puts a device from due() back when it could not be checked: with its
+        old deadline it is due again on the next pass.
+        """
+        deadline = last_seen + self.timeout
+        current = self._deadline.get(hardware_id)
+        if current is None or deadline < current or hardware_id in self._offline:
+            return  # unknown, or a local beat / offline mark got there first
+        self._deadline[hardware_id] = deadline
+        heapq.heappush(self._heap, (deadline, hardware_id))
+
+    def expire(self, now: Optional[float] = None) -> List[LivenessEvent]:
+        """Pop every passed deadline and mark those devices offline (single process)."""
+        events = (self.confirm_offline(hw, deadline) for hw, deadline in self.due(now))
+        return [e for e in events if e is not None]
+
+    def forget(self, hardware_id: str):
+        """Drop a deleted device (its heap entries become stale)."""
+        self._deadline.pop(hardware_id, None)
+        self._offline.pop(hardware_id, None)
+
+    def _compact(self):
+        self._heap = [(d, hw) for hw, d in self._deadline.items() if hw not in self._offline]
+        heapq.heapify(self._heap)
+
+    def status(self, hardware_id: str) -> Optional[str]:
+        if hardware_id not in self._deadline:
+            return None
+        return "offline" if hardware_id in self._offline else "online"
+
+    def summary(self, offline_limit: int = 100, now: Optional[float] = None) -> dict:
+        """O(1) counts plus up to ``offline_limit`` offline devices (longest silent first)."""
+        now = time.time() if now is None else now
+        total = len(self._deadline)
+        offline = len(self._offline)
+        silent = heapq.nsmallest(offline_limit, self._offline.items(), key=lambda kv: kv[1] or 0.0) if offline_limit else []
+        return {
+            "total": total,
+            "online": total - offline,
+            "offline": offline,
+            "timeout_seconds": self.timeout,
+            "next_deadline_in": round(self._heap[0][0] - now, 1) if self._heap else None,
+            "offline_devices": [{"hardware_id": hw, "offline_since": since} for hw, since in silent],
+            "recent_events": [e._asdict() for e in list(self.recent_events)[-20:]],
+        }
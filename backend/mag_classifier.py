@@ -0,0 +1,260 @@
+"""
+Serverseitige Magnetometer-Kalibrierung und Belegungs-Klassifikation
+Die Firmware vergleicht |x-bx|+|y-by|+|z-bz| mit einer festen Schwelle (500)
+gegen eine Baseline vom Boot; Temperatur und Drift verschieben beides. Der
+Server führt pro Gerät eine gleitende Baseline und das Rauschmass der freien
+Messungen (NumPy-Arrays über die ganze Flotte, einmal pro Minute vektorisiert
+nachgeführt), bewertet jede eingehende Messung gegen diese Baseline und
+überschreibt die Belegung der Firmware, wenn das Ergebnis eindeutig ist. Neue
+Baseline/Schwelle gehen als Command "calibrate_mag" an das Gerät zurück.
+
+Ohne NumPy ist der Klassifikator aus, die Firmware-Belegung gilt unverändert.
+"""
+import math
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
+MAG_CLASSIFIER_INTERVAL_SECONDS = float(os.getenv("MAG_CLASSIFIER_INTERVAL_SECONDS", "60"))
+# Baseline/noise follow roughly the last N free readings (30 s heartbeat: 120 = 1 h)
+MAG_BASELINE_WINDOW = int(os.getenv("MAG_BASELINE_WINDOW", "120"))
+# Override the firmware only when |distance - threshold| / threshold reaches this
+MAG_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("MAG_CLASSIFIER_MIN_CONFIDENCE", "0.5"))
+# Re-send calibrate_mag when threshold or baseline moved by this fraction of the
+# threshold, at most once per interval per device
+MAG_CALIBRATION_PUSH_DELTA = float(os.getenv("MAG_CALIBRATION_PUSH_DELTA", "0.25"))
+MAG_CALIBRATION_PUSH_MIN_INTERVAL_SECONDS = float(os.getenv("MAG_CALIBRATION_PUSH_MIN_INTERVAL_SECONDS", "21600"))
+
+# Free readings needed before a device's baseline is trusted
+MAG_CLASSIFIER_MIN_SAMPLES = 20
+# threshold = noise factor * mean L1 distance of free readings, clamped (firmware units)
+MAG_THRESHOLD_NOISE_FACTOR = 8.0
+MAG_THRESHOLD_MIN = 150.0
+MAG_THRESHOLD_MAX = 2000.0
+# Readings replayed from telemetry_readings when no calibration is stored yet
+MAG_CLASSIFIER_WARMUP_SECONDS = 1800.0
+
+CALIBRATION_COMMAND = "calibrate_mag"
+
+
+def _axes(last_mag) -> Optional[Tuple[float, float, float]]:
+    if not isinstance(last_mag, dict):
+        return None
+    try:
+        return float(last_mag["x"]), float(last_mag["y"]), float(last_mag["z"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class MagClassifier:
+    """Per-device baselines as fleet-wide arrays (one row per device).
+
+    ``update`` folds a window of readings of all devices into the arrays with a
+    handful of vector operations; ``classify`` scores a single reading in O(1).
+    Only touched from the event loop.
+    """
+
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._size = 0
+        self._allocate(0)
+        self.watermark: Optional[float] = None
+        self._updates = 0
+        self._readings = 0
+        self._overrides = 0
+        self._pushes = 0
+        self._last_update_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return np is not None
+
+    def _allocate(self, capacity: int):
+        if np is None:
+            return
+        nan = float("nan")
+
+        def grow(old, shape, fill, dtype=np.float64):
+            new = np.full(shape, fill, dtype=dtype)
+            if old is not None:
+                new[:len(old)] = old
+            return new
+        self.base = grow(getattr(self, "base", None), (capacity, 3), 0.0)
+        self.spread = grow(getattr(self, "spread", None), capacity, 0.0)
+        self.samples = grow(getattr(self, "samples", None), capacity, 0, np.int64)
+        self.pushed_base = grow(getattr(self, "pushed_base", None), (capacity, 3), nan)
+        self.pushed_threshold = grow(getattr(self, "pushed_threshold", None), capacity, nan)
+        self.pushed_at = grow(getattr(self, "pushed_at", None), capacity, nan)
+
+    def _rows(self, hardware_ids: Iterable[str]):
+        """Row index per hardware_id, appending rows for new devices."""
+        index = self._index
+        out = []
+        for hw in hardware_ids:
+            i = index.get(hw)
+            if i is None:
+                i = index[hw] = len(self._ids)
+                self._ids.append(hw)
+            out.append(i)
+        if len(self._ids) > self._size:
+            self._size = max(64, 2 * len(self._ids))
+            self._allocate(self._size)
+        return np.asarray(out, dtype=np.int64)
+
+    def _thresholds(self, rows=None):
+        spread = self.spread if rows is None else self.spread[rows]
+        return np.clip(MAG_THRESHOLD_NOISE_FACTOR * spread, MAG_THRESHOLD_MIN, MAG_THRESHOLD_MAX)
+
+    def load(self, rows: Iterable[tuple]):
+        """Stored calibration: ``(hardware_id, base_x, base_y, base_z, spread, samples,
+        pushed_x, pushed_y, pushed_z, pushed_threshold, pushed_at)``."""
+        if np is None:
+            return
+        rows = list(rows)
+        if not rows:
+            return
+        idx = self._rows(r[0] for r in rows)
+        values = np.array([r[1:] for r in rows], dtype=np.float64)  # None -> nan
+        self.base[idx] = values[:, 0:3]
+        self.spread[idx] = values[:, 3]
+        self.samples[idx] = values[:, 4]
+        self.pushed_base[idx] = values[:, 5:8]
+        self.pushed_threshold[idx] = values[:, 8]
+        self.pushed_at[idx] = values[:, 9]
+
+    def update(self, hardware_ids: Sequence[str], mags, labels) -> List[int]:
+        """Fold new readings of any number of devices into the baselines.
+
+        ``mags`` is (m, 3), ``labels`` the stored occupancy codes (0 = free, nan
+        = unknown). Devices still calibrating learn from readings the firmware
+        called free, calibrated ones from readings below their own threshold,
+        so a parked car never pulls the baseline. Returns the rows changed.
+        """
+        if np is None or not len(hardware_ids):
+            return []
+        started = time.perf_counter()
+        idx = self._rows(hardware_ids)
+        mags = np.asarray(mags, dtype=np.float64)
+        labels = np.asarray(labels, dtype=np.float64)
+        n = len(self._ids)
+
+        dist = np.abs(mags - self.base[idx]).sum(axis=1)
+        calibrated = self.samples[idx] >= MAG_CLASSIFIER_MIN_SAMPLES
+        free = np.where(calibrated, dist < self._thresholds(idx), labels == 0)
+        free_idx, free_mags = idx[free], mags[free]
+
+        counts = np.bincount(free_idx, minlength=n)
+        rows = np.flatnonzero(counts)
+        k = counts[rows]
+        # Cumulative mean while calibrating, then an exponential window of MAG_BASELINE_WINDOW readings
+        weight = k / (np.minimum(self.samples[rows], MAG_BASELINE_WINDOW) + k)
+        sums = np.stack([np.bincount(free_idx, weights=free_mags[:, a], minlength=n)[rows] for a in range(3)], axis=1)
+        self.base[rows] += weight[:, None] * (sums / k[:, None] - self.base[rows])
+        # Noise against the updated baseline
+        spread = np.bincount(free_idx, weights=np.abs(free_mags - self.base[free_idx]).sum(axis=1), minlength=n)[rows]
+        self.spread[rows] += weight * (spread / k - self.spread[rows])
+        self.samples[rows] += k
+
+        self._updates += 1
+        self._readings += len(idx)
+        self._last_update_ms = (time.perf_counter() - started) * 1000
+        return rows.tolist()
+
+    def classify(self, hardware_id: str, last_mag) -> Optional[Tuple[str, float]]:
+        """``(state, confidence)`` of one reading, None while the device is not calibrated."""
+        if np is None:
+            return None
+        i = self._index.get(hardware_id)
+        axes = _axes(last_mag)
+        if i is None or axes is None or self.samples[i] < MAG_CLASSIFIER_MIN_SAMPLES:
+            return None
+        bx, by, bz = self.base[i].tolist()
+        dist = abs(axes[0] - bx) + abs(axes[1] - by) + abs(axes[2] - bz)
+        threshold = min(max(MAG_THRESHOLD_NOISE_FACTOR * float(self.spread[i]), MAG_THRESHOLD_MIN), MAG_THRESHOLD_MAX)
+        return ("occupied" if dist > threshold else "free"), min(1.0, abs(dist - threshold) / threshold)
+
+    def reclassify(self, hardware_id: str, reported: Optional[str], last_mag) -> Optional[str]:
+        """Occupancy to use for a reading: the server's verdict when it is confident
+        and disagrees with the firmware, otherwise what the firmware reported."""
+        if reported not in ("free", "occupied"):
+            return reported  # "reserved" and missing values are not the sensor's call
+        verdict = self.classify(hardware_id, last_mag)
+        if verdict is None or verdict[1] < MAG_CLASSIFIER_MIN_CONFIDENCE or verdict[0] == reported:
+            return reported
+        self._overrides += 1
+        return verdict[0]
+
+    def due_pushes(self, now: Optional[float] = None) -> List[int]:
+        """Calibrated rows whose threshold or baseline drifted from what the device last got."""
+        if np is None or not self._ids:
+            return []
+        now = time.time() if now is None else now
+        n = len(self._ids)
+        threshold = self._thresholds()[:n]
+        pushed = self.pushed_threshold[:n]
+        drift = np.abs(self.base[:n] - self.pushed_base[:n]).sum(axis=1)
+        with np.errstate(invalid="ignore"):
+            moved = (np.abs(threshold - pushed) > MAG_CALIBRATION_PUSH_DELTA * pushed) | (drift > MAG_CALIBRATION_PUSH_DELTA * threshold)
+            cooled = ~(self.pushed_at[:n] > now - MAG_CALIBRATION_PUSH_MIN_INTERVAL_SECONDS)
+        due = (self.samples[:n] >= MAG_CLASSIFIER_MIN_SAMPLES) & (np.isnan(pushed) | moved) & cooled
+        return np.flatnonzero(due).tolist()
+
+    def calibration(self, row: int) -> dict:
+        """calibrate_mag parameters of one row (firmware units, integers)."""
+        x, y, z = (int(round(v)) for v in self.base[row].tolist())
+        return {"baseline": {"x": x, "y": y, "z": z}, "threshold": int(round(float(self._thresholds(row))))}
+
+    def sync_pushed(self, stored: Dict[str, tuple], now: float) -> int:
+        """Take over the DB's ``(pushed_x, pushed_y, pushed_z, pushed_threshold, pushed_at)``
+        after a push attempt (another worker may have won it). Returns how many were ours."""
+        ours = 0
+        for hardware_id, values in stored.items():
+            i = self._index.get(hardware_id)
+            if i is None or values is None:
+                continue
+            values = np.array(values, dtype=np.float64)
+            self.pushed_base[i] = values[0:3]
+            self.pushed_threshold[i] = values[3]
+            self.pushed_at[i] = values[4]
+            ours += int(values[4] == now)
+        self._pushes += ours
+        return ours
+
+    def state_rows(self, rows: Iterable[int], now: float) -> List[tuple]:
+        """``(hardware_id, base_x, base_y, base_z, spread, samples, updated_at)`` for persisting."""
+        return [(self._ids[r], *self.base[r].tolist(), float(self.spread[r]), int(self.samples[r]), now) for r in rows]
+
+    def hardware_id(self, row: int) -> str:
+        return self._ids[row]
+
+    def describe(self, hardware_id: str) -> Optional[dict]:
+        i = self._index.get(hardware_id)
+        if np is None or i is None:
+            return None
+        pushed = self.pushed_threshold[i]
+        return {
+            **self.calibration(i),
+            "noise": float(self.spread[i]),
+            "samples": int(self.samples[i]),
+            "calibrated": bool(self.samples[i] >= MAG_CLASSIFIER_MIN_SAMPLES),
+            "pushed_threshold": None if math.isnan(pushed) else int(pushed),
+            "pushed_at": None if math.isnan(self.pushed_at[i]) else float(self.pushed_at[i]),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "devices": len(self._ids),
+            "calibrated": int((self.samples[:len(self._ids)] >= MAG_CLASSIFIER_MIN_SAMPLES).sum()) if np is not None else 0,
+            "updates": self._updates,
+            "readings": self._readings,
+            "overrides": self._overrides,
+            "calibrations_pushed": self._pushes,
+            "last_update_ms": round(self._last_update_ms, 2),
+        }
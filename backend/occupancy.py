@@ -0,0 +1,111 @@
+"""
+Belegungs-Zustandsautomat pro Gerät (Entprellung)
+Der stabile Zustand jedes Sensors liegt im Speicher. Ein neuer Zustand gilt
+erst, wenn er in OCCUPANCY_DEBOUNCE_READINGS aufeinanderfolgenden Messungen
+gemeldet wird; einzelne Ausreisser (Fahrzeug fährt vorbei) werden verworfen.
+Nur echte Wechsel werden nach parking_spots und occupancy_events geschrieben,
+Heartbeats ohne Wechsel bleiben reine Speicher-Operationen.
+
+Mehrere Worker: jeder Prozess entprellt die Messungen, die er sieht; das
+Schreiben ist idempotent (status IS NOT ?), doppelte Events sind möglich, aber
+selten.
+"""
+import os
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+OCCUPANCY_DEBOUNCE_READINGS = int(os.getenv("OCCUPANCY_DEBOUNCE_READINGS", "2"))
+
+STATES = ("free", "occupied", "reserved")
+
+
+class Transition(NamedTuple):
+    hardware_id: str
+    from_state: Optional[str]  # None = first state seen for this device
+    to_state: str
+    ts: float  # epoch seconds of the first reading in the new state
+
+
+class _DeviceState:
+    __slots__ = ("stable", "candidate", "candidate_since", "count", "last_ts")
+
+    def __init__(self, stable: str, last_ts: Optional[float] = None):
+        self.stable = stable
+        self.candidate: Optional[str] = None
+        self.candidate_since: Optional[float] = None
+        self.count = 0
+        self.last_ts = last_ts
+
+
+class OccupancyTracker:
+    """Debounced occupancy per device; only touched from the event loop."""
+
+    def __init__(self, debounce: int = OCCUPANCY_DEBOUNCE_READINGS):
+        self.debounce = max(1, debounce)
+        self._devices: Dict[str, _DeviceState] = {}
+        self._readings = 0
+        self._transitions = 0
+        self._flaps = 0
+
+    def seed(self, rows: Iterable[Tuple[str, Optional[str]]]):
+        """Load known stable states (e.g. at startup) so a restart does not emit events."""
+        for hardware_id, state in rows:
+            if state in STATES and hardware_id not in self._devices:
+                self._devices[hardware_id] = _DeviceState(state)
+
+    def override(self, hardware_ids: Iterable[str], state: str):
+        """Manually written state (spot status set by hand): becomes the stable state,
+        so the next sensor readings are debounced against it and a sensor that
+        disagrees corrects the spot again with a real transition."""
+        if state not in STATES:
+            return
+        for hardware_id in hardware_ids:
+            dev = self._devices.get(hardware_id)
+            if dev is None:
+                self._devices[hardware_id] = _DeviceState(state)
+            else:
+                dev.stable, dev.candidate, dev.candidate_since, dev.count = state, None, None, 0
+
+    def observe(self, hardware_id: str, occupancy: Optional[str], ts: float) -> Optional[Transition]:
+        """Feed one reading; returns a Transition when the stable state changes."""
+        if occupancy not in STATES:
+            return None
+        self._readings += 1
+        dev = self._devices.get(hardware_id)
+        if dev is None:
+            # Unknown device: its first reading is taken as is
+            self._devices[hardware_id] = _DeviceState(occupancy, ts)
+            self._transitions += 1
+            return Transition(hardware_id, None, occupancy, ts)
+        if dev.last_ts is not None and ts < dev.last_ts:
+            # Late (offline) reading: history only, it must not move the state back
+            return None
+        dev.last_ts = ts
+        if occupancy == dev.stable:
+            if dev.candidate is not None:
+                self._flaps += 1
+                dev.candidate, dev.candidate_since, dev.count = None, None, 0
+            return None
+        if occupancy != dev.candidate:
+            if dev.candidate is not None:
+                self._flaps += 1
+            dev.candidate, dev.candidate_since, dev.count = occupancy, ts, 0
+        dev.count += 1
+        if dev.count < self.debounce:
+            return None
+        transition = Transition(hardware_id, dev.stable, occupancy, dev.candidate_since)
+        dev.stable, dev.candidate, dev.candidate_since, dev.count = occupancy, None, None, 0
+        self._transitions += 1
+        return transition
+
+    def state(self, hardware_id: str) -> Optional[str]:
+        dev = self._devices.get(hardware_id)
+        return dev.stable if dev else None
+
+    def stats(self) -> dict:
+        return {
+            "debounce_readings": self.debounce,
+            "devices": len(self._devices),
+            "readings": self._readings,
+            "transitions": self._transitions,
+            "suppressed_flaps": self._flaps,
+        }
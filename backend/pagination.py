@@ -0,0 +1,60 @@
+"""
+Keyset-Pagination und Feld-Projektion für Listen-Endpunkte
+Der Cursor ist opak (base64url von JSON) und enthält den Sortierschlüssel der
+letzten gelieferten Zeile; die nächste Seite wird mit WHERE (key) > (cursor)
+gelesen statt mit OFFSET.
+"""
+import base64
+import json
+import os
+from typing import List, Optional, Sequence
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "500"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "5000"))
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps(list(values), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> list:
+    """Decode a cursor produced by encode_cursor; ``types`` checks the key shape."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("malformed cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("cursor does not match this listing")
+    for value, typ in zip(values, types):
+        if not isinstance(value, typ) or isinstance(value, bool):
+            raise ValueError("cursor does not match this listing")
+    return values
+
+
+def page_size(limit: Optional[int], cursor: Optional[str]) -> Optional[int]:
+    """Effective page size: explicit limit, default when paging, else unbounded."""
+    if limit is None:
+        return DEFAULT_PAGE_SIZE if cursor else None
+    if not (1 <= limit <= MAX_PAGE_SIZE):
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str], always: Sequence[str] = ()) -> Optional[List[str]]:
+    """``fields=a,b`` -> ordered list of allowed names (``always`` included); None = all."""
+    if not fields:
+        return None
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in allowed]
+    if unknown:
+        raise ValueError(f"unknown field(s): {', '.join(unknown)}; allowed: {', '.join(allowed)}")
+    selected = set(wanted) | set(always)
+    return [f for f in allowed if f in selected]
+
+
+def project(item: dict, fields: Optional[List[str]]) -> dict:
+    if fields is None:
+        return item
+    return {k: item[k] for k in fields if k in item}
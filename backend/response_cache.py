@@ -0,0 +1,114 @@
+"""
+Versionierter Cache für fertig serialisierte Responses (z.B. die öffentliche Spot-Liste)
+Jeder Schreibpfad ruft bump() auf; ein Eintrag gilt nur für die Version, unter
+der er gebaut wurde. Zusätzlich wird ein per Trigger gepflegter Zähler in der
+DB (Tabelle data_versions) höchstens alle SPOT_CACHE_REVALIDATE_MS gelesen,
+damit Schreibzugriffe anderer uvicorn-Worker/Skripte ebenfalls invalidieren.
+"""
+import hashlib
+import os
+import threading
+import time
+
+SPOT_CACHE_REVALIDATE_MS = int(os.getenv("SPOT_CACHE_REVALIDATE_MS", "1000"))
+
+
+class CachedBody:
+    __slots__ = ("version", "body", "etag")
+
+    def __init__(self, version: int, body: bytes):
+        self.version = version
+        self.body = body
+        # Strong validator derived from the bytes themselves: stays valid across
+        # restarts and is identical in every worker serving the same content
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class VersionedResponseCache:
+    """Holds one serialized body tagged with the version it was built at."""
+
+    def __init__(self, name: str, revalidate_ms: int = SPOT_CACHE_REVALIDATE_MS):
+        self.name = name
+        self.revalidate_s = revalidate_ms / 1000.0
+        self._lock = threading.Lock()
+        self._version = 0
+        self._db_version = None
+        self._checked_at = 0.0
+        self._entry = None
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+        self._bumps = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self) -> int:
+        """Invalidate after a local write (call once the write is committed)."""
+        with self._lock:
+            self._version += 1
+            self._bumps += 1
+            return self._version
+
+    def needs_revalidate(self) -> bool:
+        return time.monotonic() - self._checked_at >= self.revalidate_s
+
+    def observe_db_version(self, db_version: int):
+        """Feed the shared DB counter; a change (from any process) invalidates."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._db_version is not None and db_version != self._db_version:
+                self._version += 1
+            self._db_version = db_version
+
+    def lookup(self):
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry.version == self._version:
+                self._hits += 1
+                return entry
+            self._misses += 1
+            return None
+
+    def store(self, version: int, body: bytes) -> CachedBody:
+        """Cache ``body`` built from data read at ``version`` (older builds are not kept)."""
+        entry = CachedBody(version, body)
+        with self._lock:
+            if version == self._version:
+                self._entry = entry
+        return entry
+
+    def count_not_modified(self):
+        with self._lock:
+            self._not_modified += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "version": self._version,
+                "db_version": self._db_version,
+                "cached": self._entry is not None and self._entry.version == self._version,
+                "hits": self._hits,
+                "misses": self._misses,
+                "not_modified": self._not_modified,
+                "bumps": self._bumps,
+                "revalidate_ms": int(self.revalidate_s * 1000),
+            }
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """RFC 9110 If-None-Match: weak comparison against a list of entity tags or '*'."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
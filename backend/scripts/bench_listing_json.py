@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark: full spot listing via response_model vs. streamed keyset batches.
+Builds a scratch DB with N spots (all migrations applied), then runs each
+variant in its own subprocess so peak RSS is measured per variant:
+
+  model   fetchall -> list of dicts -> List[Model] validation -> json.dumps
+          (what FastAPI does for response_model=List[ParkingSpot])
+  stream  keyset batches -> json_stream.iter_json_array (orjson if installed),
+          chunks consumed one by one as the ASGI server would send them
+
+Usage:
+  python3 backend/scripts/bench_listing_json.py [--spots 100000] [--runs 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend import json_stream, sqlite_migrations  # noqa: E402
+
+COLUMNS = 'id, name, address, latitude, longitude, status, price_per_hour'
+
+
+def build_db(path, n):
+    conn = sqlite3.connect(path)
+    sqlite_migrations.migrate(conn)
+    rnd = random.Random(1)
+    conn.executemany(
+        'INSERT INTO parking_spots (name, address, latitude, longitude, status, price_per_hour) VALUES (?, ?, ?, ?, ?, ?)',
+        [(f'Spot {i:06d}', f'Strasse {i}, 8000 Zürich', rnd.uniform(45.8, 47.8), rnd.uniform(5.9, 10.5),
+          rnd.choice(['free', 'occupied']), 3.5) for i in range(n)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _rows_to_dicts(rows):
+    return [{'id': r[0], 'name': r[1], 'address': r[2], 'latitude': r[3], 'longitude': r[4],
+             'status': r[5], 'price_per_hour': r[6]} for r in rows]
+
+
+def run_model(conn) -> int:
+    from pydantic import BaseModel, TypeAdapter
+
+    class ParkingSpot(BaseModel):
+        id: Optional[int] = None
+        name: str
+        address: Optional[str] = None
+        latitude: float
+        longitude: float
+        status: str = 'free'
+        price_per_hour: float = 0.0
+
+    rows = conn.execute(f'SELECT {COLUMNS} FROM parking_spots ORDER BY name, id').fetchall()
+    spots = _rows_to_dicts(rows)
+    adapter = TypeAdapter(List[ParkingSpot])
+    validated = adapter.validate_python(spots)
+    content = adapter.dump_python(validated, mode='json')
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+    return len(body)
+
+
+def run_stream(conn) -> int:
+    size = json_stream.STREAM_BATCH_SIZE
+
+    async def fetch(after):
+        if after is None:
+            rows = conn.execute(f'SELECT {COLUMNS} FROM parking_spots ORDER BY name, id LIMIT ?', (size + 1,)).fetchall()
+        else:
+            rows = conn.execute(f'SELECT {COLUMNS} FROM parking_spots WHERE (name, id) > (?, ?) ORDER BY name, id LIMIT ?',
+                                (*after, size + 1)).fetchall()
+        next_after = None
+        if len(rows) > size:
+            rows = rows[:size]
+            next_after = [rows[-1][1], rows[-1][0]]
+        return _rows_to_dicts(rows), next_after
+
+    async def consume():
+        total = 0
+        async for chunk in json_stream.iter_json_array(fetch):
+            total += len(chunk)
+        return total
+
+    return asyncio.run(consume())
+
+
+def child(variant, path, runs):
+    conn = sqlite3.connect(path)
+    fn = run_model if variant == 'model' else run_stream
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times, size = [], 0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        size = fn(conn)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    fn(conn)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(json.dumps({
+        'variant': variant,
+        'bytes': size,
+        'median_ms': round(statistics.median(times), 1),
+        'min_ms': round(min(times), 1),
+        # ru_maxrss is KiB on Linux
+        'peak_rss_growth_mb': round((peak_rss - base_rss) / 1024.0, 1),
+        'python_alloc_peak_mb': round(traced_peak / (1024.0 * 1024.0), 1),
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Listing serialization benchmark')
+    ap.add_argument('--spots', type=int, default=100_000)
+    ap.add_argument('--runs', type=int, default=5)
+    ap.add_argument('--child', choices=['model', 'stream'], help=argparse.SUPPRESS)
+    ap.add_argument('--db', help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.child, args.db, args.runs)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        build_db(path, args.spots)
+        results = []
+        for variant in ('model', 'stream'):
+            out = subprocess.run(
+                [sys.executable, __file__, '--child', variant, '--db', path, '--runs', str(args.runs)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+    report = {
+        'spots': args.spots,
+        'encoder': 'orjson' if json_stream.orjson is not None else 'json',
+        'batch_size': json_stream.STREAM_BATCH_SIZE,
+        'results': results,
+    }
+    model, stream = results
+    if stream['median_ms']:
+        report['speedup'] = round(model['median_ms'] / stream['median_ms'], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
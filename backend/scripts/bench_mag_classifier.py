@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: one minute of magnetometer readings for the whole fleet through
+backend/mag_classifier.py, i.e. the work _mag_classifier_loop does per run
+(without the DB read). Devices heartbeat every 30 s, so a run sees two readings
+per device; a share of the spots is occupied (field far off the baseline).
+
+Also reports the per-reading cost of classify(), which runs on every telemetry post.
+
+Usage:
+  python3 backend/scripts/bench_mag_classifier.py [--devices 10000] [--minutes 30] [--occupied 0.3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend import mag_classifier  # noqa: E402
+
+
+def minute_of_readings(rnd, ids, rest, occupied, per_device=2):
+    hardware_ids, mags, labels = [], [], []
+    for i, hw in enumerate(ids):
+        for _ in range(per_device):
+            parked = rnd.random() < occupied
+            offset = 800 if parked else 0
+            x, y, z = rest[i]
+            hardware_ids.append(hw)
+            mags.append((x + offset + rnd.gauss(0, 4), y + rnd.gauss(0, 4), z + rnd.gauss(0, 4)))
+            labels.append(1 if parked else 0)
+    return hardware_ids, mags, labels
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--devices", type=int, default=10000)
+    ap.add_argument("--minutes", type=int, default=30)
+    ap.add_argument("--occupied", type=float, default=0.3)
+    args = ap.parse_args()
+    if mag_classifier.np is None:
+        sys.exit("numpy is not installed; the classifier is disabled without it")
+
+    rnd = random.Random(1)
+    ids = [f"HW-{i:05d}" for i in range(args.devices)]
+    rest = [(rnd.randint(-2000, 2000), rnd.randint(-2000, 2000), rnd.randint(-2000, 2000)) for _ in ids]
+    model = mag_classifier.MagClassifier()
+
+    timings = []
+    for _ in range(args.minutes):
+        batch = minute_of_readings(rnd, ids, rest, args.occupied)
+        started = time.perf_counter()
+        model.update(*batch)
+        model.due_pushes()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"fleet: {args.devices} devices, {2 * args.devices} readings per run, {args.minutes} runs")
+    print(f"update + due_pushes per run: median {timings[len(timings) // 2]:.1f} ms, max {timings[-1]:.1f} ms")
+
+    hardware_ids, mags, _ = minute_of_readings(rnd, ids, rest, args.occupied, per_device=1)
+    readings = [(hw, {"x": m[0], "y": m[1], "z": m[2]}) for hw, m in zip(hardware_ids, mags)]
+    started = time.perf_counter()
+    for hw, mag in readings:
+        model.classify(hw, mag)
+    per_reading = (time.perf_counter() - started) / len(readings) * 1e6
+    stats = model.stats()
+    print(f"classify per reading: {per_reading:.1f} us")
+    print(f"calibrated devices: {stats['calibrated']} / {stats['devices']}")
+
+
+if __name__ == "__main__":
+    main()
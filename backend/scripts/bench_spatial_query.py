@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the spatial spot search (R*Tree) used by GET /parking-spots.
+Fills a scratch SQLite DB (all migrations applied) with N random spots across
+Switzerland, then times radius and bbox queries through backend.geo and
+compares them with a full-table scan + haversine. Results are checked for
+equality against the scan.
+
+Usage:
+  python3 backend/scripts/bench_spatial_query.py [--spots 100000] [--queries 500] [--radius 1.0]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend import geo, sqlite_migrations  # noqa: E402
+
+# Grobe Ausdehnung der Schweiz
+LAT_RANGE = (45.82, 47.81)
+LNG_RANGE = (5.96, 10.49)
+
+
+def fill(conn, n, rnd):
+    rows = [
+        (f'Spot {i}', None, rnd.uniform(*LAT_RANGE), rnd.uniform(*LNG_RANGE), 'free', 3.0)
+        for i in range(n)
+    ]
+    conn.executemany(
+        'INSERT INTO parking_spots (name, address, latitude, longitude, status, price_per_hour) VALUES (?, ?, ?, ?, ?, ?)',
+        rows,
+    )
+    conn.commit()
+
+
+def timed(fn, args_list):
+    samples = []
+    result_sizes = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        res = fn(*args)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+        result_sizes.append(len(res))
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 4),
+        'max_ms': round(samples[-1], 4),
+        'avg_results': round(sum(result_sizes) / len(result_sizes), 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description='R*Tree spot search benchmark')
+    ap.add_argument('--spots', type=int, default=100_000)
+    ap.add_argument('--queries', type=int, default=500)
+    ap.add_argument('--radius', type=float, default=1.0, help='search radius in km')
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+    rnd = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        sqlite_migrations.migrate(conn)
+        t0 = time.perf_counter()
+        fill(conn, args.spots, rnd)
+        fill_s = time.perf_counter() - t0
+        cur = conn.cursor()
+
+        centers = [(rnd.uniform(*LAT_RANGE), rnd.uniform(*LNG_RANGE)) for _ in range(args.queries)]
+
+        def radius_rtree(lat, lng):
+            rows = geo.spots_in_bbox(cur, *geo.bbox_around(lat, lng, args.radius))
+            return geo.nearest_first(rows, lat, lng, radius_km=args.radius)
+
+        def radius_scan(lat, lng):
+            cur.execute('SELECT id, name, address, latitude, longitude, status, price_per_hour FROM parking_spots')
+            return geo.nearest_first(cur.fetchall(), lat, lng, radius_km=args.radius)
+
+        # Viewport ~ 2 x 2 km
+        boxes = [geo.bbox_around(lat, lng, 1.0) for lat, lng in centers]
+
+        def bbox_rtree(min_lat, min_lng, max_lat, max_lng):
+            return geo.spots_in_bbox(cur, min_lat, min_lng, max_lat, max_lng)
+
+        # Correctness: R*Tree path must return exactly what the scan finds
+        mismatches = 0
+        for lat, lng in centers[:50]:
+            a = [r[1][0] for r in radius_rtree(lat, lng)]
+            b = [r[1][0] for r in radius_scan(lat, lng)]
+            mismatches += a != b
+
+        scan_n = min(20, args.queries)
+        report = {
+            'spots': args.spots,
+            'queries': args.queries,
+            'radius_km': args.radius,
+            'fill_seconds': round(fill_s, 2),
+            'radius_rtree': timed(radius_rtree, centers),
+            'bbox_rtree': timed(bbox_rtree, boxes),
+            'radius_full_scan': timed(radius_scan, centers[:scan_n]),
+            'mismatches_vs_scan': mismatches,
+        }
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: JSON vs. binary telemetry encoding (backend/telemetry_codec.py).
+Compares payload size on the wire and server-side parse cost per reading,
+for a single heartbeat and for a batch upload. Both variants end in the same
+reading objects the ingest path uses:
+
+  json    body as ArduinoJson builds it -> TypeAdapter.validate_json
+  binary  struct layout -> telemetry_codec.decode (Reading tuples)
+
+Usage:
+  python3 backend/scripts/bench_telemetry_codec.py [--batch 100] [--runs 20000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend import telemetry_codec  # noqa: E402
+
+from pydantic import BaseModel, TypeAdapter  # noqa: E402
+
+
+# Same shape as server_gashis.HardwareTelemetry (importing the app would init the DB)
+class HardwareTelemetry(BaseModel):
+    battery_level: Optional[float] = None
+    rssi: Optional[int] = None
+    occupancy: Optional[str] = None
+    last_mag: Optional[dict] = None
+    timestamp: Optional[datetime] = None
+
+
+def make_readings(n, with_ts):
+    rnd = random.Random(1)
+    base = int(time.time()) - n * 30
+    return [{
+        **({'timestamp': base + i * 30} if with_ts else {}),
+        'battery_level': round(rnd.uniform(3.3, 4.2), 3),
+        'rssi': rnd.randint(5, 31),
+        'occupancy': rnd.choice(['free', 'occupied']),
+        'last_mag': {'x': rnd.randint(-32000, 32000), 'y': rnd.randint(-32000, 32000), 'z': rnd.randint(-32000, 32000)},
+    } for i in range(n)]
+
+
+def json_body(readings, single):
+    items = [{**r, 'timestamp': datetime.fromtimestamp(r['timestamp']).isoformat()} if 'timestamp' in r else r
+             for r in readings]
+    return json.dumps(items[0] if single else items, separators=(',', ':')).encode()
+
+
+def per_reading_us(fn, body, n, runs):
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        fn(body)
+    return (time.perf_counter() - t0) / runs / n * 1e6
+
+
+def bench(n, runs):
+    single = n == 1
+    readings = make_readings(n, with_ts=not single)
+    jbody = json_body(readings, single)
+    bbody = telemetry_codec.encode(readings)
+
+    adapter = TypeAdapter(HardwareTelemetry if single else List[HardwareTelemetry])
+    json_parse = adapter.validate_json
+
+    binary_parse = telemetry_codec.decode
+
+    # Same values either way (battery in mV, timestamps in seconds)
+    decoded = binary_parse(bbody)
+    parsed = json_parse(jbody)
+    parsed = [parsed] if single else parsed
+    assert [(p.occupancy, p.rssi, p.last_mag) for p in parsed] == [(d.occupancy, d.rssi, d.last_mag) for d in decoded]
+
+    return {
+        'readings': n,
+        'json_bytes': len(jbody),
+        'binary_bytes': len(bbody),
+        'size_ratio': round(len(jbody) / len(bbody), 1),
+        'json_parse_us_per_reading': round(per_reading_us(json_parse, jbody, n, runs), 2),
+        'binary_parse_us_per_reading': round(per_reading_us(binary_parse, bbody, n, runs), 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Telemetry encoding benchmark')
+    ap.add_argument('--batch', type=int, default=100)
+    ap.add_argument('--runs', type=int, default=20000)
+    args = ap.parse_args()
+
+    results = [bench(1, args.runs), bench(args.batch, max(1, args.runs // args.batch))]
+    for r in results:
+        r['parse_speedup'] = round(r['json_parse_us_per_reading'] / r['binary_parse_us_per_reading'], 2)
+    print(json.dumps({'record_bytes': telemetry_codec.RECORD.size, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
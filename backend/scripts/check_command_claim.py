@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Concurrency check: every queued hardware command is handed out exactly once.
+Several processes (like uvicorn workers) poll the same device as fast as they
+can through command_queue.claim while a producer keeps queueing commands into
+one SQLite file (WAL, as db_pool opens it). Afterwards every command id must
+have been claimed by exactly one poller. Exits with status 1 on duplicates or
+lost commands.
+
+Modes:
+  returning  single UPDATE ... RETURNING (SQLite >= 3.35, the default path)
+  per-row    fallback for older SQLite: conditional UPDATE per selected row
+  legacy     the former SELECT, then UPDATE ... WHERE id IN (...) - shows the race
+
+Usage:
+  python3 backend/scripts/check_command_claim.py [--workers 8] [--commands 3000] [--mode returning per-row]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend import command_queue, sqlite_migrations  # noqa: E402
+
+HARDWARE_ID = "HW-LOAD"
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def legacy_claim(cursor, hardware_id):
+    cursor.execute('''
+        SELECT id, command, parameters, created_at FROM hardware_commands
+        WHERE hardware_id = ? AND status = 'queued' ORDER BY created_at ASC
+    ''', (hardware_id,))
+    rows = cursor.fetchall()
+    if rows:
+        ids = [r[0] for r in rows]
+        cursor.execute(f"UPDATE hardware_commands SET status = 'sent' WHERE id IN ({','.join('?' * len(ids))})", ids)
+    return [{"id": r[0]} for r in rows]
+
+
+def producer(path, total, batch, done):
+    conn = connect(path)
+    for start in range(0, total, batch):
+        with conn:
+            conn.executemany("INSERT INTO hardware_commands (hardware_id, command) VALUES (?, 'raise_barrier')",
+                             [(HARDWARE_ID,)] * min(batch, total - start))
+        time.sleep(0.001)
+    done.set()
+
+
+def poller(path, mode, done, results):
+    conn = connect(path)
+    cursor = conn.cursor()
+    claimed, polls = [], 0
+    while True:
+        finished = done.is_set()  # read before polling: an empty poll after this is final
+        with conn:
+            if mode == "legacy":
+                cmds = legacy_claim(cursor, HARDWARE_ID)
+            else:
+                cmds = command_queue.claim(cursor, HARDWARE_ID, returning=(mode == "returning"))
+        polls += 1
+        claimed.extend(c["id"] for c in cmds)
+        if finished and not cmds:
+            break
+    results.put((claimed, polls))
+
+
+def run(mode, workers, commands, batch):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "claim.db")
+        conn = connect(path)
+        sqlite_migrations.migrate(conn)
+        conn.close()
+
+        done, results = mp.Event(), mp.Queue()
+        procs = [mp.Process(target=poller, args=(path, mode, done, results)) for _ in range(workers)]
+        procs.append(mp.Process(target=producer, args=(path, commands, batch, done)))
+        started = time.perf_counter()
+        for p in procs:
+            p.start()
+        outcome = [results.get() for _ in range(workers)]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - started
+
+        counts = Counter(i for claimed, _ in outcome for i in claimed)
+        with connect(path) as check:
+            queued = check.execute("SELECT count(*) FROM hardware_commands WHERE status = 'queued'").fetchone()[0]
+    duplicates = sum(1 for n in counts.values() if n > 1)
+    lost = commands - len(counts)
+    polls = sum(p for _, p in outcome)
+    ok = duplicates == 0 and lost == 0 and queued == 0
+    print(f"[{'  ok' if ok else 'FAIL'}] {mode:9s} {workers} pollers, {commands} commands, {polls} polls in {elapsed:.1f}s: "
+          f"{duplicates} handed out twice, {lost} never handed out")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--commands", type=int, default=3000)
+    ap.add_argument("--batch", type=int, default=3, help="commands queued per producer transaction")
+    ap.add_argument("--mode", nargs="+", default=["returning", "per-row"], choices=["returning", "per-row", "legacy"])
+    args = ap.parse_args()
+
+    if "returning" in args.mode and not command_queue.HAS_RETURNING:
+        print(f"SQLite {sqlite3.sqlite_version} has no RETURNING; skipping mode 'returning'")
+        args.mode.remove("returning")
+    results = [run(mode, args.workers, args.commands, args.batch) for mode in args.mode]
+    if not all(results):
+        sys.exit(1)
+    print("Every command was handed out exactly once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Correctness check: a manual spot status is corrected by the next sensor readings.
+A spot is set by hand (PUT/POST /parking-spots/{id}/status) while its sensor's
+debounced state says otherwise. After OccupancyTracker.override the sensor must
+move the spot back with a real transition (written to parking_spots and
+occupancy_events) once it reports its state OCCUPANCY_DEBOUNCE_READINGS times.
+Exits with status 1 otherwise.
+
+Usage:
+  python3 backend/scripts/check_occupancy_override.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend import occupancy  # noqa: E402
+
+HARDWARE_ID = "HW-SPOT"
+
+
+def replay(tracker, state, start):
+    """Sensor reports ``state`` every 30 s until debounced; returns the transitions."""
+    out = []
+    for i in range(tracker.debounce):
+        t = tracker.observe(HARDWARE_ID, state, start + 30 * i)
+        if t:
+            out.append(t)
+    return out
+
+
+def main():
+    failures = 0
+    for debounce in (1, 2, 3):
+        tracker = occupancy.OccupancyTracker(debounce)
+        tracker.seed([(HARDWARE_ID, "occupied")])
+        # Manual override, the car is still there
+        tracker.override([HARDWARE_ID], "free")
+        got = replay(tracker, "occupied", 1000.0)
+        want = [occupancy.Transition(HARDWARE_ID, "free", "occupied", 1000.0)]
+        ok = got == want and tracker.state(HARDWARE_ID) == "occupied"
+        print(f'[{"ok" if ok else "FAIL":>4}] debounce={debounce}: {got}')
+        failures += not ok
+        # Override agreeing with the sensor: no transition
+        tracker.override([HARDWARE_ID], "occupied")
+        quiet = replay(tracker, "occupied", 2000.0)
+        if quiet:
+            print(f'[FAIL] debounce={debounce}: override to the same state emitted {quiet}')
+            failures += 1
+    if failures:
+        print(f'{failures} case(s) leave a manual status uncorrected')
+        sys.exit(1)
+    print('Sensors correct manually set spot status')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Checks that the hot SQLite queries of server_gashis are served by an index.
+Applies all migrations to a scratch database (or uses --db), runs
+EXPLAIN QUERY PLAN for every entry in hot_queries.HOT_QUERIES (the statements
+the server runs) and exits
+with status 1 if any plan contains a full table scan.
+
+Usage:
+  python3 backend/scripts/check_query_plans.py            # fresh temp DB
+  python3 backend/scripts/check_query_plans.py --db backend/parking.db
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend import hot_queries  # noqa: E402
+from backend import sqlite_migrations  # noqa: E402
+
+
+def plan_lines(conn, sql, params):
+    rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    # rows: (id, parent, notused, detail)
+    return [r[3] for r in rows]
+
+
+def is_full_scan(detail: str, subqueries=()) -> bool:
+    # "SCAN t" ist ein Full Scan; "SEARCH t USING INDEX ..." ist ok
+    if not detail.startswith('SCAN '):
+        return False
+    # Scanning the (already bounded) result of a subquery is not a table scan
+    if detail.split()[1] in subqueries:
+        return False
+    # Virtual tables (R*Tree) always report SCAN; the part after "INDEX n:"
+    # lists the constraints handed to the module - empty means full scan.
+    if 'VIRTUAL TABLE INDEX' in detail:
+        return detail.rsplit(':', 1)[-1].strip() == ''
+    return True
+
+
+def subquery_names(details):
+    return {d.split()[1] for d in details if d.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--db', help='existing SQLite file (migrations are applied to it)')
+    args = ap.parse_args()
+
+    tmpdir = None
+    if args.db:
+        path = args.db
+    else:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, 'plans.db')
+
+    conn = sqlite3.connect(path)
+    try:
+        version = sqlite_migrations.migrate(conn)
+        print(f'Schema version: {version}')
+        failures = 0
+        for name, sql, params in hot_queries.HOT_QUERIES:
+            details = plan_lines(conn, sql, params)
+            subqueries = subquery_names(details)
+            scans = [d for d in details if is_full_scan(d, subqueries)]
+            mark = 'FAIL' if scans else 'ok'
+            print(f'[{mark:>4}] {name}')
+            for d in details:
+                print(f'         {d}')
+            if scans:
+                failures += 1
+    finally:
+        conn.close()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    if failures:
+        print(f'{failures} hot query(s) fall back to a full table scan')
+        sys.exit(1)
+    print('All hot queries use an index')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Correctness check: rollup "last" values survive readings that lack a metric.
+Feeds mixed readings (full, battery only, rssi only, a late offline upload)
+into a scratch database and compares every bucket's last values with the
+expected ones for three paths: the insert trigger, the backfill of migration
+0008 (readings recorded before the rollups existed) and the repair of
+migration 0015 (buckets whose last values were cleared by the old trigger).
+Exits with status 1 on any mismatch.
+
+Usage:
+  python3 backend/scripts/check_telemetry_rollups.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend import sqlite_migrations, telemetry_rollups, telemetry_store  # noqa: E402
+
+HARDWARE_ID = "HW-ROLLUP"
+T0 = 1_700_000_040.0  # start of a minute bucket
+
+READINGS = [
+    telemetry_store.reading_row(HARDWARE_ID, T0 + 5, battery_level=3.7, rssi=-70, occupancy="occupied"),
+    telemetry_store.reading_row(HARDWARE_ID, T0 + 15, rssi=-71),
+    telemetry_store.reading_row(HARDWARE_ID, T0 + 25, battery_level=3.6),
+    # Offline upload older than every last value: must not replace any of them
+    telemetry_store.reading_row(HARDWARE_ID, T0, battery_level=3.9, rssi=-90, occupancy="free"),
+]
+EXPECTED = {"battery_level": 3.6, "rssi": -71, "occupancy_last": "occupied"}
+
+
+def last_values(conn):
+    got = []
+    for tier in (60, 3600, 86400):
+        for bucket in telemetry_rollups.rollups(conn.cursor(), HARDWARE_ID, tier, T0, T0 + 60):
+            got.append({
+                "battery_level": bucket["battery_level"] and bucket["battery_level"]["last"],
+                "rssi": bucket["rssi"] and bucket["rssi"]["last"],
+                "occupancy_last": bucket["occupancy_last"],
+            })
+    return got
+
+
+def migrate_to(conn, version):
+    for number, _, fn in sqlite_migrations.MIGRATIONS:
+        if number <= version:
+            fn(conn.cursor())
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+    conn.commit()
+
+
+def via_trigger(conn):
+    sqlite_migrations.migrate(conn)
+    telemetry_store.insert_readings(conn.cursor(), READINGS)
+    conn.commit()
+
+
+def via_backfill(conn):
+    migrate_to(conn, 7)
+    telemetry_store.insert_readings(conn.cursor(), READINGS)
+    conn.commit()
+    sqlite_migrations.migrate(conn)
+
+
+def via_repair(conn):
+    via_trigger(conn)
+    # State left behind by the old trigger
+    conn.execute("UPDATE telemetry_rollups SET rssi_last = NULL, occupancy_last = NULL")
+    conn.execute("PRAGMA user_version = 14")
+    conn.commit()
+    sqlite_migrations.migrate(conn)
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, setup in (("trigger", via_trigger), ("backfill", via_backfill), ("repair", via_repair)):
+            conn = sqlite3.connect(os.path.join(tmp, f'{name}.db'))
+            try:
+                setup(conn)
+                got = last_values(conn)
+            finally:
+                conn.close()
+            ok = len(got) == 3 and all(g == EXPECTED for g in got)
+            print(f'[{"ok" if ok else "FAIL":>4}] {name}: {got}')
+            failures += not ok
+    if failures:
+        print(f'{failures} path(s) lose or misplace rollup last values')
+        sys.exit(1)
+    print('Rollup last values survive partial readings')
+
+
+if __name__ == '__main__':
+    main()
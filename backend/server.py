@@ -1,18 +1,24 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from bson.errors import InvalidId
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timedelta
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
 import jwt
 import hashlib
 import json
+from backend import liveness
+from backend import pagination
 
 # FastAPI App für gashis.ch
 app = FastAPI(
@@ -293,10 +299,110 @@ async def login(login_data: UserLogin):
     return {"access_token": access_token, "token_type": "bearer", "user": {"id": user["id"], "email": user["email"], "name": user["name"], "role": user["role"]}}
 
 # Parking spot endpoints
+def _geo_point(latitude: float, longitude: float) -> Dict[str, Any]:
+    # GeoJSON order is [lng, lat]
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+@app.on_event("startup")
+async def ensure_geo_index():
+    """2dsphere index on parking_spots.location; backfills spots stored before it existed."""
+    if MEMORY_MODE:
+        return
+    try:
+        await db.parking_spots.update_many(
+            {"location": {"$exists": False}},
+            [{"$set": {"location": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}],
+        )
+        await db.parking_spots.create_index([("location", "2dsphere")])
+    except Exception as e:
+        logger.warning(f"Could not ensure 2dsphere index on parking_spots: {e}")
+
+@app.on_event("startup")
+async def ensure_hardware_commands_index():
+    """(hardware_id, processed, created_at) for the claim in get_pending_commands."""
+    if MEMORY_MODE:
+        return
+    try:
+        await db.hardware_commands.create_index([("hardware_id", 1), ("processed", 1), ("created_at", 1)])
+    except Exception as e:
+        logger.warning(f"Could not ensure hardware_commands index: {e}")
+
+SENSOR_READINGS_RETENTION_DAYS = int(os.environ.get("SENSOR_READINGS_RETENTION_DAYS", "90"))
+
+@app.on_event("startup")
+async def ensure_sensor_readings_store():
+    """sensor_readings as a time-series collection (bucketed by hardware_id, TTL retention).
+
+    An existing plain collection cannot be converted in place; it gets a
+    (hardware_id, timestamp) index and a TTL index instead.
+    """
+    if MEMORY_MODE:
+        return
+    ttl = SENSOR_READINGS_RETENTION_DAYS * 86400
+    try:
+        existing = await db.list_collection_names(filter={"name": "sensor_readings"})
+        if not existing:
+            await db.create_collection(
+                "sensor_readings",
+                timeseries={"timeField": "timestamp", "metaField": "hardware_id", "granularity": "minutes"},
+                expireAfterSeconds=ttl,
+            )
+        else:
+            opts = await db.sensor_readings.options()
+            if "timeseries" not in opts:
+                logger.warning("sensor_readings is a plain collection; using TTL index instead of time-series buckets")
+                await db.sensor_readings.create_index("timestamp", expireAfterSeconds=ttl)
+        await db.sensor_readings.create_index([("hardware_id", 1), ("timestamp", 1)])
+    except Exception as e:
+        logger.warning(f"Could not set up sensor_readings time-series store: {e}")
+
 @api_router.get("/parking-spots")
-async def get_parking_spots(lat: Optional[float] = None, lng: Optional[float] = None, radius: Optional[float] = 5.0):
-    spots = await db.parking_spots.find().to_list(1000)
-    return [ParkingSpot(**spot) for spot in spots]
+async def get_parking_spots(
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    radius: Optional[float] = 5.0,
+    bbox: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    """All spots, or with ``lat/lng`` (+ ``radius`` km) / ``bbox=minLng,minLat,maxLng,maxLat``
+    only the spots in that area, nearest first and with ``distance_km``."""
+    try:
+        limit = pagination.page_size(limit, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if radius is not None and radius < 0:
+        raise HTTPException(status_code=400, detail="radius must be >= 0 km")
+    if lat is None and lng is None and not bbox:
+        spots = await db.parking_spots.find().to_list(1000)
+        return [ParkingSpot(**spot) for spot in spots]
+    if (lat is None) != (lng is None):
+        raise HTTPException(status_code=400, detail="lat and lng must be given together")
+
+    geo_near: Dict[str, Any] = {"key": "location", "distanceField": "distance_m", "spherical": True}
+    if bbox:
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(p) for p in bbox.split(","))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bbox must be minLng,minLat,maxLng,maxLat")
+        if min_lat > max_lat or min_lng > max_lng:
+            raise HTTPException(status_code=400, detail="bbox min > max")
+        ring = [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+        geo_near["query"] = {"location": {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}}
+    if lat is not None:
+        geo_near["near"] = _geo_point(lat, lng)
+        geo_near["maxDistance"] = (5.0 if radius is None else radius) * 1000.0
+    else:
+        # Nur bbox: nach Distanz zur Mitte des Ausschnitts sortieren
+        geo_near["near"] = _geo_point((min_lat + max_lat) / 2, (min_lng + max_lng) / 2)
+
+    pipeline: List[Dict[str, Any]] = [{"$geoNear": geo_near}]
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    spots = await db.parking_spots.aggregate(pipeline).to_list(1000 if limit is None else limit)
+    return [
+        {**ParkingSpot(**spot).dict(), "distance_km": round(spot["distance_m"] / 1000.0, 4)}
+        for spot in spots
+    ]
 
 @api_router.post("/parking-spots")
 async def create_parking_spot(spot_data: ParkingSpotCreate, current_user: User = Depends(get_current_user)):
@@ -307,7 +413,7 @@ async def create_parking_spot(spot_data: ParkingSpotCreate, current_user: User =
     spot_dict["owner_id"] = current_user.id
     spot = ParkingSpot(**spot_dict)
     
-    await db.parking_spots.insert_one(spot.dict())
+    await db.parking_spots.insert_one({**spot.dict(), "location": _geo_point(spot.latitude, spot.longitude)})
     return spot
 
 @api_router.get("/parking-spots/{spot_id}")
@@ -334,6 +440,7 @@ async def update_parking_spot(spot_id: str, spot_data: ParkingSpotCreate, curren
     spot_dict = spot_data.dict()
     spot_dict["owner_id"] = current_user.id
     spot_dict["last_updated"] = datetime.utcnow()
+    spot_dict["location"] = _geo_point(spot_data.latitude, spot_data.longitude)
     
     result = await db.parking_spots.update_one(
         {"id": spot_id},
@@ -690,12 +797,51 @@ async def delete_review(review_id: str, current_user: User = Depends(get_current
     return {"message": "Review deleted successfully"}
 
 # Admin endpoints
+# Admin listings page by keyset on _id (always indexed, insertion order) instead of
+# silently cutting at 1000; the next page's cursor comes in X-Next-Cursor.
+ADMIN_PAGE_SIZE = int(os.environ.get("ADMIN_PAGE_SIZE", "1000"))
+ADMIN_MAX_PAGE_SIZE = 5000
+
+async def _admin_page(collection, response: Response, limit: Optional[int], cursor: Optional[str],
+                      fields: Optional[str], allowed: List[str]):
+    """One page of ``collection`` ordered by _id; returns (docs, selected fields or None)."""
+    size = ADMIN_PAGE_SIZE if limit is None else limit
+    if not (1 <= size <= ADMIN_MAX_PAGE_SIZE):
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {ADMIN_MAX_PAGE_SIZE}")
+    query: Dict[str, Any] = {}
+    if cursor:
+        try:
+            query["_id"] = {"$gt": ObjectId(cursor)}
+        except (InvalidId, TypeError):
+            raise HTTPException(status_code=400, detail="malformed cursor")
+    selected = None
+    projection = None
+    if fields:
+        wanted = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in wanted if f not in allowed]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"unknown field(s): {', '.join(unknown)}")
+        selected = [f for f in allowed if f in wanted or f == "id"]
+        projection = {f: 1 for f in selected}
+    docs = await collection.find(query, projection).sort("_id", 1).limit(size + 1).to_list(size + 1)
+    if len(docs) > size:
+        docs = docs[:size]
+        response.headers["X-Next-Cursor"] = str(docs[-1]["_id"])
+    return docs, selected
+
+def _projected(docs: List[Dict[str, Any]], selected: List[str]) -> List[Dict[str, Any]]:
+    return [{f: doc[f] for f in selected if f in doc} for doc in docs]
+
 @api_router.get("/admin/users")
-async def get_all_users(current_user: User = Depends(get_current_user)):
+async def get_all_users(response: Response, limit: Optional[int] = None, cursor: Optional[str] = None,
+                        fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access user data")
     
-    users = await db.users.find().to_list(1000)
+    allowed = [f for f in User.model_fields if f != "password_hash"]
+    users, selected = await _admin_page(db.users, response, limit, cursor, fields, allowed)
+    if selected is not None:
+        return _projected(users, selected)
     # Remove password hashes from response and convert ObjectId to string
     for user in users:
         user.pop("password_hash", None)
@@ -703,19 +849,25 @@ async def get_all_users(current_user: User = Depends(get_current_user)):
     return users
 
 @api_router.get("/admin/parking-spots")
-async def get_all_parking_spots_admin(current_user: User = Depends(get_current_user)):
+async def get_all_parking_spots_admin(response: Response, limit: Optional[int] = None, cursor: Optional[str] = None,
+                                      fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access all parking spots")
     
-    spots = await db.parking_spots.find().to_list(1000)
+    spots, selected = await _admin_page(db.parking_spots, response, limit, cursor, fields, list(ParkingSpot.model_fields))
+    if selected is not None:
+        return _projected(spots, selected)
     return [ParkingSpot(**spot) for spot in spots]
 
 @api_router.get("/admin/parking-sessions")
-async def get_all_parking_sessions_admin(current_user: User = Depends(get_current_user)):
+async def get_all_parking_sessions_admin(response: Response, limit: Optional[int] = None, cursor: Optional[str] = None,
+                                         fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access all parking sessions")
     
-    sessions = await db.parking_sessions.find().to_list(1000)
+    sessions, selected = await _admin_page(db.parking_sessions, response, limit, cursor, fields, list(ParkingSession.model_fields))
+    if selected is not None:
+        return _projected(sessions, selected)
     return [ParkingSession(**session) for session in sessions]
 
 @api_router.delete("/admin/users/{user_id}")
@@ -1144,6 +1296,88 @@ async def get_detailed_revenue(period: str, current_user: User = Depends(get_cur
         "period_type": period
     }
 
+# Heartbeat deadlines (min-heap) for online/offline, see backend/liveness.py
+device_liveness = liveness.LivenessTracker()
+_liveness_task: Optional[asyncio.Task] = None
+
+def _utc_epoch(value) -> Optional[float]:
+    # last_heartbeat is stored as naive UTC (datetime.utcnow())
+    if not isinstance(value, datetime):
+        return None
+    return value.replace(tzinfo=timezone.utc).timestamp() if value.tzinfo is None else value.timestamp()
+
+async def _liveness_loop():
+    while True:
+        await asyncio.sleep(liveness.LIVENESS_CHECK_INTERVAL_SECONDS)
+        try:
+            now = time.time()
+            due = device_liveness.due(now)
+            if not due:
+                continue
+            expired = [hw for hw, _ in due]
+            cutoff = datetime.utcfromtimestamp(now - device_liveness.timeout)
+            alive = {}
+            try:
+                if MEMORY_MODE:
+                    for hw in expired:
+                        dev = memory_hardware_devices.get(hw)
+                        if dev and dev.get("status") == "online":
+                            dev["status"] = "offline"
+                else:
+                    # Another worker may have received the heartbeat: re-arm those instead
+                    async for dev in db.hardware_devices.find(
+                        {"hardware_id": {"$in": expired}, "last_heartbeat": {"$gte": cutoff}},
+                        {"hardware_id": 1, "last_heartbeat": 1},
+                    ):
+                        seen = _utc_epoch(dev["last_heartbeat"])
+                        if seen is not None:
+                            alive[dev["hardware_id"]] = seen
+                    # "maintenance" is set by hand and stays
+                    await db.hardware_devices.update_many(
+                        {"hardware_id": {"$in": expired}, "status": "online", "last_heartbeat": {"$lt": cutoff}},
+                        {"$set": {"status": "offline"}},
+                    )
+            except Exception:
+                # Not settled: back into the heap, due again on the next pass
+                for hw, deadline in due:
+                    device_liveness.rearm(hw, deadline - device_liveness.timeout)
+                raise
+            # Re-arming records no event, so a device served by another worker does not flap
+            for hw, seen in alive.items():
+                device_liveness.rearm(hw, seen)
+            offline = [hw for hw, deadline in due if hw not in alive and device_liveness.confirm_offline(hw, deadline)]
+            if offline:
+                logger.info(f"[LIVENESS] {len(offline)} device(s) offline: {', '.join(offline[:10])}")
+        except Exception as e:
+            logger.warning(f"[LIVENESS] check failed: {e}")
+
+@app.on_event("startup")
+async def start_liveness_tracker():
+    """Seed the deadline heap from the stored heartbeats and start the expiry loop."""
+    global _liveness_task
+    try:
+        if MEMORY_MODE:
+            rows = [(hw, _utc_epoch(dev.get("last_heartbeat"))) for hw, dev in memory_hardware_devices.items()]
+        else:
+            rows = [(dev["hardware_id"], _utc_epoch(dev.get("last_heartbeat")))
+                    async for dev in db.hardware_devices.find({}, {"hardware_id": 1, "last_heartbeat": 1})]
+        device_liveness.seed(rows)
+    except Exception as e:
+        logger.warning(f"[LIVENESS] seeding failed: {e}")
+    _liveness_task = asyncio.create_task(_liveness_loop())
+
+@app.on_event("shutdown")
+async def stop_liveness_tracker():
+    if _liveness_task is not None:
+        _liveness_task.cancel()
+        await asyncio.gather(_liveness_task, return_exceptions=True)
+
+@api_router.get("/hardware/liveness")
+async def hardware_liveness(offline_limit: int = 100):
+    """Online/offline counts from the in-memory deadline heap (no collection scan),
+    the longest-silent offline devices and the latest online/offline events."""
+    return device_liveness.summary(offline_limit=max(0, min(offline_limit, 1000)))
+
 # Hardware Management Endpoints
 @api_router.post("/hardware/register")
 async def register_hardware_device(device: HardwareDevice):
@@ -1197,8 +1431,12 @@ async def register_hardware_device(device: HardwareDevice):
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/hardware/{hardware_id}/heartbeat")
-async def hardware_heartbeat(hardware_id: str, status: HardwareStatus):
-    """Receive heartbeat and status from hardware device"""
+async def hardware_heartbeat(hardware_id: str, status: HardwareStatus, commands: bool = False):
+    """Receive heartbeat and status from hardware device.
+
+    With ``?commands=1`` the response also carries the device's pending commands
+    (claimed like GET /hardware/{id}/commands), saving the separate poll request.
+    """
     try:
         # In-memory fallback when DB is not available
         if MEMORY_MODE:
@@ -1227,7 +1465,11 @@ async def hardware_heartbeat(hardware_id: str, status: HardwareStatus):
                     spot["last_updated"] = datetime.utcnow()
                     break
 
-            return {"message": "Heartbeat received (memory)", "command": "continue"}
+            device_liveness.beat(hardware_id)
+            response = {"message": "Heartbeat received (memory)", "command": "continue"}
+            if commands:
+                response["commands"] = await _claim_pending_commands(hardware_id)
+            return response
 
         # Update device status
         update_data = {
@@ -1244,6 +1486,8 @@ async def hardware_heartbeat(hardware_id: str, status: HardwareStatus):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Hardware device not found")
+        if device_liveness.beat(hardware_id):
+            logger.info(f"[LIVENESS] {hardware_id} online")
         
         # Update parking spot availability
         spot_update = await db.parking_spots.update_one(
@@ -1254,16 +1498,26 @@ async def hardware_heartbeat(hardware_id: str, status: HardwareStatus):
             }}
         )
         
-        # Store sensor reading
-        sensor_reading = SensorReading(
-            hardware_id=hardware_id,
-            sensor_type="occupancy",
-            value=1.0 if status.is_occupied else 0.0,
-            unit="boolean"
-        )
-        await db.sensor_readings.insert_one(sensor_reading.dict())
-        
-        return {"message": "Heartbeat received", "command": "continue"}
+        # Store sensor readings (one measurement per sensor, one round trip)
+        now = datetime.utcnow()
+        readings = [
+            SensorReading(hardware_id=hardware_id, sensor_type="occupancy",
+                          value=1.0 if status.is_occupied else 0.0, unit="boolean", timestamp=now),
+            SensorReading(hardware_id=hardware_id, sensor_type="battery",
+                          value=status.battery_level, unit="V", timestamp=now),
+            SensorReading(hardware_id=hardware_id, sensor_type="solar",
+                          value=status.solar_voltage, unit="V", timestamp=now),
+            SensorReading(hardware_id=hardware_id, sensor_type="signal",
+                          value=float(status.signal_strength), unit="dBm", timestamp=now),
+            SensorReading(hardware_id=hardware_id, sensor_type="temperature",
+                          value=status.temperature, unit="C", timestamp=now),
+        ]
+        await db.sensor_readings.insert_many([r.dict() for r in readings], ordered=False)
+
+        response = {"message": "Heartbeat received", "command": "continue"}
+        if commands:
+            response["commands"] = await _claim_pending_commands(hardware_id)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1301,41 +1555,43 @@ async def send_hardware_command(hardware_id: str, command: HardwareCommand, curr
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _claim_pending_commands(hardware_id: str) -> List[HardwareCommand]:
+    """Hand out the device's pending commands (at most 10, oldest first) exactly once."""
+    if MEMORY_MODE:
+        # Serve and clear in-memory commands for this hardware
+        queued = memory_hardware_commands.get(hardware_id, [])
+        # Convert to HardwareCommand-like objects
+        cmds = []
+        for cmd in queued:
+            cmds.append(HardwareCommand(**{
+                "hardware_id": hardware_id,
+                "command": cmd.get("command"),
+                "parameters": cmd.get("parameters", {}),
+                "issued_by": cmd.get("issued_by", "memory"),
+                "created_at": cmd.get("created_at", datetime.utcnow())
+            }))
+        # Clear queue after serving
+        memory_hardware_commands[hardware_id] = []
+        return cmds
+    # Claim oldest first, one document per find_one_and_update: each one flips to
+    # processed exactly once, so two workers or a retried poll never both get it
+    commands = []
+    for _ in range(10):
+        cmd = await db.hardware_commands.find_one_and_update(
+            {"hardware_id": hardware_id, "processed": {"$ne": True}},
+            {"$set": {"processed": True, "processed_at": datetime.utcnow()}},
+            sort=[("created_at", 1)],
+        )
+        if cmd is None:
+            break
+        commands.append(cmd)
+    return [HardwareCommand(**cmd) for cmd in commands]
+
 @api_router.get("/hardware/{hardware_id}/commands")
 async def get_pending_commands(hardware_id: str):
     """Get pending commands for hardware device"""
     try:
-        if MEMORY_MODE:
-            # Serve and clear in-memory commands for this hardware
-            queued = memory_hardware_commands.get(hardware_id, [])
-            # Convert to HardwareCommand-like objects
-            cmds = []
-            for cmd in queued:
-                cmds.append(HardwareCommand(**{
-                    "hardware_id": hardware_id,
-                    "command": cmd.get("command"),
-                    "parameters": cmd.get("parameters", {}),
-                    "issued_by": cmd.get("issued_by", "memory"),
-                    "created_at": cmd.get("created_at", datetime.utcnow())
-                }))
-            # Clear queue after serving
-            memory_hardware_commands[hardware_id] = []
-            return {"commands": cmds}
-        # Get unprocessed commands
-        commands = await db.hardware_commands.find({
-            "hardware_id": hardware_id,
-            "processed": {"$ne": True}
-        }).sort([("created_at", 1)]).to_list(10)
-        
-        # Mark as processed
-        if commands:
-            command_ids = [cmd["_id"] for cmd in commands]
-            await db.hardware_commands.update_many(
-                {"_id": {"$in": command_ids}},
-                {"$set": {"processed": True, "processed_at": datetime.utcnow()}}
-            )
-        
-        return {"commands": [HardwareCommand(**cmd) for cmd in commands]}
+        return {"commands": await _claim_pending_commands(hardware_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,12 +1,33 @@
-from fastapi import FastAPI, HTTPException, Depends, Form, Request, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Form, Request, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr, SecretStr
-from typing import List, Optional
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, EmailStr, SecretStr, TypeAdapter, ValidationError
+from typing import Dict, List, Optional
 import sqlite3
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from backend import auth
+from backend import db_pool
+from backend import db_executor
+from backend import sqlite_migrations
+from backend import geo
+from backend import response_cache
+from backend import spot_changes
+from backend import pagination
+from backend import json_stream
+from backend import telemetry_store
+from backend import telemetry_buffer
+from backend import telemetry_codec
+from backend import telemetry_rollups
+from backend import occupancy
+from backend import downsample
+from backend import liveness
+from backend import fleet_snapshot
+from backend import mag_classifier
+from backend import command_waiters
+from backend import command_queue
+from backend import hot_queries
 """Optional import of graph_mailer.
 If dependencies (httpx/msal) are missing or the module errors at import time,
 we degrade gracefully so the API can still start and /health works.
@@ -20,14 +41,14 @@ except Exception as e:  # broad: any import/init failure
 
     graph_mailer = _GraphMailerStub()  # type: ignore
 import secrets
-from starlette.responses import RedirectResponse
+from starlette.responses import RedirectResponse, Response
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 import pathlib
 import asyncio
 import time
 import requests
-from collections import defaultdict, deque
+from collections import Counter, defaultdict, deque
 
 # Load environment variables from .env file in parent directory
 env_path = pathlib.Path(__file__).parent.parent / '.env'
@@ -93,114 +114,57 @@ app.add_middleware(
 
 # Database Setup
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), "parking.db")
+# Shared long-lived connections (one per thread) instead of connect/close per request
+sqlite_pool = db_pool.SQLitePool(DATABASE_PATH)
+# Bounded thread pool for all blocking DB work (sqlite3, SQLAlchemy, bcrypt); keeps the event loop free
+db_worker = db_executor.DBExecutor()
+# Serialized public spot list; every spot write path calls spot_list_cache.bump()
+spot_list_cache = response_cache.VersionedResponseCache("parking_spots")
 
-def init_database():
-    """Initialize SQLite database with tables and demo data"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    # Create parking_spots table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS parking_spots (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            address TEXT,
-            latitude REAL NOT NULL,
-            longitude REAL NOT NULL,
-            status TEXT DEFAULT 'free',
-            price_per_hour REAL DEFAULT 0.0,
-            owner_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
 
-    # Ensure owner_id exists for older databases
-    try:
-        cursor.execute("ALTER TABLE parking_spots ADD COLUMN owner_id INTEGER")
-    except Exception:
-        # Column already exists
-        pass
-    
-    # Create users table (simple)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Create hardware devices table: maps hardware_id -> owner_email and parking_spot
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS hardware_devices (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            hardware_id TEXT UNIQUE NOT NULL,
-            owner_email TEXT,
-            parking_spot_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    # Add telemetry columns if they don't exist (nullable)
-    try:
-        cursor.execute("ALTER TABLE hardware_devices ADD COLUMN last_heartbeat TIMESTAMP")
-    except Exception:
-        pass
-    try:
-        cursor.execute("ALTER TABLE hardware_devices ADD COLUMN battery_level REAL")
-    except Exception:
-        pass
-    try:
-        cursor.execute("ALTER TABLE hardware_devices ADD COLUMN rssi INTEGER")
-    except Exception:
-        pass
-    try:
-        cursor.execute("ALTER TABLE hardware_devices ADD COLUMN occupancy TEXT")
-    except Exception:
-        pass
-    try:
-        cursor.execute("ALTER TABLE hardware_devices ADD COLUMN last_mag JSON")
-    except Exception:
-        pass
+def _keyset_fetcher(load, key, transform=None, batch_size=None):
+    """Adapt a keyset loader ``load(after, size)`` (returns size+1 rows if more exist)
+    to the batch interface of json_stream: each batch is one short job on db_worker."""
+    size = batch_size or json_stream.STREAM_BATCH_SIZE
 
-    # Create persistent hardware commands queue
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS hardware_commands (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            hardware_id TEXT NOT NULL,
-            command TEXT NOT NULL,
-            parameters TEXT,
-            status TEXT DEFAULT 'queued', -- queued | sent | done | failed
-            issued_by TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            claimed_at TIMESTAMP,
-            executed_at TIMESTAMP
-        )
-    ''')
+    async def fetch(after):
+        rows = await db_worker.run(load, after, size)
+        next_after = None
+        if len(rows) > size:
+            rows = rows[:size]
+            next_after = key(rows[-1])
+        return (rows if transform is None else [transform(r) for r in rows]), next_after
+
+    return fetch
+
+def init_database():
+    """Initialize SQLite database with tables and demo data"""
+    with sqlite_pool.connection() as conn:
+        # Schema lives in versioned migrations (PRAGMA user_version)
+        sqlite_migrations.migrate(conn)
+        cursor = conn.cursor()
     
-    # Check if we have demo data
-    cursor.execute('SELECT COUNT(*) FROM parking_spots')
-    if cursor.fetchone()[0] == 0:
-        # Insert Swiss demo data
-        demo_spots = [
-            ("Zürich HB Parkhaus Sihlquai", "Sihlquai 41, 8005 Zürich", 47.3769, 8.5417, "free", 4.50),
-            ("Basel SBB Centralbahnplatz", "Centralbahnpl. 20, 4051 Basel", 47.5474, 7.5892, "occupied", 3.80),
-            ("Bern Bahnhof Parking", "Bahnhofplatz 10A, 3011 Bern", 46.9481, 7.4474, "free", 4.20),
-            ("Genève Aéroport P51", "Route de l'Aéroport 21, 1215 Genève", 46.2044, 6.1432, "free", 5.00),
-            ("Luzern Parkhaus Bahnhof", "Bahnhofstrasse 3, 6003 Luzern", 47.0502, 8.3093, "occupied", 3.90),
-            ("St. Gallen Bahnhof", "Bahnhofplatz 1A, 9001 St. Gallen", 47.4245, 9.3767, "free", 3.50),
-            ("Winterthur Zentrum", "Stadthausstrasse 1, 8400 Winterthur", 47.4979, 8.7211, "free", 3.20),
-            ("Lausanne Gare CFF", "Place de la Gare 9, 1003 Lausanne", 46.5197, 6.6323, "occupied", 4.00)
-        ]
-        
-        for spot in demo_spots:
-            cursor.execute('''
-                INSERT INTO parking_spots (name, address, latitude, longitude, status, price_per_hour)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', spot)
+        # Check if we have demo data
+        cursor.execute('SELECT COUNT(*) FROM parking_spots')
+        if cursor.fetchone()[0] == 0:
+            # Insert Swiss demo data
+            demo_spots = [
+                ("Zürich HB Parkhaus Sihlquai", "Sihlquai 41, 8005 Zürich", 47.3769, 8.5417, "free", 4.50),
+                ("Basel SBB Centralbahnplatz", "Centralbahnpl. 20, 4051 Basel", 47.5474, 7.5892, "occupied", 3.80),
+                ("Bern Bahnhof Parking", "Bahnhofplatz 10A, 3011 Bern", 46.9481, 7.4474, "free", 4.20),
+                ("Genève Aéroport P51", "Route de l'Aéroport 21, 1215 Genève", 46.2044, 6.1432, "free", 5.00),
+                ("Luzern Parkhaus Bahnhof", "Bahnhofstrasse 3, 6003 Luzern", 47.0502, 8.3093, "occupied", 3.90),
+                ("St. Gallen Bahnhof", "Bahnhofplatz 1A, 9001 St. Gallen", 47.4245, 9.3767, "free", 3.50),
+                ("Winterthur Zentrum", "Stadthausstrasse 1, 8400 Winterthur", 47.4979, 8.7211, "free", 3.20),
+                ("Lausanne Gare CFF", "Place de la Gare 9, 1003 Lausanne", 46.5197, 6.6323, "occupied", 4.00)
+            ]
+        
+            for spot in demo_spots:
+                cursor.execute('''
+                    INSERT INTO parking_spots (name, address, latitude, longitude, status, price_per_hour)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', spot)
     
-    conn.commit()
-    conn.close()
     print("✅ Database initialized with Swiss demo data!")
 
 # Initialize database on startup
@@ -222,6 +186,14 @@ class ParkingSpot(BaseModel):
     status: str = "free"  # free, occupied, reserved
     price_per_hour: float = 0.0
 
+class ParkingSpotListItem(ParkingSpot):
+    # Only set for bbox/radius searches on GET /parking-spots
+    distance_km: Optional[float] = None
+
+# Keys selectable via ?fields= on the public spot list
+SPOT_LIST_FIELDS = ["id", "name", "address", "latitude", "longitude", "status", "price_per_hour"]
+OWNER_SPOT_FIELDS = SPOT_LIST_FIELDS + ["owner_id"]
+
 class User(BaseModel):
     id: Optional[int] = None
     email: str
@@ -243,6 +215,13 @@ class HardwareTelemetry(BaseModel):
     last_mag: Optional[dict] = None  # e.g. {"x":...,"y":...,"z":...}
     timestamp: Optional[datetime] = None
 
+class TimestampedTelemetry(HardwareTelemetry):
+    """One reading of a batch upload; buffered readings must carry their own time."""
+    timestamp: datetime
+
+class GatewayTelemetry(TimestampedTelemetry):
+    hardware_id: str
+
 # API Routes
 @app.get("/")
 async def root():
@@ -258,51 +237,493 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now()}
 
-@app.get("/parking-spots", response_model=List[ParkingSpot])
-async def get_parking_spots():
-    """Get all parking spots"""
+@app.get("/health/db")
+async def db_pool_stats():
+    """SQLite connection pool and DB executor statistics (connections, reuse ratio, queue depth)."""
+    return {**sqlite_pool.stats(), "executor": db_worker.stats(), "spot_cache": spot_list_cache.stats(),
+            "telemetry_buffer": telemetry_writer.stats(), "occupancy": occupancy_tracker.stats(),
+            "mag_classifier": mag_model.stats(), "command_longpoll": command_longpoll.stats(),
+            "command_sweeps": dict(command_sweeps)}
+
+# Periodic maintenance loops started with the app, cancelled on shutdown
+_background_tasks: List[asyncio.Task] = []
+
+async def _prune_spot_changes_loop():
+    def _prune():
+        with sqlite_pool.connection() as conn:
+            return spot_changes.prune(conn.cursor())
+    while True:
+        try:
+            deleted = await db_worker.run(_prune)
+            if deleted:
+                print(f"[SPOT-CHANGES] pruned {deleted} change rows")
+        except Exception as e:
+            print(f"[SPOT-CHANGES] prune failed: {e}")
+        await asyncio.sleep(spot_changes.SPOT_CHANGES_PRUNE_INTERVAL_SECONDS)
+
+async def _purge_telemetry_loop():
+    def _purge():
+        with sqlite_pool.connection() as conn:
+            return telemetry_store.purge_batch(conn.cursor())
+    def _purge_rollups(tier_seconds, retention_days):
+        with sqlite_pool.connection() as conn:
+            return telemetry_rollups.purge_batch(conn.cursor(), tier_seconds, retention_days, telemetry_store.TELEMETRY_PURGE_BATCH)
+    while True:
+        try:
+            # Small batches, each its own transaction, so ingestion is never blocked for long
+            total = 0
+            while True:
+                deleted = await db_worker.run(_purge)
+                total += deleted
+                if deleted < telemetry_store.TELEMETRY_PURGE_BATCH:
+                    break
+            if total:
+                print(f"[TELEMETRY] purged {total} readings older than {telemetry_store.TELEMETRY_RETENTION_DAYS} days")
+            # Aggregates outlive the raw readings, each tier with its own retention
+            for name, seconds, retention_days in telemetry_rollups.TIERS:
+                total = 0
+                while True:
+                    deleted = await db_worker.run(_purge_rollups, seconds, retention_days)
+                    total += deleted
+                    if deleted < telemetry_store.TELEMETRY_PURGE_BATCH:
+                        break
+                if total:
+                    print(f"[TELEMETRY] purged {total} {name} rollups older than {retention_days} days")
+        except Exception as e:
+            print(f"[TELEMETRY] purge failed: {e}")
+        await asyncio.sleep(telemetry_store.TELEMETRY_PURGE_INTERVAL_SECONDS)
+
+async def _seed_occupancy():
+    def _load():
+        with sqlite_pool.connection() as conn:
+            # Spot status is the debounced state; unassigned devices fall back to their last reading
+            return conn.execute('''
+                SELECT d.hardware_id, coalesce(p.status, d.occupancy)
+                FROM hardware_devices d LEFT JOIN parking_spots p ON p.id = d.parking_spot_id
+            ''').fetchall()
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, address, latitude, longitude, status, price_per_hour
-            FROM parking_spots
-            ORDER BY name
-        ''')
-        
-        spots = []
-        for row in cursor.fetchall():
-            spots.append({
-                "id": row[0],
-                "name": row[1],
-                "address": row[2],
-                "latitude": row[3],
-                "longitude": row[4], 
-                "status": row[5],
-                "price_per_hour": row[6]
-            })
-        
-        conn.close()
+        occupancy_tracker.seed(await db_worker.run(_load))
+    except Exception as e:
+        print(f"[OCCUPANCY] seeding failed, first readings will be taken as is: {e}")
+
+async def _seed_liveness():
+    def _load():
+        with sqlite_pool.connection() as conn:
+            return conn.execute('SELECT hardware_id, last_heartbeat FROM hardware_devices').fetchall()
+    try:
+        liveness_tracker.seed((hw, _heartbeat_epoch(last)) for hw, last in await db_worker.run(_load))
+    except Exception as e:
+        print(f"[LIVENESS] seeding failed: {e}")
+
+async def _liveness_loop():
+    def _mark_offline(hardware_ids, cutoff):
+        """Flip expired devices to offline unless another worker saw a heartbeat meanwhile."""
+        alive = {}
+        with sqlite_pool.connection() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(hardware_ids), 500):
+                chunk = hardware_ids[i:i + 500]
+                cursor.execute(f'''SELECT hardware_id, last_heartbeat FROM hardware_devices
+                                   WHERE hardware_id IN ({",".join("?" * len(chunk))})''', chunk)
+                for hw, last in cursor.fetchall():
+                    seen = _heartbeat_epoch(last)
+                    if seen is not None and seen > cutoff:
+                        alive[hw] = seen
+            cursor.executemany("UPDATE hardware_devices SET status = 'offline' WHERE hardware_id = ? AND status IS NOT 'offline'",
+                               [(hw,) for hw in hardware_ids if hw not in alive])
+        return alive
+    while True:
+        await asyncio.sleep(liveness.LIVENESS_CHECK_INTERVAL_SECONDS)
+        try:
+            now = time.time()
+            due = liveness_tracker.due(now)
+            if not due:
+                continue
+            try:
+                alive = await db_worker.run(_mark_offline, [hw for hw, _ in due], now - liveness_tracker.timeout)
+            except Exception:
+                # Not settled: back into the heap, due again on the next pass
+                for hw, deadline in due:
+                    liveness_tracker.rearm(hw, deadline - liveness_tracker.timeout)
+                raise
+            # Heartbeats another worker received: new deadline, no offline/online flap
+            for hw, seen in alive.items():
+                liveness_tracker.rearm(hw, seen)
+            offline = [hw for hw, deadline in due if hw not in alive and liveness_tracker.confirm_offline(hw, deadline)]
+            for hw in offline:
+                fleet.update(hw, status="offline")
+            if offline:
+                print(f"[LIVENESS] {len(offline)} device(s) offline: {', '.join(offline[:10])}{' ...' if len(offline) > 10 else ''}")
+        except Exception as e:
+            print(f"[LIVENESS] check failed: {e}")
+
+async def _fleet_resync_loop():
+    """Rebuild the fleet snapshot from the DB now and then: with several workers each
+    one only sees part of the telemetry. One read per interval instead of one per poll."""
+    def _load():
+        with sqlite_pool.connection() as conn:
+            return conn.execute('''
+                SELECT hardware_id, owner_email, status, occupancy, battery_level, rssi FROM hardware_devices
+            ''').fetchall()
+    while True:
+        try:
+            rows = await db_worker.run(_load)
+            fleet.load((hw, owner, liveness_tracker.status(hw) or status, occ, battery, rssi)
+                       for hw, owner, status, occ, battery, rssi in rows)
+            # Telemetry this worker holds but has not flushed yet is newer than the DB
+            for hw, state in telemetry_writer.pending_items():
+                fleet.update(hw, occupancy=state['occupancy'], battery_level=state['battery_level'], rssi=state['rssi'])
+        except Exception as e:
+            print(f"[FLEET] resync failed: {e}")
+        await asyncio.sleep(fleet_snapshot.FLEET_SNAPSHOT_RESYNC_SECONDS)
+
+async def _seed_mag_classifier():
+    def _load():
+        with sqlite_pool.connection() as conn:
+            return conn.execute('''
+                SELECT hardware_id, base_x, base_y, base_z, spread, samples,
+                       pushed_x, pushed_y, pushed_z, pushed_threshold, pushed_at
+                FROM mag_calibration
+            ''').fetchall()
+    rows = []
+    try:
+        rows = await db_worker.run(_load)
+        mag_model.load(rows)
+    except Exception as e:
+        print(f"[MAG] loading calibration failed: {e}")
+    # Stored baselines only need the last interval, a fresh table learns from recent history
+    back = mag_classifier.MAG_CLASSIFIER_INTERVAL_SECONDS if rows else mag_classifier.MAG_CLASSIFIER_WARMUP_SECONDS
+    mag_model.watermark = time.time() - back
+
+async def _mag_classifier_loop():
+    """Fold the readings of the last interval (all workers, read back from
+    telemetry_readings) into the baselines, persist them and queue calibrate_mag
+    for devices whose calibration drifted. Readings uploaded later with older
+    device timestamps are skipped; they are history, not current state."""
+    def _load(since, until):
+        with sqlite_pool.connection() as conn:
+            rows = conn.execute(hot_queries.MAG_WINDOW_SQL, (since, until)).fetchall()
+        return [r[0] for r in rows], [r[1:4] for r in rows], [r[4] for r in rows]
+    def _save(state_rows, pushes, now):
+        """Persist baselines; queue calibrate_mag where this worker wins the per-device claim.
+        Returns the stored push state of every attempted device."""
+        cooldown = now - mag_classifier.MAG_CALIBRATION_PUSH_MIN_INTERVAL_SECONDS
+        pushed = {}
+        with sqlite_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO mag_calibration (hardware_id, base_x, base_y, base_z, spread, samples, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(hardware_id) DO UPDATE SET
+                    base_x = excluded.base_x, base_y = excluded.base_y, base_z = excluded.base_z,
+                    spread = excluded.spread, samples = excluded.samples, updated_at = excluded.updated_at
+            ''', state_rows)
+            for hw, params in pushes:
+                b = params['baseline']
+                cursor.execute(hot_queries.MAG_PUSH_CLAIM_SQL,
+                               (b['x'], b['y'], b['z'], params['threshold'], now, hw, cooldown))
+                if cursor.rowcount:
+                    # Only the newest calibration matters to a device that has not polled yet
+                    # (kept as 'superseded', deleting would free its seq for reuse)
+                    cursor.execute(hot_queries.SUPERSEDE_COMMANDS_SQL, (hw, mag_classifier.CALIBRATION_COMMAND))
+                    # Not time critical; superseded by the next push anyway
+                    command_queue.enqueue(cursor, hw, mag_classifier.CALIBRATION_COMMAND, params, 'mag-classifier',
+                                          mag_classifier.MAG_CALIBRATION_PUSH_MIN_INTERVAL_SECONDS, now)
+                pushed[hw] = cursor.execute('''
+                    SELECT pushed_x, pushed_y, pushed_z, pushed_threshold, pushed_at FROM mag_calibration WHERE hardware_id = ?
+                ''', (hw,)).fetchone()
+        return pushed
+    # Rows land in telemetry_readings up to one buffer flush after their timestamp
+    lag = max(1.0, 2 * telemetry_buffer.TELEMETRY_FLUSH_INTERVAL_MS / 1000)
+    while True:
+        try:
+            until = time.time() - lag
+            hardware_ids, mags, labels = await db_worker.run(_load, mag_model.watermark, until)
+            mag_model.watermark = until
+            changed = mag_model.update(hardware_ids, mags, labels)
+            now = time.time()
+            due = mag_model.due_pushes(now)
+            if changed or due:
+                pushes = [(mag_model.hardware_id(r), mag_model.calibration(r)) for r in due]
+                stored = await db_worker.run(_save, mag_model.state_rows(changed, now), pushes, now)
+                queued = mag_model.sync_pushed(stored, now)
+                if queued:
+                    print(f"[MAG] queued {mag_classifier.CALIBRATION_COMMAND} for {queued} device(s)")
+        except Exception as e:
+            print(f"[MAG] classifier run failed: {e}")
+        await asyncio.sleep(mag_classifier.MAG_CLASSIFIER_INTERVAL_SECONDS)
+
+async def _command_watch_loop():
+    """Wake long-polls for commands queued by another worker or a background job
+    (queue_hardware_command on this worker wakes them directly)."""
+    def _last_id():
+        with sqlite_pool.connection() as conn:
+            return conn.execute('SELECT coalesce(max(id), 0) FROM hardware_commands').fetchone()[0]
+    def _new_commands(after_id):
+        with sqlite_pool.connection() as conn:
+            return conn.execute(hot_queries.COMMANDS_SINCE_SQL, (after_id,)).fetchall()
+    last_id = await db_worker.run(_last_id)
+    while True:
+        await asyncio.sleep(command_waiters.COMMAND_LONGPOLL_WATCH_INTERVAL_MS / 1000)
+        try:
+            rows = await db_worker.run(_new_commands, last_id)
+            if rows:
+                last_id = rows[-1][0]
+                for hardware_id in {hw for _, hw in rows}:
+                    command_longpoll.notify(hardware_id)
+        except Exception as e:
+            print(f"[HARDWARE-QUEUE] command watch failed: {e}")
+
+# Command lifecycle counters since start (this worker's sweeps)
+command_sweeps = Counter()
+
+async def _command_sweeper_loop():
+    """Expire stale queued commands and redeliver / dead-letter unacked ones, in
+    small batches over the partial timestamp indexes (see backend/command_queue.py)."""
+    def _sweep():
+        with sqlite_pool.connection() as conn:
+            cursor = conn.cursor()
+            return command_queue.expire_batch(cursor), command_queue.redeliver_batch(cursor)
+    while True:
+        try:
+            while True:
+                expired, moved = await db_worker.run(_sweep)
+                command_sweeps["expired"] += expired
+                for cmd_id, hardware_id, status in moved:
+                    command_sweeps["redelivered" if status == "queued" else status] += 1
+                    if status == "queued":
+                        command_longpoll.notify(hardware_id)
+                    elif status == "dead":
+                        print(f"[HARDWARE-QUEUE] id={cmd_id} hardware={hardware_id} dead after {command_queue.COMMAND_MAX_ATTEMPTS} unacked deliveries")
+                if expired:
+                    print(f"[HARDWARE-QUEUE] {expired} command(s) expired before delivery")
+                if expired < command_queue.COMMAND_SWEEP_BATCH and len(moved) < command_queue.COMMAND_SWEEP_BATCH:
+                    break
+        except Exception as e:
+            print(f"[HARDWARE-QUEUE] sweep failed: {e}")
+        await asyncio.sleep(command_queue.COMMAND_SWEEP_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    _background_tasks.append(asyncio.create_task(_prune_spot_changes_loop()))
+    _background_tasks.append(asyncio.create_task(_purge_telemetry_loop()))
+    await _seed_occupancy()
+    await _seed_liveness()
+    _background_tasks.append(asyncio.create_task(_liveness_loop()))
+    _background_tasks.append(asyncio.create_task(_fleet_resync_loop()))
+    if mag_model.enabled:
+        await _seed_mag_classifier()
+        _background_tasks.append(asyncio.create_task(_mag_classifier_loop()))
+    _background_tasks.append(asyncio.create_task(_command_watch_loop()))
+    _background_tasks.append(asyncio.create_task(_command_sweeper_loop()))
+    telemetry_writer.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    # Parked long-polls answer now; flush buffered telemetry while the pool is still open
+    command_longpoll.wake_all()
+    await telemetry_writer.stop()
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+
+@app.on_event("shutdown")
+async def close_sqlite_pool():
+    sqlite_pool.close_all()
+
+@app.get("/parking-spots", response_model=List[ParkingSpotListItem], response_model_exclude_unset=True)
+async def get_parking_spots(
+    request: Request,
+    bbox: Optional[str] = None,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    radius: Optional[float] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """Get parking spots.
+
+    Without filters all spots are returned (ordered by name, id). With ``limit``
+    and/or ``cursor`` the list is paged by keyset; the cursor for the next page
+    comes in the ``X-Next-Cursor`` header (absent on the last page).
+    ``fields=id,latitude,longitude,status`` limits the returned keys (id is always
+    included). Spatial filters:
+    - ``bbox=minLng,minLat,maxLng,maxLat``: spots inside the map viewport
+    - ``lat``, ``lng`` and optional ``radius`` (km, default 5): spots within the circle
+    Spatial results are sorted by distance (to lat/lng, else to the bbox centre)
+    and carry ``distance_km``; ``limit`` keeps only the nearest N.
+
+    The unfiltered list is served from spot_list_cache with a strong ETag;
+    a matching If-None-Match gets 304 without touching the DB.
+    """
+    if (lat is None) != (lng is None):
+        raise HTTPException(status_code=400, detail="lat and lng must be given together")
+    try:
+        size = pagination.page_size(limit, cursor)
+        selected = pagination.parse_fields(fields, SPOT_LIST_FIELDS, always=("id",))
+        after = pagination.decode_cursor(cursor, (str, int)) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    box = None
+    if bbox:
+        try:
+            box = geo.parse_bbox(bbox)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid bbox: {e}")
+    radius_km = None
+    if lat is not None:
+        radius_km = geo.SPOT_SEARCH_DEFAULT_RADIUS_KM if radius is None else radius
+        if not (0 < radius_km <= geo.SPOT_SEARCH_MAX_RADIUS_KM):
+            raise HTTPException(status_code=400, detail=f"radius must be in (0, {geo.SPOT_SEARCH_MAX_RADIUS_KM}] km")
+    spatial = box is not None or lat is not None
+    if spatial and cursor:
+        raise HTTPException(status_code=400, detail="cursor is not supported for bbox/radius searches (use limit)")
+
+    def _load(after=None, size=None):
+        with sqlite_pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            params = list(after) if after is not None else []
+            if size is not None:
+                params.append(size + 1)
+            cursor.execute(hot_queries.spot_list_sql(after is not None, size is not None), params)
+            
+            spots = []
+            for row in cursor.fetchall():
+                spots.append({
+                    "id": row[0],
+                    "name": row[1],
+                    "address": row[2],
+                    "latitude": row[3],
+                    "longitude": row[4], 
+                    "status": row[5],
+                    "price_per_hour": row[6]
+                })
         return spots
+
+    def _search():
+        # Candidates from the R*Tree: the viewport, the circle's bounding box, or both intersected
+        min_lat, min_lng, max_lat, max_lng = box or geo.bbox_around(lat, lng, radius_km)
+        if box and lat is not None:
+            c_min_lat, c_min_lng, c_max_lat, c_max_lng = geo.bbox_around(lat, lng, radius_km)
+            min_lat, min_lng = max(min_lat, c_min_lat), max(min_lng, c_min_lng)
+            max_lat, max_lng = min(max_lat, c_max_lat), min(max_lng, c_max_lng)
+            if min_lat > max_lat or min_lng > max_lng:
+                return []
+        with sqlite_pool.connection() as conn:
+            rows = geo.spots_in_bbox(conn.cursor(), min_lat, min_lng, max_lat, max_lng)
+        if lat is not None:
+            hits = geo.nearest_first(rows, lat, lng, radius_km=radius_km, limit=limit)
+        else:
+            hits = geo.nearest_first(rows, (min_lat + max_lat) / 2, (min_lng + max_lng) / 2, limit=limit)
+        return [{
+            "id": row[0],
+            "name": row[1],
+            "address": row[2],
+            "latitude": row[3],
+            "longitude": row[4],
+            "status": row[5],
+            "price_per_hour": row[6],
+            "distance_km": round(d, 4),
+        } for d, row in hits]
+
+    def _db_version():
+        with sqlite_pool.connection() as conn:
+            row = conn.execute(hot_queries.SPOT_LIST_VERSION_SQL).fetchone()
+        return row[0] if row else 0
+
+    try:
+        if not spatial and size is None and selected is None:
+            # Changes by other workers/processes show up via the trigger-maintained counter
+            if spot_list_cache.needs_revalidate():
+                spot_list_cache.observe_db_version(await db_worker.run(_db_version))
+            entry = spot_list_cache.lookup()
+            if entry is None:
+                version = spot_list_cache.version
+                # Rows come straight from our schema: encode directly, no model round-trip
+                spots = await db_worker.run(_load)
+                entry = spot_list_cache.store(version, json_stream.dumps(spots))
+            headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+            if response_cache.etag_matches(request.headers.get("if-none-match"), entry.etag):
+                spot_list_cache.count_not_modified()
+                return Response(status_code=304, headers=headers)
+            return Response(content=entry.body, media_type="application/json", headers=headers)
+        if not spatial and size is None:
+            # Projected full list (not cached): stream it in keyset batches
+            fetch = _keyset_fetcher(_load, key=lambda spot: [spot["name"], spot["id"]],
+                                    transform=lambda spot: pagination.project(spot, selected))
+            return json_stream.streaming_json(fetch)
+        if not spatial:
+            spots = await db_worker.run(_load, after, size)
+            headers = {}
+            if len(spots) > size:
+                spots = spots[:size]
+                headers["X-Next-Cursor"] = pagination.encode_cursor([spots[-1]["name"], spots[-1]["id"]])
+            return json_stream.FastJSONResponse([pagination.project(spot, selected) for spot in spots], headers=headers)
+        spots = await db_worker.run(_search)
+        if selected is not None:
+            keep = selected + ["distance_km"]
+            spots = [pagination.project(spot, keep) for spot in spots]
+        return json_stream.FastJSONResponse(spots)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@app.get("/parking-spots/changes")
+async def get_parking_spot_changes(since: Optional[int] = None, limit: int = 500):
+    """Delta sync for the spot list.
+
+    Returns the spots inserted/updated (``upserts``, current values) and deleted
+    (``deletes``, ids) after cursor ``since``, plus the new ``cursor``. Without
+    ``since`` - or with a cursor older than the retained history - a full
+    snapshot is returned with ``reset: true``, streamed batch by batch however
+    many spots there are. ``has_more`` means another page is ready right away.
+    """
+    if not (1 <= limit <= spot_changes.SPOT_CHANGES_MAX_LIMIT):
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {spot_changes.SPOT_CHANGES_MAX_LIMIT}")
+
+    def _load():
+        with sqlite_pool.connection() as conn:
+            return spot_changes.changes_since(conn.cursor(), since, limit)
+
+    def _head():
+        with sqlite_pool.connection() as conn:
+            return spot_changes.head(conn.cursor())
+
+    def _snapshot_page(after=None, size=None):
+        with sqlite_pool.connection() as conn:
+            return spot_changes.snapshot_page(conn.cursor(), after[0] if after else 0, size)
+
+    try:
+        if since is not None:
+            changes = await db_worker.run(_load)
+            if changes is not None:
+                return changes
+        # Cursor first, then the rows (see spot_changes.snapshot_prefix)
+        prefix = spot_changes.snapshot_prefix(await db_worker.run(_head))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    fetch = _keyset_fetcher(_snapshot_page, key=lambda r: [r[0]], transform=spot_changes.spot)
+    return json_stream.streaming_json(fetch, prefix=prefix, suffix=b']}')
+
 @app.get("/parking-spots/{spot_id}", response_model=ParkingSpot)
 async def get_parking_spot(spot_id: int):
     """Get specific parking spot"""
+    def _load():
+        with sqlite_pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, name, address, latitude, longitude, status, price_per_hour
+                FROM parking_spots WHERE id = ?
+            ''', (spot_id,))
+            
+            return cursor.fetchone()
+
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, address, latitude, longitude, status, price_per_hour
-            FROM parking_spots WHERE id = ?
-        ''', (spot_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        row = await db_worker.run(_load)
         
         if not row:
             raise HTTPException(status_code=404, detail="Parking spot not found")
@@ -362,30 +783,34 @@ async def login_php_mock(
         email = form.get("email")
         password = form.get("password")
     
-    user = auth.authenticate_user(db, email, password)
+    # DB lookups and bcrypt verification are blocking -> run on the DB executor
+    def _login():
+        user = auth.authenticate_user(db, email, password)
 
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid email or password")
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid email or password")
 
-    # Allow optional bypass for testing if env set
-    allow_unverified = os.environ.get("ALLOW_UNVERIFIED_LOGIN", "false").lower() == "true"
-    if not user.is_verified and not allow_unverified:
-        raise HTTPException(status_code=403, detail="Account not verified. Please check your email.")
-    elif not user.is_verified and allow_unverified:
-        # Mark verified on first successful login if bypass enabled
-        user.is_verified = True
+        # Allow optional bypass for testing if env set
+        allow_unverified = os.environ.get("ALLOW_UNVERIFIED_LOGIN", "false").lower() == "true"
+        if not user.is_verified and not allow_unverified:
+            raise HTTPException(status_code=403, detail="Account not verified. Please check your email.")
+        elif not user.is_verified and allow_unverified:
+            # Mark verified on first successful login if bypass enabled
+            user.is_verified = True
+            db.commit()
+
+        token = auth.create_access_token(user.email, user.id, user.role)
+        
+        # Update last_login
+        user.last_login = datetime.utcnow()
         db.commit()
 
-    token = auth.create_access_token(user.email, user.id, user.role)
-    
-    # Update last_login
-    user.last_login = datetime.utcnow()
-    db.commit()
+        return {
+            "token": token,
+            "user": {"id": user.id, "email": user.email, "name": user.name, "role": user.role},
+        }
 
-    return {
-        "token": token,
-        "user": {"id": user.id, "email": user.email, "name": user.name, "role": user.role},
-    }
+    return await db_worker.run(_login)
 
 @app.get("/user/profile")
 async def get_user_profile(
@@ -406,27 +831,30 @@ async def get_user_profile(
         
         user_id = user_data.get("user_id")
         
-        user = db.query(auth.User).filter(auth.User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        return {
-            "id": user.id,
-            "email": user.email,
-            "name": user.name,
-            "role": user.role,
-            "created_at": user.created_at.isoformat() if user.created_at else None,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "phone": user.phone,
-            "address": user.address,
-            "house_number": user.house_number,
-            "city": user.city,
-            "zip_code": user.zip_code,
-            "country": user.country,
-            "secondary_email": user.secondary_email,
-            "date_of_birth": user.date_of_birth.isoformat() if user.date_of_birth else None
-        }
+        def _load():
+            user = db.query(auth.User).filter(auth.User.id == user_id).first()
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+        
+            return {
+                "id": user.id,
+                "email": user.email,
+                "name": user.name,
+                "role": user.role,
+                "created_at": user.created_at.isoformat() if user.created_at else None,
+                "first_name": user.first_name,
+                "last_name": user.last_name,
+                "phone": user.phone,
+                "address": user.address,
+                "house_number": user.house_number,
+                "city": user.city,
+                "zip_code": user.zip_code,
+                "country": user.country,
+                "secondary_email": user.secondary_email,
+                "date_of_birth": user.date_of_birth.isoformat() if user.date_of_birth else None
+            }
+
+        return await db_worker.run(_load)
     except HTTPException:
         raise
     except Exception as e:
@@ -451,74 +879,77 @@ async def update_user_profile(
         
         user_id = user_data.get("user_id")
         
-        user = db.query(auth.User).filter(auth.User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
         # Get update data
         body = await request.json()
         
-        # Update allowed fields
-        if "name" in body:
-            user.name = body["name"]
-        if "email" in body:
-            # Check if email is already taken by another user
-            existing_user = db.query(auth.User).filter(
-                auth.User.email == body["email"],
-                auth.User.id != user_id
-            ).first()
-            if existing_user:
-                raise HTTPException(status_code=409, detail="Email already in use")
-            user.email = body["email"]
-        
-        # Update additional profile fields
-        if "first_name" in body:
-            user.first_name = body["first_name"]
-        if "last_name" in body:
-            user.last_name = body["last_name"]
-        if "phone" in body:
-            user.phone = body["phone"]
-        if "address" in body:
-            user.address = body["address"]
-        if "house_number" in body:
-            user.house_number = body["house_number"]
-        if "city" in body:
-            user.city = body["city"]
-        if "zip_code" in body:
-            user.zip_code = body["zip_code"]
-        if "country" in body:
-            user.country = body["country"]
-        if "secondary_email" in body:
-            user.secondary_email = body["secondary_email"]
-        if "date_of_birth" in body and body["date_of_birth"]:
-            # Parse date string to datetime
-            from datetime import datetime
-            try:
-                user.date_of_birth = datetime.fromisoformat(body["date_of_birth"].replace('Z', '+00:00'))
-            except:
-                # If it's just a date (YYYY-MM-DD), parse it
-                user.date_of_birth = datetime.strptime(body["date_of_birth"], "%Y-%m-%d")
-        
-        db.commit()
-        db.refresh(user)
-        
-        return {
-            "id": user.id,
-            "email": user.email,
-            "name": user.name,
-            "role": user.role,
-            "created_at": user.created_at.isoformat() if user.created_at else None,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "phone": user.phone,
-            "address": user.address,
-            "house_number": user.house_number,
-            "city": user.city,
-            "zip_code": user.zip_code,
-            "country": user.country,
-            "secondary_email": user.secondary_email,
-            "date_of_birth": user.date_of_birth.isoformat() if user.date_of_birth else None
-        }
+        def _update():
+            user = db.query(auth.User).filter(auth.User.id == user_id).first()
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+        
+            # Update allowed fields
+            if "name" in body:
+                user.name = body["name"]
+            if "email" in body:
+                # Check if email is already taken by another user
+                existing_user = db.query(auth.User).filter(
+                    auth.User.email == body["email"],
+                    auth.User.id != user_id
+                ).first()
+                if existing_user:
+                    raise HTTPException(status_code=409, detail="Email already in use")
+                user.email = body["email"]
+        
+            # Update additional profile fields
+            if "first_name" in body:
+                user.first_name = body["first_name"]
+            if "last_name" in body:
+                user.last_name = body["last_name"]
+            if "phone" in body:
+                user.phone = body["phone"]
+            if "address" in body:
+                user.address = body["address"]
+            if "house_number" in body:
+                user.house_number = body["house_number"]
+            if "city" in body:
+                user.city = body["city"]
+            if "zip_code" in body:
+                user.zip_code = body["zip_code"]
+            if "country" in body:
+                user.country = body["country"]
+            if "secondary_email" in body:
+                user.secondary_email = body["secondary_email"]
+            if "date_of_birth" in body and body["date_of_birth"]:
+                # Parse date string to datetime
+                from datetime import datetime
+                try:
+                    user.date_of_birth = datetime.fromisoformat(body["date_of_birth"].replace('Z', '+00:00'))
+                except:
+                    # If it's just a date (YYYY-MM-DD), parse it
+                    user.date_of_birth = datetime.strptime(body["date_of_birth"], "%Y-%m-%d")
+        
+            db.commit()
+            db.refresh(user)
+        
+            return {
+                "id": user.id,
+                "email": user.email,
+                "name": user.name,
+                "role": user.role,
+                "created_at": user.created_at.isoformat() if user.created_at else None,
+                "first_name": user.first_name,
+                "last_name": user.last_name,
+                "phone": user.phone,
+                "address": user.address,
+                "house_number": user.house_number,
+                "city": user.city,
+                "zip_code": user.zip_code,
+                "country": user.country,
+                "secondary_email": user.secondary_email,
+                "date_of_birth": user.date_of_birth.isoformat() if user.date_of_birth else None
+            }
+
+        return await db_worker.run(_update)
     except HTTPException:
         raise
     except Exception as e:
@@ -528,9 +959,16 @@ async def update_user_profile(
 @app.get("/owner/parking-spots")
 async def get_owner_parking_spots(
     request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all parking spots owned by the current user"""
+    """Get all parking spots owned by the current user
+
+    Same paging as GET /parking-spots: ``limit``/``cursor`` (keyset on name, id,
+    next cursor in ``X-Next-Cursor``) and ``fields=`` projection.
+    """
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Not authenticated")
@@ -546,32 +984,48 @@ async def get_owner_parking_spots(
         
         if role != "owner":
             raise HTTPException(status_code=403, detail="Only owners can access this endpoint")
-        
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, address, latitude, longitude, status, price_per_hour, owner_id
-            FROM parking_spots
-            WHERE owner_id = ?
-            ORDER BY name
-        ''', (user_id,))
-        
-        spots = []
-        for row in cursor.fetchall():
-            spots.append({
-                "id": row[0],
-                "name": row[1],
-                "address": row[2],
-                "latitude": row[3],
-                "longitude": row[4],
-                "status": row[5],
-                "price_per_hour": row[6],
-                "owner_id": row[7]
-            })
-        
-        conn.close()
-        return spots
+
+        try:
+            size = pagination.page_size(limit, cursor)
+            selected = pagination.parse_fields(fields, OWNER_SPOT_FIELDS, always=("id",))
+            after = pagination.decode_cursor(cursor, (str, int)) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        def _load(after=None, size=None):
+            with sqlite_pool.connection() as conn:
+                cursor = conn.cursor()
+
+                params = [user_id] + (list(after) if after is not None else [])
+                if size is not None:
+                    params.append(size + 1)
+                cursor.execute(hot_queries.owner_spots_sql(after is not None, size is not None), params)
+            
+                spots = []
+                for row in cursor.fetchall():
+                    spots.append({
+                        "id": row[0],
+                        "name": row[1],
+                        "address": row[2],
+                        "latitude": row[3],
+                        "longitude": row[4],
+                        "status": row[5],
+                        "price_per_hour": row[6],
+                        "owner_id": row[7]
+                    })
+                return spots
+
+        if size is None:
+            fetch = _keyset_fetcher(_load, key=lambda spot: [spot["name"], spot["id"]],
+                                    transform=lambda spot: pagination.project(spot, selected))
+            return json_stream.streaming_json(fetch)
+
+        spots = await db_worker.run(_load, after, size)
+        headers = {}
+        if len(spots) > size:
+            spots = spots[:size]
+            headers["X-Next-Cursor"] = pagination.encode_cursor([spots[-1]["name"], spots[-1]["id"]])
+        return json_stream.FastJSONResponse([pagination.project(spot, selected) for spot in spots], headers=headers)
         
     except HTTPException:
         raise
@@ -607,25 +1061,27 @@ async def create_parking_spot(
         
         body = await request.json()
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO parking_spots (name, address, latitude, longitude, status, price_per_hour, owner_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            body.get('name'),
-            body.get('address'),
-            body.get('latitude'),
-            body.get('longitude'),
-            body.get('status', 'free'),
-            body.get('price_per_hour', 0.0),
-            user_id
-        ))
-        
-        spot_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        def _insert():
+            with sqlite_pool.connection() as conn:
+                cursor = conn.cursor()
+            
+                cursor.execute('''
+                    INSERT INTO parking_spots (name, address, latitude, longitude, status, price_per_hour, owner_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    body.get('name'),
+                    body.get('address'),
+                    body.get('latitude'),
+                    body.get('longitude'),
+                    body.get('status', 'free'),
+                    body.get('price_per_hour', 0.0),
+                    user_id
+                ))
+            
+                return cursor.lastrowid
+
+        spot_id = await db_worker.run(_insert)
+        spot_list_cache.bump()
         
         return {"id": spot_id, "message": "Parking spot created successfully"}
         
@@ -659,55 +1115,54 @@ async def update_parking_spot(
         
         body = await request.json()
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        # Check if user owns this spot
-        cursor.execute('SELECT owner_id FROM parking_spots WHERE id = ?', (spot_id,))
-        result = cursor.fetchone()
-        
-        if not result:
-            conn.close()
-            raise HTTPException(status_code=404, detail="Parking spot not found")
-        
-        if result[0] != user_id:
-            conn.close()
-            raise HTTPException(status_code=403, detail="You don't own this parking spot")
-        
-        # Update the spot
-        updates = []
-        params = []
-        
-        if 'name' in body:
-            updates.append('name = ?')
-            params.append(body['name'])
-        if 'address' in body:
-            updates.append('address = ?')
-            params.append(body['address'])
-        if 'latitude' in body:
-            updates.append('latitude = ?')
-            params.append(body['latitude'])
-        if 'longitude' in body:
-            updates.append('longitude = ?')
-            params.append(body['longitude'])
-        if 'status' in body:
-            updates.append('status = ?')
-            params.append(body['status'])
-        if 'price_per_hour' in body:
-            updates.append('price_per_hour = ?')
-            params.append(body['price_per_hour'])
-        
-        params.append(spot_id)
-        
-        if updates:
-            cursor.execute(f'''
-                UPDATE parking_spots 
-                SET {', '.join(updates)}
-                WHERE id = ?
-            ''', params)
-        
-        conn.commit()
-        conn.close()
+        def _update():
+            with sqlite_pool.connection() as conn:
+                cursor = conn.cursor()
+            
+                # Check if user owns this spot
+                cursor.execute(hot_queries.SPOT_OWNER_SQL, (spot_id,))
+                result = cursor.fetchone()
+            
+                if not result:
+                    raise HTTPException(status_code=404, detail="Parking spot not found")
+            
+                if result[0] != user_id:
+                    raise HTTPException(status_code=403, detail="You don't own this parking spot")
+            
+                # Update the spot
+                updates = []
+                params = []
+            
+                if 'name' in body:
+                    updates.append('name = ?')
+                    params.append(body['name'])
+                if 'address' in body:
+                    updates.append('address = ?')
+                    params.append(body['address'])
+                if 'latitude' in body:
+                    updates.append('latitude = ?')
+                    params.append(body['latitude'])
+                if 'longitude' in body:
+                    updates.append('longitude = ?')
+                    params.append(body['longitude'])
+                if 'status' in body:
+                    updates.append('status = ?')
+                    params.append(body['status'])
+                if 'price_per_hour' in body:
+                    updates.append('price_per_hour = ?')
+                    params.append(body['price_per_hour'])
+            
+                params.append(spot_id)
+            
+                if updates:
+                    cursor.execute(f'''
+                        UPDATE parking_spots 
+                        SET {', '.join(updates)}
+                        WHERE id = ?
+                    ''', params)
+
+        await db_worker.run(_update)
+        spot_list_cache.bump()
         
         return {"message": "Parking spot updated successfully"}
         
@@ -739,24 +1194,24 @@ async def delete_parking_spot(
         if role != "owner":
             raise HTTPException(status_code=403, detail="Only owners can delete parking spots")
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        # Check if user owns this spot
-        cursor.execute('SELECT owner_id FROM parking_spots WHERE id = ?', (spot_id,))
-        result = cursor.fetchone()
-        
-        if not result:
-            conn.close()
-            raise HTTPException(status_code=404, detail="Parking spot not found")
-        
-        if result[0] != user_id:
-            conn.close()
-            raise HTTPException(status_code=403, detail="You don't own this parking spot")
-        
-        cursor.execute('DELETE FROM parking_spots WHERE id = ?', (spot_id,))
-        conn.commit()
-        conn.close()
+        def _delete():
+            with sqlite_pool.connection() as conn:
+                cursor = conn.cursor()
+            
+                # Check if user owns this spot
+                cursor.execute(hot_queries.SPOT_OWNER_SQL, (spot_id,))
+                result = cursor.fetchone()
+            
+                if not result:
+                    raise HTTPException(status_code=404, detail="Parking spot not found")
+            
+                if result[0] != user_id:
+                    raise HTTPException(status_code=403, detail="You don't own this parking spot")
+            
+                cursor.execute('DELETE FROM parking_spots WHERE id = ?', (spot_id,))
+
+        await db_worker.run(_delete)
+        spot_list_cache.bump()
         
         return {"message": "Parking spot deleted successfully"}
         
@@ -791,21 +1246,26 @@ async def register_php_mock(
         
         print(f"Registering user: {user_data.email} with role: {user_data.role}")
         
-        # Check if user already exists
-        db_user = db.query(auth.User).filter(auth.User.email == user_data.email).first()
-        if db_user:
-            raise HTTPException(status_code=409, detail="Email already registered")
+        # Lookup, bcrypt hashing and commit are blocking -> run on the DB executor
+        def _create():
+            # Check if user already exists
+            db_user = db.query(auth.User).filter(auth.User.email == user_data.email).first()
+            if db_user:
+                raise HTTPException(status_code=409, detail="Email already registered")
+
+            # Create user but mark as unverified
+            new_user = auth.create_user(db, name=user_data.name, email=user_data.email, password=user_data.password, role=user_data.role)
 
-        # Create user but mark as unverified
-        new_user = auth.create_user(db, name=user_data.name, email=user_data.email, password=user_data.password, role=user_data.role)
+            # Der Token wird jetzt direkt in create_user gesetzt und muss hier nicht mehr manuell hinzugefügt werden.
+            # Wir müssen nur committen, um die ID zu bekommen und den Token abrufen zu können.
+            db.commit()
+            db.refresh(new_user)
+            return new_user
+
+        new_user = await db_worker.run(_create)
 
         # Optional auto-verify if email service not configured and AUTO_VERIFY_ON_EMAIL_FAILURE=true
         auto_verify = os.environ.get("AUTO_VERIFY_ON_EMAIL_FAILURE", "false").lower() == "true"
-        
-        # Der Token wird jetzt direkt in create_user gesetzt und muss hier nicht mehr manuell hinzugefügt werden.
-        # Wir müssen nur committen, um die ID zu bekommen und den Token abrufen zu können.
-        db.commit()
-        db.refresh(new_user)
 
         # Build verification link using the correct endpoint name
         verification_link = request.url_for('verify_email', token=new_user.verification_token)
@@ -822,9 +1282,12 @@ async def register_php_mock(
         except Exception as mail_err:
             print(f"⚠️ Email sending failed: {mail_err}")
             if auto_verify:
-                new_user.is_verified = True
-                db.commit()
-                db.refresh(new_user)
+                def _verify():
+                    new_user.is_verified = True
+                    db.commit()
+                    db.refresh(new_user)
+
+                await db_worker.run(_verify)
                 print("Auto-verified user due to email failure and AUTO_VERIFY_ON_EMAIL_FAILURE=true")
 
         return {"message": "Registration successful. Please check your email to verify your account."}
@@ -844,17 +1307,19 @@ async def register_php_mock(
 async def create_parking_spot(spot: ParkingSpot):
     """Create new parking spot"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO parking_spots (name, address, latitude, longitude, status, price_per_hour)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (spot.name, spot.address, spot.latitude, spot.longitude, spot.status, spot.price_per_hour))
-        
-        spot_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        def _insert():
+            with sqlite_pool.connection() as conn:
+                cursor = conn.cursor()
+            
+                cursor.execute('''
+                    INSERT INTO parking_spots (name, address, latitude, longitude, status, price_per_hour)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (spot.name, spot.address, spot.latitude, spot.longitude, spot.status, spot.price_per_hour))
+            
+                return cursor.lastrowid
+
+        spot_id = await db_worker.run(_insert)
+        spot_list_cache.bump()
         
         spot.id = spot_id
         return spot
@@ -862,6 +1327,31 @@ async def create_parking_spot(spot: ParkingSpot):
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+async def _set_spot_status(spot_id: int, new_status: str):
+    """Manual status write (404 for unknown spots).
+
+    The sensors on the spot are re-seeded with the written state; otherwise their
+    debounced state would still be the old one, a later reading of that old state
+    would be no transition and the spot would never be corrected.
+    """
+    def _update():
+        with sqlite_pool.connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                UPDATE parking_spots SET status = ?
+                WHERE id = ?
+            ''', (new_status, spot_id))
+
+            if cursor.rowcount == 0:
+                raise HTTPException(status_code=404, detail="Parking spot not found")
+            cursor.execute(hot_queries.SPOT_DEVICES_SQL, (spot_id,))
+            return [r[0] for r in cursor.fetchall()]
+
+    hardware_ids = await db_worker.run(_update)
+    spot_list_cache.bump()
+    occupancy_tracker.override(hardware_ids, new_status)
+
 @app.put("/parking-spots/{spot_id}/status")
 async def update_spot_status(spot_id: int, status: dict):
     """Update parking spot status"""
@@ -870,20 +1360,7 @@ async def update_spot_status(spot_id: int, status: dict):
         if new_status not in ["free", "occupied", "reserved"]:
             raise HTTPException(status_code=400, detail="Invalid status")
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE parking_spots SET status = ?
-            WHERE id = ?
-        ''', (new_status, spot_id))
-        
-        if cursor.rowcount == 0:
-            conn.close()
-            raise HTTPException(status_code=404, detail="Parking spot not found")
-        
-        conn.commit()
-        conn.close()
+        await _set_spot_status(spot_id, new_status)
         
         return {"message": "Status updated successfully", "spot_id": spot_id, "new_status": new_status}
         
@@ -898,20 +1375,7 @@ async def update_spot_status_post(spot_id: int, status: dict):
         if new_status not in ["free", "occupied", "reserved"]:
             raise HTTPException(status_code=400, detail="Invalid status")
 
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            UPDATE parking_spots SET status = ?
-            WHERE id = ?
-        ''', (new_status, spot_id))
-
-        if cursor.rowcount == 0:
-            conn.close()
-            raise HTTPException(status_code=404, detail="Parking spot not found")
-
-        conn.commit()
-        conn.close()
+        await _set_spot_status(spot_id, new_status)
 
         return {"message": "Status updated successfully (POST)", "spot_id": spot_id, "new_status": new_status}
         
@@ -922,23 +1386,26 @@ async def update_spot_status_post(spot_id: int, status: dict):
 async def get_stats():
     """Get parking statistics"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        # Count spots by status
-        cursor.execute('''
-            SELECT status, COUNT(*) 
-            FROM parking_spots 
-            GROUP BY status
-        ''')
+        def _load():
+            with sqlite_pool.connection() as conn:
+                cursor = conn.cursor()
+            
+                # Count spots by status
+                cursor.execute('''
+                    SELECT status, COUNT(*) 
+                    FROM parking_spots 
+                    GROUP BY status
+                ''')
+            
+                stats = {"total": 0, "free": 0, "occupied": 0, "reserved": 0}
+                for row in cursor.fetchall():
+                    status, count = row
+                    stats[status] = count
+                    stats["total"] += count
+                return stats
+
+        stats = await db_worker.run(_load)
         
-        stats = {"total": 0, "free": 0, "occupied": 0, "reserved": 0}
-        for row in cursor.fetchall():
-            status, count = row
-            stats[status] = count
-            stats["total"] += count
-        
-        conn.close()
         return stats
         
     except sqlite3.Error as e:
@@ -1094,18 +1561,8 @@ async def geo_search(q: str, limit: int = 8, countrycodes: str = "ch"):
 from fastapi import Header, Request
 
 
-@app.post("/api/hardware/{hardware_id}/commands/queue")
-async def queue_hardware_command(hardware_id: str, request: Request, authorization: str = Header(None)):
-    """Development-only endpoint: accept hardware commands from the frontend and respond with a queued status.
-
-    Authorization: expects the demo token format `Bearer dev-token-<role>` where role is user/owner/admin.
-    Only `owner` and `admin` are allowed to queue hardware commands in this dev shim.
-    """
-    try:
-        body = await request.json()
-    except Exception:
-        body = {}
-
+def _hardware_control_role(authorization: Optional[str]) -> str:
+    """Role from the demo token or a real JWT; 403 unless owner/admin."""
     # Parse role from demo token or real JWT
     role = None
     token = None
@@ -1125,59 +1582,175 @@ async def queue_hardware_command(hardware_id: str, request: Request, authorizati
 
     if role not in ("owner", "admin"):
         raise HTTPException(status_code=403, detail="Forbidden: insufficient role to control hardware")
+    return role
+
+
+def _positive_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def _command_ttl(body) -> Optional[float]:
+    ttl = body.get("ttl_seconds") if isinstance(body, dict) else None
+    if ttl is not None and (isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or ttl <= 0):
+        raise HTTPException(status_code=400, detail="ttl_seconds must be a positive number")
+    return ttl
+
+
+@app.post("/api/hardware/{hardware_id}/commands/queue")
+async def queue_hardware_command(hardware_id: str, request: Request, authorization: str = Header(None)):
+    """Development-only endpoint: accept hardware commands from the frontend and respond with a queued status.
+
+    Authorization: expects the demo token format `Bearer dev-token-<role>` where role is user/owner/admin.
+    Only `owner` and `admin` are allowed to queue hardware commands in this dev shim.
+
+    Optional ``ttl_seconds`` in the body: the command expires if the device has not
+    fetched it by then (default COMMAND_DEFAULT_TTL_SECONDS).
+    """
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+
+    role = _hardware_control_role(authorization)
 
     cmd = body.get("command") if isinstance(body, dict) else None
     params = body.get("parameters") if isinstance(body, dict) else None
+    ttl = _command_ttl(body)
 
     # Persist command to DB
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO hardware_commands (hardware_id, command, parameters, issued_by)
-            VALUES (?, ?, ?, ?)
-        """, (hardware_id, cmd, json.dumps(params) if params is not None else None, authorization))
-        cmd_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        def _insert():
+            with sqlite_pool.connection() as conn:
+                return command_queue.enqueue(conn.cursor(), hardware_id, cmd, params, authorization, ttl)
+
+        cmd_id, seq = await db_worker.run(_insert)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to queue command: {e}")
 
-    print(f"[HARDWARE-QUEUE] id={cmd_id} hardware={hardware_id} cmd={cmd} by={role}")
-    return {"status": "queued", "id": cmd_id, "hardware_id": hardware_id, "command": cmd, "parameters": params}
+    command_longpoll.notify(hardware_id)
+    print(f"[HARDWARE-QUEUE] id={cmd_id} seq={seq} hardware={hardware_id} cmd={cmd} by={role}")
+    return {"status": "queued", "id": cmd_id, "seq": seq, "hardware_id": hardware_id, "command": cmd, "parameters": params}
+
+
+@app.post("/api/hardware/commands/fanout")
+async def fan_out_hardware_command(request: Request, authorization: str = Header(None)):
+    """Queue one command for many devices as a job (e.g. closing a whole garage).
+
+    Body: ``command``, optional ``parameters`` / ``ttl_seconds`` as for a single
+    command, and exactly one target: ``hardware_ids`` (list), ``owner_email`` (all
+    devices of the owner) or ``spot_ids`` (all devices on these spots). Only
+    registered devices are targeted; listed ids that are not show up in
+    ``unknown``. All rows are inserted in one transaction, parked long-polls of the
+    devices answer right away. Response: the job as GET /hardware/commands/jobs/{job_id}.
+    """
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+    role = _hardware_control_role(authorization)
+    if not isinstance(body, dict) or not isinstance(body.get("command"), str) or not body["command"]:
+        raise HTTPException(status_code=400, detail="command required")
+    cmd, params, ttl = body["command"], body.get("parameters"), _command_ttl(body)
+
+    targets = {k: body[k] for k in ("hardware_ids", "owner_email", "spot_ids") if body.get(k) is not None}
+    if len(targets) != 1:
+        raise HTTPException(status_code=400, detail="exactly one of hardware_ids, owner_email, spot_ids required")
+    hardware_ids, owner_email, spot_ids = targets.get("hardware_ids"), targets.get("owner_email"), targets.get("spot_ids")
+    if hardware_ids is not None and not (isinstance(hardware_ids, list) and all(isinstance(h, str) for h in hardware_ids)):
+        raise HTTPException(status_code=400, detail="hardware_ids must be a list of strings")
+    if spot_ids is not None and not (isinstance(spot_ids, list) and all(_positive_int(i) for i in spot_ids)):
+        raise HTTPException(status_code=400, detail="spot_ids must be a list of spot ids")
+    if owner_email is not None and not isinstance(owner_email, str):
+        raise HTTPException(status_code=400, detail="owner_email must be a string")
+    for selected in (hardware_ids, spot_ids):
+        if selected is not None and len(selected) > command_queue.COMMAND_FANOUT_MAX_DEVICES:
+            raise HTTPException(status_code=400, detail=f"at most {command_queue.COMMAND_FANOUT_MAX_DEVICES} targets per job")
+
+    def _fan_out():
+        with sqlite_pool.connection() as conn:
+            cursor = conn.cursor()
+            devices = command_queue.fan_out_targets(cursor, hardware_ids, owner_email, spot_ids)
+            if not devices or len(devices) > command_queue.COMMAND_FANOUT_MAX_DEVICES:
+                return devices, None
+            job_id = command_queue.fan_out(cursor, devices, cmd, params, authorization, ttl, target=targets)
+            return devices, command_queue.job_status(cursor, job_id)
+
+    try:
+        devices, job = await db_worker.run(_fan_out)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue command: {e}")
+    if not devices:
+        raise HTTPException(status_code=404, detail="No registered devices match the target")
+    if job is None:
+        raise HTTPException(status_code=400, detail=f"{len(devices)} devices match, at most {command_queue.COMMAND_FANOUT_MAX_DEVICES} per job")
+
+    for hw in devices:
+        command_longpoll.notify(hw)
+    print(f"[HARDWARE-QUEUE] job={job['job_id']} devices={len(devices)} cmd={cmd} by={role}")
+    if hardware_ids is not None:
+        found = set(devices)
+        job["unknown"] = [h for h in dict.fromkeys(hardware_ids) if h not in found]
+    return job
+
+
+@app.get("/api/hardware/commands/jobs/{job_id}")
+async def get_hardware_command_job(job_id: int, authorization: str = Header(None)):
+    """Fan-out job with the delivery status per device (queued, sent, done, expired, dead)."""
+    _hardware_control_role(authorization)
+
+    def _status():
+        with sqlite_pool.connection() as conn:
+            return command_queue.job_status(conn.cursor(), job_id)
+
+    try:
+        job = await db_worker.run(_status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Job status error: {e}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def _claim_commands(hardware_id: str) -> List[dict]:
+    """Hand out the device's queued commands (marked sent), shared by the poll and telemetry endpoints."""
+    def _claim():
+        # One atomic UPDATE ... RETURNING: exactly-once across workers and retries
+        with sqlite_pool.connection() as conn:
+            return command_queue.claim(conn.cursor(), hardware_id)
+    return await db_worker.run(_claim)
 
 
 @app.get("/api/hardware/{hardware_id}/commands")
-async def poll_hardware_commands(hardware_id: str):
-    """Device polling endpoint: returns queued commands for the hardware and marks them as sent."""
+async def poll_hardware_commands(hardware_id: str, wait: float = 0):
+    """Device polling endpoint: returns queued commands for the hardware and marks them as sent.
+
+    ``?wait=<seconds>`` turns it into a long-poll (capped at COMMAND_LONGPOLL_MAX_WAIT_SECONDS):
+    with nothing queued the request is held until a command for the device is
+    queued or the time is up. When too many requests are parked already it
+    answers right away as without ``wait``.
+    """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, command, parameters, created_at FROM hardware_commands
-            WHERE hardware_id = ? AND status = 'queued'
-            ORDER BY created_at ASC
-        ''', (hardware_id,))
-        rows = cursor.fetchall()
+        wait = min(max(wait, 0.0), command_waiters.COMMAND_LONGPOLL_MAX_WAIT_SECONDS)
+        # Registered before the first claim, so a command queued in between still wakes us
+        event = command_longpoll.acquire(hardware_id) if wait > 0 else None
         cmds = []
-        now = datetime.now()
-        for row in rows:
-            cmd_id, command, parameters, created_at = row
-            params = None
-            if parameters:
-                try:
-                    params = json.loads(parameters)
-                except Exception:
-                    params = parameters
-            cmds.append({"id": cmd_id, "command": command, "parameters": params, "created_at": created_at})
-
-        # mark them as sent
-        if rows:
-            ids = [str(r[0]) for r in rows]
-            cursor.execute(f"UPDATE hardware_commands SET status = 'sent', claimed_at = ? WHERE id IN ({','.join(['?']*len(ids))})", tuple([now.isoformat()]+ids))
-            conn.commit()
-
-        conn.close()
+        try:
+            cmds = await _claim_commands(hardware_id)
+            if event is not None and not cmds:
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + wait
+                while not cmds and not command_longpoll.closing:
+                    try:
+                        await asyncio.wait_for(event.wait(), deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        break
+                    event.clear()
+                    # Woken for a command another request may have claimed already
+                    cmds = await _claim_commands(hardware_id)
+        finally:
+            if event is not None:
+                command_longpoll.release(hardware_id, event, woken=bool(cmds))
+
         return {"commands": cmds}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Polling error: {e}")
@@ -1185,16 +1758,54 @@ async def poll_hardware_commands(hardware_id: str):
 
 @app.post("/api/hardware/{hardware_id}/commands/{cmd_id}/ack")
 async def ack_hardware_command(hardware_id: str, cmd_id: int, payload: dict = None):
-    """Device acknowledges execution of a command (sets status=done)."""
+    """Device acknowledges execution of a command (sets status=done).
+
+    Only a command delivered to the device and still in flight (sent, or queued
+    again for redelivery) can be acknowledged; anything else - unknown, never
+    delivered, already done, expired, dead or superseded - answers 409.
+    """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE hardware_commands SET status = 'done', executed_at = ? WHERE id = ? AND hardware_id = ?
-        ''', (datetime.now(), cmd_id, hardware_id))
-        conn.commit()
-        conn.close()
-        return {"status": "acknowledged", "id": cmd_id}
+        def _ack():
+            with sqlite_pool.connection() as conn:
+                return command_queue.ack_batch(conn.cursor(), hardware_id, [cmd_id])
+
+        acknowledged = await db_worker.run(_ack)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ack error: {e}")
+    if not acknowledged:
+        raise HTTPException(status_code=409, detail="Command is not awaiting an ack")
+    return {"status": "acknowledged", "id": cmd_id}
+
+
+@app.post("/api/hardware/{hardware_id}/commands/ack")
+async def ack_hardware_commands(hardware_id: str, payload: dict = None):
+    """Acknowledge several commands in one request (sets status=done).
+
+    Body: ``{"ids": [3, 4, 5]}`` and/or ``{"up_to_seq": 12}`` - every command of the
+    device with seq <= 12 (the ``seq`` of GET /commands). Only send a watermark
+    when every command up to it was executed. Same rule as the single-id ack
+    (both run command_queue.ack_batch): commands not delivered yet, or no longer
+    in flight (done, expired, dead, superseded), are left alone. Response: number
+    acknowledged.
+    """
+    payload = payload or {}
+    ids = payload.get("ids") or []
+    up_to_seq = payload.get("up_to_seq")
+    if not isinstance(ids, list) or not all(_positive_int(i) for i in ids):
+        raise HTTPException(status_code=400, detail="ids must be a list of command ids")
+    if len(ids) > command_queue.COMMAND_ACK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"at most {command_queue.COMMAND_ACK_MAX_IDS} ids per request")
+    if up_to_seq is not None and not _positive_int(up_to_seq):
+        raise HTTPException(status_code=400, detail="up_to_seq must be a positive integer")
+    if not ids and up_to_seq is None:
+        raise HTTPException(status_code=400, detail="ids or up_to_seq required")
+    try:
+        def _ack():
+            with sqlite_pool.connection() as conn:
+                return command_queue.ack_batch(conn.cursor(), hardware_id, ids, up_to_seq)
+
+        acknowledged = await db_worker.run(_ack)
+        return {"status": "acknowledged", "acknowledged": acknowledged}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ack error: {e}")
 
@@ -1205,15 +1816,30 @@ async def queue_hardware_command_alias(hardware_id: str, request: Request, autho
     return await queue_hardware_command(hardware_id, request, authorization)
 
 
+@app.post('/hardware/commands/fanout')
+async def fan_out_hardware_command_alias(request: Request, authorization: str = Header(None)):
+    return await fan_out_hardware_command(request, authorization)
+
+
+@app.get('/hardware/commands/jobs/{job_id}')
+async def get_hardware_command_job_alias(job_id: int, authorization: str = Header(None)):
+    return await get_hardware_command_job(job_id, authorization)
+
+
 @app.get('/hardware/{hardware_id}/commands')
-async def poll_hardware_commands_alias(hardware_id: str):
-    return await poll_hardware_commands(hardware_id)
+async def poll_hardware_commands_alias(hardware_id: str, wait: float = 0):
+    return await poll_hardware_commands(hardware_id, wait)
 
 
 @app.post('/hardware/{hardware_id}/commands/{cmd_id}/ack')
 async def ack_hardware_command_alias(hardware_id: str, cmd_id: int, payload: dict = None):
     return await ack_hardware_command(hardware_id, cmd_id, payload)
 
+
+@app.post('/hardware/{hardware_id}/commands/ack')
+async def ack_hardware_commands_alias(hardware_id: str, payload: dict = None):
+    return await ack_hardware_commands(hardware_id, payload)
+
  
 
 
@@ -1435,62 +2061,267 @@ async def unified_autocomplete(q: str, request: Request, limit: int = 12, countr
     return final
 
 
-@app.post('/hardware/{hardware_id}/telemetry')
-async def receive_hardware_telemetry(hardware_id: str, payload: HardwareTelemetry):
-    """Receive telemetry/heartbeat from hardware devices.
+def _write_telemetry(latest: Dict[str, dict], history: List[tuple], events: List[occupancy.Transition]) -> bool:
+    """One transaction for a whole buffer flush: upsert the latest state per device,
+    append the history rows, record occupancy transitions and apply them to the
+    assigned spots. Returns True if a spot changed."""
+    with sqlite_pool.connection() as conn:
+        cursor = conn.cursor()
+        created_at = datetime.now().isoformat()
+        cursor.executemany('''
+            INSERT INTO hardware_devices (hardware_id, owner_email, parking_spot_id, created_at, last_heartbeat, battery_level, rssi, occupancy, last_mag, status)
+            VALUES (?, NULL, NULL, ?, ?, ?, ?, ?, ?, 'online')
+            ON CONFLICT(hardware_id) DO UPDATE SET
+                last_heartbeat = excluded.last_heartbeat, battery_level = excluded.battery_level,
+                rssi = excluded.rssi, occupancy = excluded.occupancy, last_mag = excluded.last_mag, status = 'online'
+            WHERE hardware_devices.last_heartbeat IS NULL OR excluded.last_heartbeat >= hardware_devices.last_heartbeat
+        ''', [(hw, created_at, t['last_heartbeat'], t['battery_level'], t['rssi'], t['occupancy'],
+               json.dumps(t['last_mag']) if t['last_mag'] is not None else None) for hw, t in latest.items()])
+
+        # Append to the history (hardware_devices only keeps the latest values)
+        telemetry_store.insert_readings(cursor, history)
+
+        # Spots are only touched on debounced transitions, not on every heartbeat
+        if not events:
+            return False
+        codes = telemetry_store.OCCUPANCY_CODES
+        cursor.executemany('''
+            INSERT INTO occupancy_events (hardware_id, parking_spot_id, ts, from_state, to_state)
+            VALUES (?, (SELECT parking_spot_id FROM hardware_devices WHERE hardware_id = ?), ?, ?, ?)
+        ''', [(e.hardware_id, e.hardware_id, e.ts, codes.get(e.from_state), codes[e.to_state]) for e in events])
+        before = conn.total_changes
+        cursor.executemany('''
+            UPDATE parking_spots SET status = ?
+            WHERE id = (SELECT parking_spot_id FROM hardware_devices WHERE hardware_id = ?) AND status IS NOT ?
+        ''', [(e.to_state, e.hardware_id, e.to_state) for e in events])
+        return conn.total_changes > before
 
-    Example payload: { battery_level: 3.7, rssi: -72, occupancy: 'occupied', last_mag: {x:..,y:..,z:..}, timestamp: '2025-11-02T12:34:56' }
-    """
+
+async def _flush_telemetry(latest: Dict[str, dict], history: List[tuple], events: List[occupancy.Transition]):
+    if await db_worker.run(_write_telemetry, latest, history, events):
+        spot_list_cache.bump()
+
+# Write-behind buffer: telemetry is acked from memory and flushed in batches (see backend/telemetry_buffer.py)
+telemetry_writer = telemetry_buffer.TelemetryBuffer(_flush_telemetry)
+# Debounced occupancy per device; seeded from the DB at startup
+occupancy_tracker = occupancy.OccupancyTracker()
+# Heartbeat deadlines (min-heap) for online/offline; seeded from the DB at startup
+liveness_tracker = liveness.LivenessTracker()
+
+
+def _heartbeat_epoch(value) -> Optional[float]:
+    """hardware_devices.last_heartbeat (ISO string) -> epoch seconds."""
+    if not value:
+        return None
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
 
-        cursor.execute('SELECT id FROM hardware_devices WHERE hardware_id = ?', (hardware_id,))
-        row = cursor.fetchone()
-        now = payload.timestamp.isoformat() if payload.timestamp else datetime.now().isoformat()
-        last_mag_json = json.dumps(payload.last_mag) if payload.last_mag is not None else None
 
-        if row:
-            cursor.execute('''
-                UPDATE hardware_devices SET last_heartbeat = ?, battery_level = ?, rssi = ?, occupancy = ?, last_mag = ?
-                WHERE hardware_id = ?
-            ''', (now, payload.battery_level, payload.rssi, payload.occupancy, last_mag_json, hardware_id))
-        else:
-            cursor.execute('''
-                INSERT INTO hardware_devices (hardware_id, owner_email, parking_spot_id, created_at, last_heartbeat, battery_level, rssi, occupancy, last_mag)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (hardware_id, None, None, datetime.now().isoformat(), now, payload.battery_level, payload.rssi, payload.occupancy, last_mag_json))
+# Dashboard aggregates, updated on every telemetry post and liveness change
+fleet = fleet_snapshot.FleetSnapshot()
+# Per-device magnetometer baselines; rebuilt every minute from telemetry_readings
+mag_model = mag_classifier.MagClassifier()
+# Long-poll requests parked on GET /hardware/{id}/commands?wait=
+command_longpoll = command_waiters.CommandWaiters()
+
+
+def _track_device(hardware_id: str, latest: dict):
+    """In-memory bookkeeping for a device that just posted telemetry."""
+    event = liveness_tracker.beat(hardware_id)
+    if event:
+        print(f"[LIVENESS] {hardware_id} online")
+    fleet.update(hardware_id, status="online", occupancy=latest['occupancy'],
+                 battery_level=latest['battery_level'], rssi=latest['rssi'])
+
+
+def _telemetry_entry(hardware_id: str, payload):
+    # payload: HardwareTelemetry or telemetry_codec.Reading
+    """(latest state, history row) of one reading; shared by all ingest paths."""
+    now = payload.timestamp.isoformat() if payload.timestamp else datetime.now().isoformat()
+    # The server's magnetometer verdict wins over the firmware's when it is confident
+    occupancy_state = mag_model.reclassify(hardware_id, payload.occupancy, payload.last_mag)
+    latest = {
+        'last_heartbeat': now,
+        'battery_level': payload.battery_level,
+        'rssi': payload.rssi,
+        'occupancy': occupancy_state,
+        'last_mag': payload.last_mag,
+    }
+    row = telemetry_store.reading_row(
+        hardware_id, telemetry_store.to_epoch(payload.timestamp),
+        payload.battery_level, payload.rssi, occupancy_state, payload.last_mag,
+    )
+    return latest, row
+
+
+async def _ingest_batch(readings) -> Dict[str, str]:
+    """Persist ``[(hardware_id, reading)]`` in one transaction, bypassing the buffer
+    (the device drops its local copy on the ack, so it must be durable).
+    Returns the ack watermark per device: the newest timestamp now stored."""
+    if len(readings) > telemetry_store.TELEMETRY_BATCH_MAX_READINGS:
+        raise HTTPException(status_code=413, detail=f"Too many readings (max {telemetry_store.TELEMETRY_BATCH_MAX_READINGS})")
+    latest: Dict[str, dict] = {}
+    newest: Dict[str, float] = {}
+    rows = []
+    for hardware_id, reading in readings:
+        state, row = _telemetry_entry(hardware_id, reading)
+        rows.append(row)
+        # Latest state = newest reading, whatever order the modem sent them in
+        if hardware_id not in newest or row[1] >= newest[hardware_id]:
+            newest[hardware_id] = row[1]
+            latest[hardware_id] = state
+    # Posting at all means the device (or its gateway) is reachable now
+    for hardware_id, state in latest.items():
+        _track_device(hardware_id, state)
+    # Occupancy state machine sees the readings in time order
+    events = []
+    for r in sorted(rows, key=lambda r: (r[0], r[1])):
+        transition = occupancy_tracker.observe(r[0], telemetry_store.OCCUPANCY_NAMES.get(r[4]), r[1])
+        if transition:
+            events.append(transition)
+    if rows:
+        try:
+            await _flush_telemetry(latest, rows, events)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Telemetry error: {e}")
+    return {hw: state['last_heartbeat'] for hw, state in latest.items()}
+
+
+_TELEMETRY_SINGLE = TypeAdapter(HardwareTelemetry)
+_TELEMETRY_BATCH = TypeAdapter(List[TimestampedTelemetry])
+
+
+def _telemetry_body(schema: dict) -> dict:
+    """OpenAPI request body for endpoints that read JSON or the binary encoding themselves."""
+    return {"requestBody": {"required": True, "content": {
+        "application/json": {"schema": schema},
+        telemetry_codec.CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+    }}}
 
-        # Sync parking spot status if device is assigned
+
+async def _read_telemetry(request: Request, batch: bool) -> list:
+    """Parse a telemetry body (JSON or telemetry_codec binary) into readings.
+
+    JSON gives HardwareTelemetry models, binary gives telemetry_codec.Reading tuples
+    with the same attributes, so everything after this is shared.
+    """
+    body = await request.body()
+    if telemetry_codec.is_binary(request.headers.get('content-type')):
         try:
-            cursor.execute('SELECT parking_spot_id FROM hardware_devices WHERE hardware_id = ?', (hardware_id,))
-            ps_row = cursor.fetchone()
-            if ps_row and ps_row[0] is not None and payload.occupancy in ("free", "occupied", "reserved"):
-                cursor.execute('UPDATE parking_spots SET status = ? WHERE id = ?', (payload.occupancy, ps_row[0]))
-        except Exception:
-            pass
+            items = telemetry_codec.decode(body, require_timestamp=batch)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid telemetry encoding: {e}")
+        if not batch and len(items) != 1:
+            raise HTTPException(status_code=422, detail="Invalid telemetry encoding: exactly one reading expected")
+        return items
+    try:
+        if batch:
+            return _TELEMETRY_BATCH.validate_json(body)
+        return [_TELEMETRY_SINGLE.validate_json(body)]
+    except ValidationError as e:
+        raise RequestValidationError([{**err, 'loc': ('body', *err['loc'])} for err in e.errors(include_url=False)])
+
+
+@app.post('/hardware/{hardware_id}/telemetry',
+          openapi_extra=_telemetry_body(HardwareTelemetry.model_json_schema()))
+async def receive_hardware_telemetry(hardware_id: str, request: Request, commands: bool = False):
+    """Receive telemetry/heartbeat from hardware devices.
+
+    Example payload: { battery_level: 3.7, rssi: -72, occupancy: 'occupied', last_mag: {x:..,y:..,z:..}, timestamp: '2025-11-02T12:34:56' }
+    or one reading in the binary encoding (Content-Type: application/vnd.parking.telemetry,
+    see backend/telemetry_codec.py).
+
+    The reading is buffered and acknowledged right away; telemetry_writer persists
+    it with the next batch (at most TELEMETRY_FLUSH_INTERVAL_MS later).
 
-        conn.commit()
-        conn.close()
-        return {"status": "ok", "hardware_id": hardware_id, "last_heartbeat": now}
+    ``?commands=1``: the response also carries the device's queued commands
+    (``"commands": [...]``, claimed exactly like GET /hardware/{id}/commands), so
+    the device needs no separate poll in that cycle.
+    """
+    payload = (await _read_telemetry(request, batch=False))[0]
+    try:
+        latest, row = _telemetry_entry(hardware_id, payload)
+        transition = occupancy_tracker.observe(hardware_id, latest['occupancy'], row[1])
+        _track_device(hardware_id, latest)
+        await telemetry_writer.submit(hardware_id, latest, [row], [transition] if transition else ())
+
+        response = {"status": "ok", "hardware_id": hardware_id, "last_heartbeat": latest['last_heartbeat']}
+        if commands:
+            response["commands"] = await _claim_commands(hardware_id)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Telemetry error: {e}")
 
 
+@app.post('/hardware/{hardware_id}/telemetry/batch',
+          openapi_extra=_telemetry_body({"type": "array", "items": TimestampedTelemetry.model_json_schema()}))
+async def receive_hardware_telemetry_batch(hardware_id: str, request: Request):
+    """Upload readings buffered on the device (e.g. after a coverage gap) in one request.
+
+    Body: ``[{timestamp, battery_level, rssi, occupancy, last_mag}, ...]`` (timestamp required),
+    or N readings in the binary encoding (application/vnd.parking.telemetry, ts != 0).
+    The whole array is validated before anything is written, then stored in one
+    transaction; re-sent readings (same timestamp) are ignored. Response: ``{"ack": <timestamp>}``,
+    the newest reading stored - the device can drop everything up to it.
+    """
+    payload = await _read_telemetry(request, batch=True)
+    acks = await _ingest_batch([(hardware_id, r) for r in payload])
+    return {"ack": acks.get(hardware_id)}
+
+
+@app.post('/hardware/telemetry/batch')
+async def receive_gateway_telemetry_batch(payload: List[GatewayTelemetry]):
+    """Gateway variant: readings of several devices, each item carries ``hardware_id``.
+
+    Response: ``{"ack": {<hardware_id>: <newest timestamp stored>, ...}}``.
+    """
+    acks = await _ingest_batch([(r.hardware_id, r) for r in payload])
+    return {"ack": acks}
+
+
+@app.get('/hardware/liveness')
+async def hardware_liveness(offline_limit: int = 100):
+    """Fleet liveness from the in-memory deadline heap: online/offline counts (no table scan),
+    the longest-silent offline devices and the latest online/offline events.
+
+    A device is offline after LIVENESS_TIMEOUT_SECONDS without telemetry.
+    """
+    return liveness_tracker.summary(offline_limit=max(0, min(offline_limit, 1000)))
+
+
+@app.get('/hardware/{hardware_id}/mag-calibration')
+async def hardware_mag_calibration(hardware_id: str):
+    """Server-side magnetometer calibration of a device (see backend/mag_classifier.py):
+    baseline and threshold in firmware units, noise level, number of free readings
+    learned and the calibration last sent to the device via calibrate_mag."""
+    calibration = mag_model.describe(hardware_id)
+    if calibration is None:
+        raise HTTPException(status_code=404, detail="No magnetometer calibration for this device")
+    return {"hardware_id": hardware_id, **calibration}
+
+
 @app.get('/hardware/{hardware_id}/telemetry')
 async def get_hardware_telemetry(hardware_id: str):
     """Return latest telemetry for a given hardware device."""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT hardware_id, owner_email, parking_spot_id, created_at, last_heartbeat, battery_level, rssi, occupancy, last_mag
-            FROM hardware_devices WHERE hardware_id = ?
-        ''', (hardware_id,))
-        row = cursor.fetchone()
-        conn.close()
-        if not row:
+        def _load():
+            with sqlite_pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT hardware_id, owner_email, parking_spot_id, created_at, last_heartbeat, battery_level, rssi, occupancy, last_mag
+                    FROM hardware_devices WHERE hardware_id = ?
+                ''', (hardware_id,))
+                return cursor.fetchone()
+
+        row = await db_worker.run(_load)
+        pending = telemetry_writer.pending_for(hardware_id)
+        if not row and pending is None:
             raise HTTPException(status_code=404, detail='Hardware device not found')
+        if not row:
+            # First contact still in the write-behind buffer
+            row = (hardware_id, None, None, None, None, None, None, None, None)
 
         last_mag = json.loads(row[8]) if row[8] else None
         telemetry = {
@@ -1500,11 +2331,14 @@ async def get_hardware_telemetry(hardware_id: str):
             'occupancy': row[7],
             'last_mag': last_mag
         }
+        if pending is not None:
+            telemetry = dict(pending)
         return {
             'hardware_id': row[0],
             'owner_email': row[1],
             'parking_spot_id': row[2],
             'created_at': row[3],
+            'status': liveness_tracker.status(row[0]),
             'telemetry': telemetry
         }
     except HTTPException:
@@ -1513,10 +2347,176 @@ async def get_hardware_telemetry(hardware_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get('/hardware/{hardware_id}/telemetry/rollups')
+async def get_hardware_telemetry_rollups(
+    hardware_id: str,
+    since: Optional[datetime] = Query(None, alias="from"),
+    until: Optional[datetime] = Query(None, alias="to"),
+    step: Optional[int] = None,
+    points: Optional[int] = None,
+):
+    """Aggregated telemetry for charts: min/max/avg/last of battery_level and rssi
+    and the occupied ratio per bucket.
+
+    ``from``/``to`` default to the last 24 hours. The tier (1m, 1h, 1d) is picked
+    automatically: the coarsest one with buckets no wider than ``step`` seconds
+    (or range/``points``, default 200 points) that still holds data for ``from``.
+    """
+    until_ts = telemetry_store.to_epoch(until)
+    since_ts = telemetry_store.to_epoch(since) if since else until_ts - 86400.0
+    if since_ts >= until_ts:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if step is not None and step <= 0 or points is not None and points <= 0:
+        raise HTTPException(status_code=400, detail="step and points must be positive")
+    if step is None and points is not None:
+        step = (until_ts - since_ts) / points
+    tier, seconds = telemetry_rollups.pick_tier(since_ts, until_ts, step)
+
+    def _load():
+        with sqlite_pool.connection() as conn:
+            return telemetry_rollups.rollups(conn.cursor(), hardware_id, seconds, since_ts, until_ts)
+
+    try:
+        buckets = await db_worker.run(_load)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return json_stream.FastJSONResponse({
+        "hardware_id": hardware_id,
+        "tier": tier,
+        "step_seconds": seconds,
+        "buckets": buckets,
+    })
+
+
+@app.get('/hardware/{hardware_id}/telemetry/series')
+async def get_hardware_telemetry_series(
+    hardware_id: str,
+    since: Optional[datetime] = Query(None, alias="from"),
+    until: Optional[datetime] = Query(None, alias="to"),
+    points: int = 500,
+    metrics: Optional[str] = None,
+    method: str = "lttb",
+):
+    """Chart series of a device, downsampled on the server to at most ``points`` per metric.
+
+    ``metrics=battery_level,rssi,occupied`` (default battery_level,rssi), ``method=lttb``
+    (keeps the shape) or ``minmax`` (keeps peaks). ``from``/``to`` default to the last
+    24 hours. Short ranges are computed from the raw readings; when one output point
+    spans more than SERIES_RAW_MAX_STEP_SECONDS the matching rollup tier is read
+    instead, so the cost stays bounded for any range. ``t`` is epoch milliseconds.
+    """
+    until_ts = telemetry_store.to_epoch(until)
+    since_ts = telemetry_store.to_epoch(since) if since else until_ts - 86400.0
+    if since_ts >= until_ts:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if method not in downsample.METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of: {', '.join(downsample.METHODS)}")
+    if points < 3 or points > downsample.SERIES_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"points must be between 3 and {downsample.SERIES_MAX_POINTS}")
+    try:
+        selected = pagination.parse_fields(metrics, list(telemetry_store.SERIES_METRICS)) or ["battery_level", "rssi"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    step = (until_ts - since_ts) / points
+    source, tier_seconds = "raw", None
+    if step > downsample.SERIES_RAW_MAX_STEP_SECONDS:
+        source, tier_seconds = telemetry_rollups.pick_tier(since_ts, until_ts, step)
+
+    def _build():
+        with sqlite_pool.connection() as conn:
+            cursor = conn.cursor()
+            if tier_seconds is None:
+                rows = telemetry_store.series_rows(cursor, hardware_id, since_ts, until_ts, selected)
+                columns = {m: [(r[0], r[i + 1]) for r in rows] for i, m in enumerate(selected)}
+            else:
+                columns = {m: telemetry_rollups.series_rows(cursor, hardware_id, tier_seconds, since_ts, until_ts,
+                                                            m, extremes=(method == "minmax"))
+                           for m in selected}
+        # Downsampling happens after the connection is released
+        series = {}
+        for m, pairs in columns.items():
+            t, v = downsample.downsample([p[0] for p in pairs], [p[1] for p in pairs], points, method)
+            series[m] = {"t": [int(x * 1000) for x in t], "v": v}
+        return series
+
+    try:
+        series = await db_worker.run(_build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return json_stream.FastJSONResponse({
+        "hardware_id": hardware_id,
+        "source": source,
+        "method": method,
+        "series": series,
+    })
+
+
+@app.get('/hardware/{hardware_id}/occupancy/events')
+async def get_occupancy_events(
+    hardware_id: str,
+    since: Optional[datetime] = Query(None, alias="from"),
+    until: Optional[datetime] = Query(None, alias="to"),
+    limit: int = 1000,
+):
+    """Debounced occupancy transitions of a device, oldest first (default: last 7 days).
+
+    Consecutive ``to: occupied`` / ``to: free`` events delimit parking sessions.
+    """
+    until_ts = telemetry_store.to_epoch(until)
+    since_ts = telemetry_store.to_epoch(since) if since else until_ts - 7 * 86400.0
+    limit = max(1, min(limit, pagination.MAX_PAGE_SIZE))
+
+    def _load():
+        with sqlite_pool.connection() as conn:
+            return conn.execute(hot_queries.OCCUPANCY_EVENTS_SQL,
+                                (hardware_id, since_ts, until_ts, limit)).fetchall()
+
+    try:
+        rows = await db_worker.run(_load)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    names = telemetry_store.OCCUPANCY_NAMES
+    return json_stream.FastJSONResponse({
+        "hardware_id": hardware_id,
+        "events": [{
+            "id": r[0],
+            "parking_spot_id": r[1],
+            "ts": datetime.fromtimestamp(r[2], tz=timezone.utc).isoformat(),
+            "from": names.get(r[3]),
+            "to": names.get(r[4]),
+        } for r in rows],
+    })
+
+
+DEVICE_LIST_FIELDS = ["hardware_id", "owner_email", "parking_spot_id", "created_at", "status", "telemetry"]
+DEVICE_TELEMETRY_FIELDS = ["last_heartbeat", "battery_level", "rssi", "occupancy", "last_mag"]
+
+
+def _project_device(device: dict, selected: List[str]) -> dict:
+    out = {k: device[k] for k in DEVICE_LIST_FIELDS if k in selected}
+    if "telemetry" not in out:
+        telemetry = {k: device["telemetry"][k] for k in DEVICE_TELEMETRY_FIELDS if k in selected}
+        if telemetry:
+            out["telemetry"] = telemetry
+    return out
+
+
 @app.get('/owner/devices')
-async def list_owner_devices(authorization: str = Header(None)):
+async def list_owner_devices(
+    authorization: str = Header(None),
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
     """Return devices assigned to the owner.
 
+    Ordered by hardware_id. With ``limit``/``cursor`` the list is paged by keyset;
+    ``next_cursor`` in the response is null on the last page (and always without
+    ``limit``, where the whole list is streamed). ``fields=`` picks
+    keys from hardware_id, owner_email, parking_spot_id, created_at, status, telemetry
+    and the single telemetry keys (e.g. ``fields=occupancy,battery_level``).
+
     Sicherheits-Note: In der Dev-Umgebung gibt es einfache Demo-Tokens
     im Format `dev-token-<role>`. Dieses Endpoint darf nur von Admins
     verwendet werden. Nicht-Admin-Requests liefern 403.
@@ -1544,57 +2544,97 @@ async def list_owner_devices(authorization: str = Header(None)):
                 owner_email = payload.get('sub') or payload.get('email')
 
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-
-        # If admin, return all devices. If owner, return only devices owned by that owner's email.
-        if role == 'admin':
-            cursor.execute('''SELECT hardware_id, owner_email, parking_spot_id, created_at, last_heartbeat, battery_level, rssi, occupancy, last_mag FROM hardware_devices''')
-            rows = cursor.fetchall()
-        elif role == 'owner' and owner_email:
-            cursor.execute('''SELECT hardware_id, owner_email, parking_spot_id, created_at, last_heartbeat, battery_level, rssi, occupancy, last_mag FROM hardware_devices WHERE owner_email = ?''', (owner_email,))
-            rows = cursor.fetchall()
-        else:
-            # Forbidden for other roles or unauthenticated requests
-            raise HTTPException(status_code=403, detail='Forbidden: admin or owner role required')
-
-        devices = []
-        for r in rows:
-            hardware_id = r[0]
-            owner_email = r[1]
-            parking_spot_id = r[2]
-            created_at = r[3]
-            # telemetry columns
-            last_heartbeat = r[4]
-            battery_level = r[5]
-            rssi = r[6]
-            occupancy = r[7]
-            last_mag = json.loads(r[8]) if r[8] else None
-
-            telemetry = {
-                'last_heartbeat': last_heartbeat,
-                'battery_level': battery_level,
-                'rssi': rssi,
-                'occupancy': occupancy,
-                'last_mag': last_mag
+        size = pagination.page_size(limit, cursor)
+        selected = pagination.parse_fields(fields, DEVICE_LIST_FIELDS + DEVICE_TELEMETRY_FIELDS, always=("hardware_id",))
+        after = pagination.decode_cursor(cursor, (str,)) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # If admin, return all devices. If owner, return only devices owned by that owner's email.
+    # (checked before any DB work: a streamed response cannot turn into a 403 later)
+    if not (role == 'admin' or (role == 'owner' and owner_email)):
+        # Forbidden for other roles or unauthenticated requests
+        raise HTTPException(status_code=403, detail='Forbidden: admin or owner role required')
+
+    def _load(after=None, size=None):
+        with sqlite_pool.connection() as conn:
+            cursor = conn.cursor()
+
+            owner = role != 'admin'
+            params = ([owner_email] if owner else []) + (list(after) if after is not None else [])
+            if size is not None:
+                params.append(size + 1)
+            cursor.execute(hot_queries.devices_sql(owner, after is not None, size is not None), params)
+            return cursor.fetchall()
+
+    def _device(r):
+        device = {
+            "hardware_id": r[0],
+            "owner_email": r[1],
+            "parking_spot_id": r[2],
+            "created_at": r[3],
+            "status": liveness_tracker.status(r[0]),
+            "telemetry": {
+                'last_heartbeat': r[4],
+                'battery_level': r[5],
+                'rssi': r[6],
+                'occupancy': r[7],
+                'last_mag': json.loads(r[8]) if r[8] else None
             }
+        }
+        pending = telemetry_writer.pending_for(r[0])
+        if pending is not None:
+            device["telemetry"] = dict(pending)
+        if selected is not None:
+            device = _project_device(device, selected)
+        return device
+
+    if size is None:
+        # Whole fleet: stream it batch by batch instead of building one big list
+        # (same shape as a last page: next_cursor null)
+        fetch = _keyset_fetcher(_load, key=lambda r: [r[0]], transform=_device)
+        return json_stream.streaming_json(fetch, prefix=b'{"devices":[', suffix=b'],"next_cursor":null}')
 
-            devices.append({
-                "hardware_id": hardware_id,
-                "owner_email": owner_email,
-                "parking_spot_id": parking_spot_id,
-                "created_at": created_at,
-                "telemetry": telemetry
-            })
-
-        conn.close()
-        return {"devices": devices}
-    except HTTPException:
-        raise
+    try:
+        rows = await db_worker.run(_load, after, size)
+        next_cursor = None
+        if len(rows) > size:
+            rows = rows[:size]
+            next_cursor = pagination.encode_cursor([rows[-1][0]])
+        return json_stream.FastJSONResponse({"devices": [_device(r) for r in rows], "next_cursor": next_cursor})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get('/owner/devices/summary')
+async def owner_devices_summary(authorization: str = Header(None), limit: int = fleet_snapshot.FLEET_SNAPSHOT_LIST_LIMIT):
+    """Fleet health for the monitoring tab, served from the in-memory snapshot (no DB read).
+
+    Counts by status and occupancy, low-battery and weakest-RSSI devices (``limit``
+    each). Admins get the whole fleet plus a per-owner breakdown, owners their devices.
+    """
+    token = None
+    role = None
+    owner_email = None
+    if authorization:
+        token = authorization.split(' ', 1)[1] if authorization.startswith('Bearer ') else authorization
+    if token:
+        if token.startswith('dev-token-'):
+            role = token.replace('dev-token-', '')
+            if role == 'owner':
+                owner_email = 'owner@test.com'
+        else:
+            payload = auth.decode_token(token)
+            if payload:
+                role = payload.get('role')
+                owner_email = payload.get('sub') or payload.get('email')
+
+    if not (role == 'admin' or (role == 'owner' and owner_email)):
+        raise HTTPException(status_code=403, detail='Forbidden: admin or owner role required')
+    limit = max(0, min(limit, 1000))
+    return json_stream.FastJSONResponse(fleet.summary(owner=None if role == 'admin' else owner_email, limit=limit))
+
+
 @app.post('/owner/devices/assign')
 async def assign_device_to_spot(payload: dict, authorization: str = Header(None)):
     """Assign a hardware_id to a parking_spot_id. Requires owner/admin role in demo token."""
@@ -1633,17 +2673,21 @@ async def assign_device_to_spot(payload: dict, authorization: str = Header(None)
         raise HTTPException(status_code=403, detail='Forbidden')
 
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        # upsert hardware device and set owner_email when assigning
-        cursor.execute('''SELECT id FROM hardware_devices WHERE hardware_id = ?''', (hardware_id,))
-        row = cursor.fetchone()
-        if row:
-            cursor.execute('''UPDATE hardware_devices SET parking_spot_id = ?, owner_email = ? WHERE hardware_id = ?''', (spot_id, owner_email, hardware_id))
-        else:
-            cursor.execute('''INSERT INTO hardware_devices (hardware_id, owner_email, parking_spot_id) VALUES (?, ?, ?)''', (hardware_id, owner_email, spot_id))
-        conn.commit()
-        conn.close()
+        def _assign():
+            with sqlite_pool.connection() as conn:
+                cursor = conn.cursor()
+                # upsert hardware device and set owner_email when assigning
+                cursor.execute(hot_queries.DEVICE_ID_SQL, (hardware_id,))
+                row = cursor.fetchone()
+                if row:
+                    cursor.execute('''UPDATE hardware_devices SET parking_spot_id = ?, owner_email = ? WHERE hardware_id = ?''', (spot_id, owner_email, hardware_id))
+                else:
+                    cursor.execute('''INSERT INTO hardware_devices (hardware_id, owner_email, parking_spot_id) VALUES (?, ?, ?)''', (hardware_id, owner_email, spot_id))
+
+        await db_worker.run(_assign)
+        # Known to the liveness tracker (offline until its first heartbeat)
+        liveness_tracker.seed([(hardware_id, None)])
+        fleet.update(hardware_id, owner_email=owner_email, status=liveness_tracker.status(hardware_id))
         return {'status':'assigned','hardware_id':hardware_id,'spot_id':spot_id, 'owner_email': owner_email}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1651,7 +2695,7 @@ async def assign_device_to_spot(payload: dict, authorization: str = Header(None)
 # User endpoints (simple)
 @app.get("/verify-email/{token}", name="verify_email")
 async def verify_email(token: str, db: Session = Depends(get_db)):
-    try:
+    def _verify():
         user = auth.get_user_by_verification_token(db, token)
         if not user:
             raise HTTPException(status_code=400, detail="Invalid or expired verification token.")
@@ -1659,6 +2703,9 @@ async def verify_email(token: str, db: Session = Depends(get_db)):
         user.is_verified = True
         user.verification_token = None # Token nach Gebrauch entfernen
         db.commit()
+
+    try:
+        await db_worker.run(_verify)
         
         # Redirect to a confirmation page on the frontend
         return RedirectResponse(url="http://localhost:3000/email-verified")
@@ -0,0 +1,120 @@
+"""
+Änderungsprotokoll für parking_spots (Delta-Sync)
+Trigger schreiben jede sichtbare Änderung als Zeile in parking_spot_changes
+(seq = monoton steigender Cursor). Clients holen mit
+/parking-spots/changes?since=<cursor> nur die seither geänderten Spots.
+Alte Einträge werden nach SPOT_CHANGES_RETENTION_HOURS gelöscht; wer mit einem
+älteren Cursor kommt, bekommt reset=true und einen kompletten Snapshot. Der
+Snapshot wird per Keyset auf id gestreamt (json_stream), nie als eine Liste im
+Speicher gehalten.
+"""
+import os
+from typing import Optional
+
+SPOT_CHANGES_RETENTION_HOURS = float(os.getenv("SPOT_CHANGES_RETENTION_HOURS", "24"))
+SPOT_CHANGES_PRUNE_INTERVAL_SECONDS = int(os.getenv("SPOT_CHANGES_PRUNE_INTERVAL_SECONDS", "600"))
+SPOT_CHANGES_MAX_LIMIT = 5000
+
+_SPOT_COLUMNS = "id, name, address, latitude, longitude, status, price_per_hour"
+# Latest change per spot within the page, joined to the current row (NULL: deleted)
+CHANGES_PAGE_SQL = f'''
+    SELECT MAX(c.seq), c.spot_id, p.{_SPOT_COLUMNS.replace(", ", ", p.")}
+    FROM (
+        SELECT seq, spot_id FROM parking_spot_changes
+        WHERE seq > ? ORDER BY seq LIMIT ?
+    ) c
+    LEFT JOIN parking_spots p ON p.id = c.spot_id
+    GROUP BY c.spot_id
+'''
+SNAPSHOT_PAGE_SQL = f"SELECT {_SPOT_COLUMNS} FROM parking_spots WHERE id > ? ORDER BY id LIMIT ?"
+
+
+def spot(row) -> dict:
+    return {
+        "id": row[0],
+        "name": row[1],
+        "address": row[2],
+        "latitude": row[3],
+        "longitude": row[4],
+        "status": row[5],
+        "price_per_hour": row[6],
+    }
+
+
+def head(cursor) -> int:
+    # AUTOINCREMENT never reuses seq values, so sqlite_sequence is the newest cursor
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'parking_spot_changes'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _pruned_upto(cursor) -> int:
+    cursor.execute("SELECT version FROM data_versions WHERE name = 'parking_spot_changes_pruned'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def snapshot_page(cursor, after_id: int, size: int) -> list:
+    """Up to ``size + 1`` spot rows after ``after_id`` (keyset on the primary key)."""
+    cursor.execute(SNAPSHOT_PAGE_SQL, (after_id, size + 1))
+    return cursor.fetchall()
+
+
+def snapshot_prefix(cursor_out: int) -> bytes:
+    """Snapshot response up to its ``upserts`` array; the rows are streamed after it.
+
+    ``cursor_out`` must be read (head) before the first row: rows read afterwards
+    are at least that new, so a change may be delivered twice, never skipped.
+    """
+    return b'{"cursor":%d,"reset":true,"deletes":[],"has_more":false,"upserts":[' % cursor_out
+
+
+def changes_since(cursor, since: int, limit: int) -> Optional[dict]:
+    """Spots changed after ``since``: current rows as upserts, vanished ids as deletes.
+
+    Several changes of the same spot within the page collapse into one entry.
+    None means the cursor is unknown (other DB, pruned history): the client has
+    to start over with a snapshot.
+    """
+    head_seq = head(cursor)
+    if since > head_seq or since < _pruned_upto(cursor):
+        return None
+    if since == head_seq:
+        return {"cursor": head_seq, "reset": False, "upserts": [], "deletes": [], "has_more": False}
+
+    cursor.execute(CHANGES_PAGE_SQL, (since, limit))
+    rows = cursor.fetchall()
+    cursor_out, upserts, deletes = since, [], []
+    for row in rows:
+        cursor_out = max(cursor_out, row[0])
+        if row[2] is None:
+            deletes.append(row[1])
+        else:
+            upserts.append(spot(row[2:]))
+    upserts.sort(key=lambda s: s["id"])
+    deletes.sort()
+    return {
+        "cursor": cursor_out,
+        "reset": False,
+        "upserts": upserts,
+        "deletes": deletes,
+        "has_more": cursor_out < head_seq,
+    }
+
+
+def prune(cursor, retention_hours: float = SPOT_CHANGES_RETENTION_HOURS) -> int:
+    """Drop change rows older than the retention window; returns rows deleted."""
+    cursor.execute(
+        "SELECT MAX(seq) FROM parking_spot_changes WHERE changed_at < datetime('now', ?)",
+        (f"-{retention_hours} hours",),
+    )
+    upto = cursor.fetchone()[0]
+    if upto is None:
+        return 0
+    cursor.execute("DELETE FROM parking_spot_changes WHERE seq <= ?", (upto,))
+    deleted = cursor.rowcount
+    cursor.execute(
+        "UPDATE data_versions SET version = MAX(version, ?) WHERE name = 'parking_spot_changes_pruned'",
+        (upto,),
+    )
+    return deleted
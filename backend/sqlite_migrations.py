@@ -0,0 +1,519 @@
+"""
+Versionierte Schema-Migrationen für die SQLite-DB von server_gashis
+Die erreichte Version steht in PRAGMA user_version; jede Migration läuft genau
+einmal und in einer eigenen Transaktion. Neue Schema-Änderungen werden als
+neuer Eintrag in MIGRATIONS angehängt, bestehende nie nachträglich geändert.
+"""
+import sqlite3
+
+
+def _add_column(cursor, table: str, column_def: str):
+    # SQLite kennt kein ADD COLUMN IF NOT EXISTS
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column_def}")
+    except sqlite3.OperationalError:
+        # Column already exists
+        pass
+
+
+def _m0001_baseline(cursor):
+    """Tables as created by the old init_database() (idempotent for existing DBs)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS parking_spots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            address TEXT,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            status TEXT DEFAULT 'free',
+            price_per_hour REAL DEFAULT 0.0,
+            owner_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Ensure owner_id exists for older databases
+    _add_column(cursor, "parking_spots", "owner_id INTEGER")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # hardware_id -> owner_email and parking_spot
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS hardware_devices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hardware_id TEXT UNIQUE NOT NULL,
+            owner_email TEXT,
+            parking_spot_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Telemetry columns (nullable)
+    _add_column(cursor, "hardware_devices", "last_heartbeat TIMESTAMP")
+    _add_column(cursor, "hardware_devices", "battery_level REAL")
+    _add_column(cursor, "hardware_devices", "rssi INTEGER")
+    _add_column(cursor, "hardware_devices", "occupancy TEXT")
+    _add_column(cursor, "hardware_devices", "last_mag JSON")
+
+    # Persistent hardware commands queue
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS hardware_commands (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hardware_id TEXT NOT NULL,
+            command TEXT NOT NULL,
+            parameters TEXT,
+            status TEXT DEFAULT 'queued', -- queued | sent | done | failed (0012: | expired | dead, 0013: | superseded)
+            issued_by TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            claimed_at TIMESTAMP,
+            executed_at TIMESTAMP
+        )
+    ''')
+
+
+def _m0002_hot_query_indexes(cursor):
+    """Indexes for the per-request queries (poll, owner listings)."""
+    # Device poll: WHERE hardware_id = ? AND status = 'queued' ORDER BY created_at.
+    # Partial index only holds queued rows, so it stays tiny however long the
+    # command history gets. It carries every referenced column (status too, so
+    # SQLite can check the WHERE from the index alone) -> covering, no table hit.
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_hardware_commands_queued
+        ON hardware_commands (hardware_id, created_at, id, command, parameters, status)
+        WHERE status = 'queued'
+    ''')
+    # /owner/devices: WHERE owner_email = ?
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_hardware_devices_owner
+        ON hardware_devices (owner_email, hardware_id)
+    ''')
+    # /owner/parking-spots: WHERE owner_id = ? ORDER BY name (no temp b-tree sort)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_parking_spots_owner
+        ON parking_spots (owner_id, name)
+    ''')
+
+
+def _m0003_spots_rtree(cursor):
+    """R*Tree over spot coordinates for bbox/radius search (see backend/geo.py)."""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS parking_spots_rtree
+        USING rtree(id, min_lat, max_lat, min_lng, max_lng)
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO parking_spots_rtree (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT id, latitude, latitude, longitude, longitude FROM parking_spots
+    ''')
+    # Keep the R*Tree in sync with every write path (owner CRUD, imports, scripts)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS parking_spots_rtree_ai AFTER INSERT ON parking_spots
+        BEGIN
+            INSERT OR REPLACE INTO parking_spots_rtree (id, min_lat, max_lat, min_lng, max_lng)
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS parking_spots_rtree_au AFTER UPDATE OF latitude, longitude ON parking_spots
+        BEGIN
+            UPDATE parking_spots_rtree
+            SET min_lat = NEW.latitude, max_lat = NEW.latitude,
+                min_lng = NEW.longitude, max_lng = NEW.longitude
+            WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS parking_spots_rtree_ad AFTER DELETE ON parking_spots
+        BEGIN
+            DELETE FROM parking_spots_rtree WHERE id = OLD.id;
+        END
+    ''')
+
+
+def _m0004_data_versions(cursor):
+    """Change counter per data set, bumped by triggers (response cache invalidation)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('parking_spots', 0)")
+    bump = "UPDATE data_versions SET version = version + 1 WHERE name = 'parking_spots';"
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS parking_spots_version_ai AFTER INSERT ON parking_spots
+        BEGIN {bump} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS parking_spots_version_ad AFTER DELETE ON parking_spots
+        BEGIN {bump} END
+    ''')
+    # Only real changes of publicly visible columns count (telemetry re-sends the same status)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS parking_spots_version_au AFTER UPDATE ON parking_spots
+        WHEN OLD.name IS NOT NEW.name OR OLD.address IS NOT NEW.address
+          OR OLD.latitude IS NOT NEW.latitude OR OLD.longitude IS NOT NEW.longitude
+          OR OLD.status IS NOT NEW.status OR OLD.price_per_hour IS NOT NEW.price_per_hour
+          OR OLD.id IS NOT NEW.id
+        BEGIN {bump} END
+    ''')
+
+
+def _m0005_spot_changes(cursor):
+    """Change log for delta sync (see backend/spot_changes.py)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS parking_spot_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            spot_id INTEGER NOT NULL,
+            op TEXT NOT NULL, -- upsert | delete
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Highest seq removed by pruning; older cursors get a full snapshot
+    cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('parking_spot_changes_pruned', 0)")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS parking_spots_changes_ai AFTER INSERT ON parking_spots
+        BEGIN
+            INSERT INTO parking_spot_changes (spot_id, op) VALUES (NEW.id, 'upsert');
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS parking_spots_changes_au AFTER UPDATE ON parking_spots
+        WHEN OLD.name IS NOT NEW.name OR OLD.address IS NOT NEW.address
+          OR OLD.latitude IS NOT NEW.latitude OR OLD.longitude IS NOT NEW.longitude
+          OR OLD.status IS NOT NEW.status OR OLD.price_per_hour IS NOT NEW.price_per_hour
+        BEGIN
+            INSERT INTO parking_spot_changes (spot_id, op) VALUES (NEW.id, 'upsert');
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS parking_spots_changes_ad AFTER DELETE ON parking_spots
+        BEGIN
+            INSERT INTO parking_spot_changes (spot_id, op) VALUES (OLD.id, 'delete');
+        END
+    ''')
+
+
+def _m0006_keyset_indexes(cursor):
+    """Order index for keyset paging of the public spot list (name, id)."""
+    # rowid (= id) is the implicit last column of every index
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_parking_spots_name ON parking_spots (name)')
+
+
+def _m0007_telemetry_readings(cursor):
+    """Append-only telemetry history (see backend/telemetry_store.py)."""
+    # Clustered by (hardware_id, ts): a device's history is one contiguous range
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS telemetry_readings (
+            hardware_id TEXT NOT NULL,
+            ts REAL NOT NULL, -- epoch seconds
+            battery_level REAL,
+            rssi INTEGER,
+            occupancy INTEGER, -- 0 free | 1 occupied | 2 reserved
+            mag_x REAL,
+            mag_y REAL,
+            mag_z REAL,
+            PRIMARY KEY (hardware_id, ts)
+        ) WITHOUT ROWID
+    ''')
+    # Retention deletes oldest-first across all devices
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_telemetry_readings_ts ON telemetry_readings (ts)')
+
+
+# Bucket widths in seconds; frozen here, backend/telemetry_rollups.py mirrors them
+_ROLLUP_TIERS = (60, 3600, 86400)
+
+
+def _m0008_telemetry_rollups(cursor):
+    """Per device min/max/avg/last aggregates per minute, hour and day (see backend/telemetry_rollups.py)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS telemetry_rollups (
+            hardware_id TEXT NOT NULL,
+            tier INTEGER NOT NULL, -- bucket width in seconds
+            bucket REAL NOT NULL, -- bucket start, epoch seconds
+            n INTEGER NOT NULL,
+            battery_n INTEGER NOT NULL,
+            battery_sum REAL NOT NULL,
+            battery_min REAL,
+            battery_max REAL,
+            battery_last REAL,
+            rssi_n INTEGER NOT NULL,
+            rssi_sum REAL NOT NULL,
+            rssi_min INTEGER,
+            rssi_max INTEGER,
+            rssi_last INTEGER,
+            occupancy_n INTEGER NOT NULL,
+            occupied_n INTEGER NOT NULL,
+            occupancy_last INTEGER,
+            last_ts REAL NOT NULL,
+            PRIMARY KEY (hardware_id, tier, bucket)
+        ) WITHOUT ROWID
+    ''')
+    # Retention per tier, oldest buckets first
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_telemetry_rollups_tier_bucket ON telemetry_rollups (tier, bucket)')
+
+    _create_rollup_trigger(cursor)
+
+    # Backfill from the history recorded so far
+    for tier in _ROLLUP_TIERS:
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO telemetry_rollups
+            SELECT g.hardware_id, {tier}, g.bucket, g.n,
+                   g.battery_n, g.battery_sum, g.battery_min, g.battery_max, {_rollup_latest("battery_level", tier)},
+                   g.rssi_n, g.rssi_sum, g.rssi_min, g.rssi_max, {_rollup_latest("rssi", tier)},
+                   g.occupancy_n, g.occupied_n, {_rollup_latest("occupancy", tier)}, g.last_ts
+            FROM (
+                SELECT hardware_id, CAST(ts / {tier} AS INTEGER) * {tier} AS bucket, count(*) AS n,
+                       count(battery_level) AS battery_n, total(battery_level) AS battery_sum,
+                       min(battery_level) AS battery_min, max(battery_level) AS battery_max,
+                       count(rssi) AS rssi_n, total(rssi) AS rssi_sum, min(rssi) AS rssi_min, max(rssi) AS rssi_max,
+                       count(occupancy) AS occupancy_n, total(occupancy = 1) AS occupied_n, max(ts) AS last_ts
+                FROM telemetry_readings GROUP BY hardware_id, bucket
+            ) g
+        ''')
+
+
+def _rollup_latest(column: str, tier: int, rollup: str = "g") -> str:
+    """Newest non-NULL ``column`` of the readings in the bucket ``rollup`` (primary key range)."""
+    return f'''(
+        SELECT r.{column} FROM telemetry_readings r
+        WHERE r.hardware_id = {rollup}.hardware_id AND r.ts >= {rollup}.bucket AND r.ts < {rollup}.bucket + {tier}
+          AND r.{column} IS NOT NULL
+        ORDER BY r.ts DESC LIMIT 1
+    )'''
+
+
+def _create_rollup_trigger(cursor):
+    """(Re)create the trigger that folds every new reading into its rollup buckets.
+
+    Fires only for readings really inserted (INSERT OR IGNORE duplicates are not
+    counted twice). A metric's "last" follows the newest reading that has that
+    metric: readings without it (e.g. battery only) keep the others' last value,
+    and late offline uploads older than the bucket's newest reading do not
+    overwrite it.
+    """
+    upserts = []
+    for tier in _ROLLUP_TIERS:
+        upserts.append(f'''
+            INSERT INTO telemetry_rollups (hardware_id, tier, bucket, n,
+                battery_n, battery_sum, battery_min, battery_max, battery_last,
+                rssi_n, rssi_sum, rssi_min, rssi_max, rssi_last,
+                occupancy_n, occupied_n, occupancy_last, last_ts)
+            VALUES (NEW.hardware_id, {tier}, CAST(NEW.ts / {tier} AS INTEGER) * {tier}, 1,
+                NEW.battery_level IS NOT NULL, coalesce(NEW.battery_level, 0), NEW.battery_level, NEW.battery_level, NEW.battery_level,
+                NEW.rssi IS NOT NULL, coalesce(NEW.rssi, 0), NEW.rssi, NEW.rssi, NEW.rssi,
+                NEW.occupancy IS NOT NULL, coalesce(NEW.occupancy = 1, 0), NEW.occupancy, NEW.ts)
+            ON CONFLICT (hardware_id, tier, bucket) DO UPDATE SET
+                n = n + 1,
+                battery_n = battery_n + excluded.battery_n,
+                battery_sum = battery_sum + excluded.battery_sum,
+                battery_min = coalesce(min(battery_min, excluded.battery_min), battery_min, excluded.battery_min),
+                battery_max = coalesce(max(battery_max, excluded.battery_max), battery_max, excluded.battery_max),
+                battery_last = CASE WHEN excluded.battery_last IS NOT NULL
+                    AND (battery_last IS NULL OR excluded.last_ts >= last_ts) THEN excluded.battery_last ELSE battery_last END,
+                rssi_n = rssi_n + excluded.rssi_n,
+                rssi_sum = rssi_sum + excluded.rssi_sum,
+                rssi_min = coalesce(min(rssi_min, excluded.rssi_min), rssi_min, excluded.rssi_min),
+                rssi_max = coalesce(max(rssi_max, excluded.rssi_max), rssi_max, excluded.rssi_max),
+                rssi_last = CASE WHEN excluded.rssi_last IS NOT NULL
+                    AND (rssi_last IS NULL OR excluded.last_ts >= last_ts) THEN excluded.rssi_last ELSE rssi_last END,
+                occupancy_n = occupancy_n + excluded.occupancy_n,
+                occupied_n = occupied_n + excluded.occupied_n,
+                occupancy_last = CASE WHEN excluded.occupancy_last IS NOT NULL
+                    AND (occupancy_last IS NULL OR excluded.last_ts >= last_ts) THEN excluded.occupancy_last ELSE occupancy_last END,
+                last_ts = max(last_ts, excluded.last_ts);
+        ''')
+    cursor.execute("DROP TRIGGER IF EXISTS telemetry_readings_rollup_ai")
+    cursor.execute(f'''
+        CREATE TRIGGER telemetry_readings_rollup_ai AFTER INSERT ON telemetry_readings
+        BEGIN
+            {"".join(upserts)}
+        END
+    ''')
+
+
+def _m0009_occupancy_events(cursor):
+    """Debounced occupancy transitions per device (see backend/occupancy.py)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS occupancy_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hardware_id TEXT NOT NULL,
+            parking_spot_id INTEGER,
+            ts REAL NOT NULL, -- epoch seconds, start of the new state
+            from_state INTEGER, -- 0 free | 1 occupied | 2 reserved, NULL = first state
+            to_state INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_occupancy_events_device_ts ON occupancy_events (hardware_id, ts)')
+
+
+def _m0010_device_status(cursor):
+    """online/offline flag maintained by the liveness tracker (see backend/liveness.py)."""
+    _add_column(cursor, "hardware_devices", "status TEXT")
+
+
+def _m0011_mag_calibration(cursor):
+    """Server-side magnetometer baseline per device (see backend/mag_classifier.py)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS mag_calibration (
+            hardware_id TEXT PRIMARY KEY,
+            base_x REAL NOT NULL,
+            base_y REAL NOT NULL,
+            base_z REAL NOT NULL,
+            spread REAL NOT NULL, -- mean L1 distance of free readings to the baseline
+            samples INTEGER NOT NULL,
+            updated_at REAL NOT NULL, -- epoch seconds
+            pushed_x REAL, -- last calibrate_mag sent to the device
+            pushed_y REAL,
+            pushed_z REAL,
+            pushed_threshold REAL,
+            pushed_at REAL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _m0012_command_lifecycle(cursor):
+    """Expiry, redelivery and dead-lettering of hardware commands (see backend/command_queue.py)."""
+    _add_column(cursor, "hardware_commands", "expires_at REAL")  # epoch seconds
+    _add_column(cursor, "hardware_commands", "attempts INTEGER NOT NULL DEFAULT 0")
+    _add_column(cursor, "hardware_commands", "next_attempt_at REAL")  # sent: redeliver after this
+    # Commands from before this migration: unacked ones are not sent again, queued
+    # ones get the 5 min default lifetime from their creation (created_at is UTC)
+    cursor.execute("UPDATE hardware_commands SET status = 'expired' WHERE status = 'sent'")
+    cursor.execute('''
+        UPDATE hardware_commands SET expires_at = CAST(strftime('%s', created_at) AS REAL) + 300
+        WHERE status = 'queued' AND expires_at IS NULL
+    ''')
+    # Sweeper: both partial indexes only hold rows still in flight
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_hardware_commands_expiry
+        ON hardware_commands (expires_at) WHERE status = 'queued'
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_hardware_commands_redelivery
+        ON hardware_commands (next_attempt_at) WHERE status = 'sent'
+    ''')
+
+
+def _m0013_command_seq(cursor):
+    """Per-device command sequence numbers for batch acks (see backend/command_queue.py)."""
+    _add_column(cursor, "hardware_commands", "seq INTEGER")
+    # Number the existing history per device in id order
+    cursor.execute("SELECT id, hardware_id FROM hardware_commands ORDER BY hardware_id, id")
+    numbered, last, n = [], None, 0
+    for cmd_id, hardware_id in cursor.fetchall():
+        n = n + 1 if hardware_id == last else 1
+        last = hardware_id
+        numbered.append((n, cmd_id))
+    cursor.executemany("UPDATE hardware_commands SET seq = ? WHERE id = ?", numbered)
+    # enqueue: max(seq) per device; unique so a racing insert fails instead of reusing a number
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_hardware_commands_seq
+        ON hardware_commands (hardware_id, seq)
+    ''')
+    # Batch ack: only rows in flight, stays small however long the history gets
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_hardware_commands_inflight
+        ON hardware_commands (hardware_id, seq) WHERE status IN ('queued', 'sent')
+    ''')
+
+
+def _m0014_command_jobs(cursor):
+    """Fan-out: one command to many devices as a job (see backend/command_queue.py)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS command_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            command TEXT NOT NULL,
+            parameters TEXT,
+            target TEXT, -- JSON: how the devices were selected
+            devices INTEGER NOT NULL,
+            issued_by TEXT,
+            created_at REAL NOT NULL -- epoch seconds
+        )
+    ''')
+    _add_column(cursor, "hardware_commands", "job_id INTEGER")
+    # Job status; single commands (job_id NULL) stay out of the index
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_hardware_commands_job
+        ON hardware_commands (job_id, hardware_id) WHERE job_id IS NOT NULL
+    ''')
+    # Fan-out to the devices on a set of spots
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_hardware_devices_spot
+        ON hardware_devices (parking_spot_id, hardware_id)
+    ''')
+
+
+def _m0015_rollup_last_per_metric(cursor):
+    """Rollup "last" values no longer cleared by readings that lack the metric."""
+    _create_rollup_trigger(cursor)
+    # Repair buckets whose last values were overwritten with NULL (readings past
+    # retention are gone; those buckets keep what they have)
+    for tier in _ROLLUP_TIERS:
+        cursor.execute(f'''
+            UPDATE telemetry_rollups SET
+                battery_last = coalesce({_rollup_latest("battery_level", tier, "telemetry_rollups")}, battery_last),
+                rssi_last = coalesce({_rollup_latest("rssi", tier, "telemetry_rollups")}, rssi_last),
+                occupancy_last = coalesce({_rollup_latest("occupancy", tier, "telemetry_rollups")}, occupancy_last)
+            WHERE tier = {tier}
+              AND ((battery_last IS NULL AND battery_n > 0) OR (rssi_last IS NULL AND rssi_n > 0)
+                   OR (occupancy_last IS NULL AND occupancy_n > 0))
+        ''')
+
+
+# (version, name, function) - strictly increasing versions, append only
+MIGRATIONS = [
+    (1, "baseline", _m0001_baseline),
+    (2, "hot query indexes", _m0002_hot_query_indexes),
+    (3, "parking spots rtree", _m0003_spots_rtree),
+    (4, "data versions", _m0004_data_versions),
+    (5, "parking spot changes", _m0005_spot_changes),
+    (6, "keyset indexes", _m0006_keyset_indexes),
+    (7, "telemetry readings", _m0007_telemetry_readings),
+    (8, "telemetry rollups", _m0008_telemetry_rollups),
+    (9, "occupancy events", _m0009_occupancy_events),
+    (10, "device status", _m0010_device_status),
+    (11, "mag calibration", _m0011_mag_calibration),
+    (12, "command lifecycle", _m0012_command_lifecycle),
+    (13, "command seq", _m0013_command_seq),
+    (14, "command jobs", _m0014_command_jobs),
+    (15, "rollup last per metric", _m0015_rollup_last_per_metric),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply all pending migrations and return the resulting schema version."""
+    version = current_version(conn)
+    if version > LATEST_VERSION:
+        print(f"⚠️ [MIGRATIONS] DB schema v{version} is newer than this code (v{LATEST_VERSION})")
+        return version
+    # Pending implicit transaction would swallow our BEGIN
+    if conn.in_transaction:
+        conn.commit()
+    for number, name, fn in MIGRATIONS:
+        if number <= version:
+            continue
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            fn(cursor)
+            # PRAGMA kann nicht parametrisiert werden; number ist ein int aus MIGRATIONS
+            cursor.execute(f"PRAGMA user_version = {int(number)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = number
+        print(f"[MIGRATIONS] applied {number:04d} {name}")
+    return version
+
@@ -0,0 +1,179 @@
+"""
+Write-behind Puffer für Geräte-Telemetrie
+Telemetrie wird im Speicher angenommen und sofort bestätigt; ein Hintergrund-
+Task schreibt alle TELEMETRY_FLUSH_INTERVAL_MS (oder sobald
+TELEMETRY_FLUSH_MAX_RECORDS Messungen anstehen) alles in einer Transaktion.
+Pro Gerät wird der letzte Stand zusammengefasst (eine Zeile pro Flush), die
+Historie und Ereignisse (Belegungswechsel) bleiben vollständig. Haltbarkeit: bei einem Absturz gehen höchstens
+die Messungen eines Flush-Intervalls verloren; TELEMETRY_FLUSH_INTERVAL_MS=0
+schreibt synchron (write-through).
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+TELEMETRY_FLUSH_INTERVAL_MS = int(os.getenv("TELEMETRY_FLUSH_INTERVAL_MS", "250"))
+TELEMETRY_FLUSH_MAX_RECORDS = int(os.getenv("TELEMETRY_FLUSH_MAX_RECORDS", "500"))
+TELEMETRY_BUFFER_MAX_PENDING = int(os.getenv("TELEMETRY_BUFFER_MAX_PENDING", "20000"))
+
+# flush_fn(latest_by_device, history_rows, events) -> awaitable
+FlushFn = Callable[[Dict[str, dict], List[tuple], list], Awaitable[None]]
+
+
+class TelemetryBuffer:
+    """Coalescing in-memory buffer in front of the telemetry tables.
+
+    Only touched from the event loop, so no thread locks are needed; the
+    flush itself runs wherever ``flush_fn`` puts it (the DB executor).
+    """
+
+    def __init__(self, flush_fn: FlushFn,
+                 flush_interval_ms: int = TELEMETRY_FLUSH_INTERVAL_MS,
+                 max_records: int = TELEMETRY_FLUSH_MAX_RECORDS,
+                 max_pending: int = TELEMETRY_BUFFER_MAX_PENDING):
+        self._flush_fn = flush_fn
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_records = max_records
+        self.max_pending = max(max_pending, max_records)
+        self._latest: Dict[str, dict] = {}
+        self._history: List[tuple] = []
+        self._events: list = []
+        self._oldest_at: Optional[float] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepted = 0
+        self._coalesced = 0
+        self._flushes = 0
+        self._flushed_records = 0
+        self._flush_errors = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._backpressure_waits = 0
+
+    @property
+    def write_through(self) -> bool:
+        return self.flush_interval <= 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._history)
+
+    def _loop_primitives(self):
+        # asyncio primitives are bound to the loop that runs the app
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+            self._wake = asyncio.Event()
+
+    async def submit(self, hardware_id: str, latest: dict, history_rows: List[tuple], events: Sequence = ()):
+        """Accept telemetry for one device: ``latest`` replaces its pending state,
+        ``history_rows`` and ``events`` are appended. Returns once buffered (or
+        written, in write-through mode)."""
+        self._loop_primitives()
+        if self.write_through:
+            async with self._flush_lock:
+                await self._flush_fn({hardware_id: latest}, list(history_rows), list(events))
+            self._accepted += len(history_rows) or 1
+            return
+        if self.pending >= self.max_pending:
+            # Backpressure: the producer waits for the flush instead of growing memory
+            self._backpressure_waits += 1
+            await self.flush()
+        if hardware_id in self._latest:
+            self._coalesced += 1
+        self._latest[hardware_id] = latest
+        self._history.extend(history_rows)
+        self._events.extend(events)
+        self._accepted += len(history_rows) or 1
+        if self._oldest_at is None:
+            self._oldest_at = time.monotonic()
+        if self.pending >= self.max_records:
+            self._wake.set()
+
+    def pending_for(self, hardware_id: str) -> Optional[dict]:
+        """Latest not-yet-flushed state of a device (read overlay)."""
+        return self._latest.get(hardware_id)
+
+    def pending_items(self) -> List[tuple]:
+        """``(hardware_id, latest state)`` of every device with unflushed telemetry."""
+        return list(self._latest.items())
+
+    async def flush(self):
+        """Write everything buffered so far in one transaction."""
+        self._loop_primitives()
+        async with self._flush_lock:
+            if not self._latest and not self._history:
+                return
+            latest, history, events = self._latest, self._history, self._events
+            self._latest, self._history, self._events, self._oldest_at = {}, [], [], None
+            t0 = time.perf_counter()
+            try:
+                await self._flush_fn(latest, history, events)
+            except BaseException:
+                # Put it back in front of anything that arrived meanwhile; newer state wins
+                self._flush_errors += 1
+                for hw, state in latest.items():
+                    self._latest.setdefault(hw, state)
+                self._history[:0] = history
+                self._events[:0] = events
+                if self._oldest_at is None:
+                    self._oldest_at = time.monotonic()
+                raise
+            ms = (time.perf_counter() - t0) * 1000.0
+            self._flushes += 1
+            self._flushed_records += len(history)
+            self._last_flush_ms = ms
+            self._max_flush_ms = max(self._max_flush_ms, ms)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[TELEMETRY-BUFFER] flush failed, {self.pending} readings kept for retry: {e}")
+
+    def start(self):
+        self._loop_primitives()
+        if not self.write_through and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write out what is still buffered (shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"[TELEMETRY-BUFFER] final flush failed, {self.pending} readings lost: {e}")
+        # Fresh primitives for the next event loop (e.g. tests, reload)
+        self._flush_lock = None
+        self._wake = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": "write-through" if self.write_through else "write-behind",
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "max_records": self.max_records,
+            "max_pending": self.max_pending,
+            "pending_readings": self.pending,
+            "pending_devices": len(self._latest),
+            "oldest_pending_ms": int((time.monotonic() - self._oldest_at) * 1000) if self._oldest_at else 0,
+            "accepted": self._accepted,
+            "coalesced": self._coalesced,
+            "flushes": self._flushes,
+            "flushed_records": self._flushed_records,
+            "flush_errors": self._flush_errors,
+            "last_flush_ms": round(self._last_flush_ms, 2),
+            "max_flush_ms": round(self._max_flush_ms, 2),
+            "backpressure_waits": self._backpressure_waits,
+        }
@@ -0,0 +1,96 @@
+"""
+Kompaktes Binärformat für Geräte-Telemetrie
+Alternative zu JSON für Modems mit Datenvolumen-SIM: 1 Byte Version, danach
+N Messungen à 15 Byte (little-endian, struct "<IHbBB3h"):
+
+  ts          u32  Unix-Zeit in Sekunden (0 = Serverzeit verwenden)
+  battery_mv  u16  Batteriespannung in mV (0xFFFF = fehlt)
+  rssi        i8   Signalqualität (-128 = fehlt)
+  occupancy   u8   0 free, 1 occupied, 2 reserved (0xFF = fehlt)
+  flags       u8   Bit 0: Magnetometer-Werte vorhanden
+  mag_x/y/z   i16  Rohwerte MMC5603
+
+Content-Type: application/vnd.parking.telemetry (oder application/octet-stream).
+Decodiert wird ohne Kopie über memoryview/iter_unpack; das Ergebnis hat
+dieselben Attribute wie HardwareTelemetry und läuft durch denselben
+Ingest-Pfad wie JSON.
+"""
+import struct
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional
+
+CONTENT_TYPE = "application/vnd.parking.telemetry"
+CONTENT_TYPES = (CONTENT_TYPE, "application/octet-stream")
+VERSION = 1
+
+RECORD = struct.Struct("<IHbBB3h")
+FLAG_MAG = 0x01
+
+_NO_BATTERY = 0xFFFF
+_NO_RSSI = -128
+_NO_OCCUPANCY = 0xFF
+_OCCUPANCY = ("free", "occupied", "reserved")
+
+
+class Reading(NamedTuple):
+    """Decoded reading; attribute-compatible with HardwareTelemetry but without
+    pydantic's per-object cost (struct already fixed the types)."""
+    battery_level: Optional[float]
+    rssi: Optional[int]
+    occupancy: Optional[str]
+    last_mag: Optional[dict]
+    timestamp: Optional[datetime]
+
+
+def is_binary(content_type: Optional[str]) -> bool:
+    """True if the request body uses this format (parameters like charset are ignored)."""
+    if not content_type:
+        return False
+    return content_type.split(";", 1)[0].strip().lower() in CONTENT_TYPES
+
+
+def decode(body: bytes, require_timestamp: bool = False) -> List[Reading]:
+    """Body -> list of readings. Raises ValueError on a malformed body."""
+    view = memoryview(body)
+    if len(view) < 1 or view[0] != VERSION:
+        raise ValueError(f"unsupported telemetry encoding version (expected {VERSION})")
+    records = view[1:]
+    if len(records) == 0 or len(records) % RECORD.size:
+        raise ValueError(f"body must hold whole {RECORD.size}-byte readings")
+    out = []
+    for i, (ts, battery_mv, rssi, occupancy, flags, mx, my, mz) in enumerate(RECORD.iter_unpack(records)):
+        if occupancy != _NO_OCCUPANCY and occupancy >= len(_OCCUPANCY):
+            raise ValueError(f"reading {i}: invalid occupancy code {occupancy}")
+        if require_timestamp and ts == 0:
+            raise ValueError(f"reading {i}: timestamp required")
+        out.append(Reading(
+            battery_mv / 1000.0 if battery_mv != _NO_BATTERY else None,
+            rssi if rssi != _NO_RSSI else None,
+            _OCCUPANCY[occupancy] if occupancy != _NO_OCCUPANCY else None,
+            {"x": mx, "y": my, "z": mz} if flags & FLAG_MAG else None,
+            # naive local time, like the server-side default timestamps
+            datetime.fromtimestamp(ts) if ts else None,
+        ))
+    return out
+
+
+def encode(readings: Iterable[dict]) -> bytes:
+    """Field dicts -> body; inverse of decode (load generators, benchmarks, firmware reference)."""
+    buf = bytearray([VERSION])
+    for r in readings:
+        ts = r.get("timestamp")
+        if isinstance(ts, datetime):
+            ts = ts.timestamp()
+        battery = r.get("battery_level")
+        rssi = r.get("rssi")
+        occupancy = r.get("occupancy")
+        mag = r.get("last_mag")
+        buf += RECORD.pack(
+            int(ts) if ts else 0,
+            int(round(battery * 1000)) if battery is not None else _NO_BATTERY,
+            int(rssi) if rssi is not None else _NO_RSSI,
+            _OCCUPANCY.index(occupancy) if occupancy is not None else _NO_OCCUPANCY,
+            FLAG_MAG if mag else 0,
+            *((int(mag.get("x", 0)), int(mag.get("y", 0)), int(mag.get("z", 0))) if mag else (0, 0, 0)),
+        )
+    return bytes(buf)
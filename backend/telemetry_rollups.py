@@ -0,0 +1,120 @@
+"""
+Telemetrie-Rollups (Minute / Stunde / Tag) für Dashboards
+telemetry_rollups wird per Trigger bei jeder neuen Messung in telemetry_readings
+nachgeführt (Migration 0008): min/max/avg/last für battery_level und rssi sowie
+der Anteil "occupied" pro Gerät und Bucket. Rohdaten laufen nach
+TELEMETRY_RETENTION_DAYS ab, die Aggregate bleiben pro Stufe länger erhalten.
+Abfragen wählen automatisch die gröbste Stufe, die Zeitraum und Auflösung erfüllt.
+"""
+import os
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from backend.telemetry_store import OCCUPANCY_NAMES
+
+# (Name, Bucketbreite in Sekunden, Aufbewahrung in Tagen) - feinste Stufe zuerst;
+# Breiten müssen zu _ROLLUP_TIERS in sqlite_migrations passen
+TIERS: List[Tuple[str, int, float]] = [
+    ("1m", 60, float(os.getenv("TELEMETRY_ROLLUP_1M_RETENTION_DAYS", "180"))),
+    ("1h", 3600, float(os.getenv("TELEMETRY_ROLLUP_1H_RETENTION_DAYS", "730"))),
+    ("1d", 86400, float(os.getenv("TELEMETRY_ROLLUP_1D_RETENTION_DAYS", "3650"))),
+]
+TIER_NAMES = {name: seconds for name, seconds, _ in TIERS}
+
+# Upper bound of buckets per response; longer ranges fall back to a coarser tier
+ROLLUP_MAX_BUCKETS = int(os.getenv("ROLLUP_MAX_BUCKETS", "5000"))
+ROLLUP_DEFAULT_POINTS = 200
+
+
+def pick_tier(since: float, until: float, step: Optional[float] = None, now: Optional[float] = None) -> Tuple[str, int]:
+    """Coarsest tier whose buckets are still <= ``step`` seconds.
+
+    Tiers whose retention no longer covers ``since`` are skipped, and so are
+    tiers that would exceed ROLLUP_MAX_BUCKETS; the day tier is the last resort.
+    """
+    now = time.time() if now is None else now
+    if step is None:
+        step = max(until - since, 1.0) / ROLLUP_DEFAULT_POINTS
+    best = None
+    for name, seconds, retention_days in TIERS:
+        covers_range = since >= now - retention_days * 86400.0
+        fits = (until - since) / seconds <= ROLLUP_MAX_BUCKETS
+        if not (covers_range and fits):
+            continue
+        # finest usable tier as fallback, then coarser ones while they still meet step
+        if best is None or seconds <= step:
+            best = (name, seconds)
+    if best is None:
+        name, seconds, _ = TIERS[-1]
+        best = (name, seconds)
+    return best
+
+
+ROLLUPS_SQL = '''
+    SELECT bucket, n, battery_n, battery_sum, battery_min, battery_max, battery_last,
+           rssi_n, rssi_sum, rssi_min, rssi_max, rssi_last, occupancy_n, occupied_n, occupancy_last
+    FROM telemetry_rollups
+    WHERE hardware_id = ? AND tier = ? AND bucket >= ? AND bucket < ?
+    ORDER BY bucket
+'''
+
+
+def rollups(cursor, hardware_id: str, tier_seconds: int, since: float, until: float) -> List[dict]:
+    """Buckets of one device and tier overlapping [since, until), oldest first."""
+    start = int(since // tier_seconds) * tier_seconds
+    cursor.execute(ROLLUPS_SQL, (hardware_id, tier_seconds, start, until))
+    return [{
+        "ts": datetime.fromtimestamp(r[0], tz=timezone.utc).isoformat(),
+        "n": r[1],
+        "battery_level": {"min": r[4], "max": r[5], "avg": r[3] / r[2], "last": r[6]} if r[2] else None,
+        "rssi": {"min": r[9], "max": r[10], "avg": r[8] / r[7], "last": r[11]} if r[7] else None,
+        "occupancy_ratio": r[13] / r[12] if r[12] else None,
+        "occupancy_last": OCCUPANCY_NAMES.get(r[14]),
+    } for r in cursor.fetchall()]
+
+
+# Series metric -> (avg, min, max) expressions over telemetry_rollups
+_SERIES_COLUMNS = {
+    "battery_level": ("CASE WHEN battery_n > 0 THEN battery_sum / battery_n END", "battery_min", "battery_max"),
+    "rssi": ("CASE WHEN rssi_n > 0 THEN rssi_sum / rssi_n END", "rssi_min", "rssi_max"),
+    "occupied": ("CASE WHEN occupancy_n > 0 THEN occupied_n * 1.0 / occupancy_n END",) * 3,
+}
+
+
+def series_sql(metric: str, extremes: bool = False) -> str:
+    avg, lo, hi = _SERIES_COLUMNS[metric]
+    select = f"bucket, {lo}, bucket + ? / 2.0, {hi}" if extremes else f"bucket, {avg}"
+    return f'''
+        SELECT {select} FROM telemetry_rollups
+        WHERE hardware_id = ? AND tier = ? AND bucket >= ? AND bucket < ?
+        ORDER BY bucket
+    '''
+
+
+def series_rows(cursor, hardware_id: str, tier_seconds: int, since: float, until: float,
+                metric: str, extremes: bool = False) -> list:
+    """``(bucket, avg)`` rows of one metric, or with ``extremes`` two rows per bucket
+    (min at the bucket start, max at its middle) so min/max downsampling keeps the peaks."""
+    start = int(since // tier_seconds) * tier_seconds
+    if extremes:
+        cursor.execute(series_sql(metric, True), (tier_seconds, hardware_id, tier_seconds, start, until))
+        return [pair for r in cursor.fetchall() for pair in ((r[0], r[1]), (r[2], r[3]))]
+    cursor.execute(series_sql(metric), (hardware_id, tier_seconds, start, until))
+    return cursor.fetchall()
+
+
+PURGE_SQL = '''
+    DELETE FROM telemetry_rollups
+    WHERE (hardware_id, tier, bucket) IN (
+        SELECT hardware_id, tier, bucket FROM telemetry_rollups
+        WHERE tier = ? AND bucket < ? ORDER BY bucket LIMIT ?
+    )
+'''
+
+
+def purge_batch(cursor, tier_seconds: int, retention_days: float, batch: int) -> int:
+    """Delete up to ``batch`` buckets of one tier older than its retention."""
+    cutoff = time.time() - retention_days * 86400.0
+    cursor.execute(PURGE_SQL, (tier_seconds, cutoff, batch))
+    return cursor.rowcount
@@ -0,0 +1,132 @@
+"""
+Append-only Telemetrie-Historie (SQLite) für server_gashis
+Jede Messung wird als kompakte, typisierte Zeile in telemetry_readings
+abgelegt (WITHOUT ROWID, Primärschlüssel (hardware_id, ts) = geclustert nach
+Gerät und Zeit). hardware_devices behält nur den letzten Stand für Listen.
+Alte Messungen werden nach TELEMETRY_RETENTION_DAYS in kleinen Portionen
+gelöscht, damit die Ingestion nie lange blockiert wird.
+"""
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+TELEMETRY_RETENTION_DAYS = float(os.getenv("TELEMETRY_RETENTION_DAYS", "90"))
+TELEMETRY_PURGE_INTERVAL_SECONDS = int(os.getenv("TELEMETRY_PURGE_INTERVAL_SECONDS", "3600"))
+TELEMETRY_PURGE_BATCH = int(os.getenv("TELEMETRY_PURGE_BATCH", "5000"))
+# Upper bound per batch upload (/hardware/.../telemetry/batch)
+TELEMETRY_BATCH_MAX_READINGS = int(os.getenv("TELEMETRY_BATCH_MAX_READINGS", "2000"))
+
+# occupancy wird als kleine Zahl gespeichert statt als Text
+OCCUPANCY_CODES = {"free": 0, "occupied": 1, "reserved": 2}
+OCCUPANCY_NAMES = {v: k for k, v in OCCUPANCY_CODES.items()}
+
+Row = Tuple[str, float, Optional[float], Optional[int], Optional[int], Optional[float], Optional[float], Optional[float]]
+
+
+def to_epoch(ts: Optional[datetime]) -> float:
+    """Device timestamp -> epoch seconds (naive datetimes are taken as server local time)."""
+    if ts is None:
+        return time.time()
+    return ts.timestamp()
+
+
+def _mag_axes(last_mag) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    if isinstance(last_mag, str):
+        try:
+            last_mag = json.loads(last_mag)
+        except Exception:
+            return None, None, None
+    if isinstance(last_mag, dict):
+        axes = []
+        for k in ("x", "y", "z"):
+            v = last_mag.get(k)
+            axes.append(float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else None)
+        return axes[0], axes[1], axes[2]
+    return None, None, None
+
+
+def reading_row(hardware_id: str, ts: float, battery_level=None, rssi=None, occupancy=None, last_mag=None) -> Row:
+    """Build one telemetry_readings row from the API payload fields."""
+    mx, my, mz = _mag_axes(last_mag)
+    return (
+        hardware_id,
+        float(ts),
+        float(battery_level) if battery_level is not None else None,
+        int(rssi) if rssi is not None else None,
+        OCCUPANCY_CODES.get(occupancy),
+        mx, my, mz,
+    )
+
+
+def insert_readings(cursor, rows: Iterable[Row]) -> int:
+    """Batched append. A repeated (hardware_id, ts) is ignored, so re-sent
+    readings (modem retries, offline uploads) are idempotent. Returns rows added."""
+    before = cursor.connection.total_changes
+    cursor.executemany('''
+        INSERT OR IGNORE INTO telemetry_readings
+            (hardware_id, ts, battery_level, rssi, occupancy, mag_x, mag_y, mag_z)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    return cursor.connection.total_changes - before
+
+
+def readings(cursor, hardware_id: str, since: float, until: float, limit: Optional[int] = None) -> List[dict]:
+    """Raw readings of one device in [since, until), oldest first."""
+    sql = '''
+        SELECT ts, battery_level, rssi, occupancy, mag_x, mag_y, mag_z
+        FROM telemetry_readings
+        WHERE hardware_id = ? AND ts >= ? AND ts < ?
+        ORDER BY ts
+    '''
+    params = [hardware_id, since, until]
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    cursor.execute(sql, params)
+    return [{
+        "ts": datetime.fromtimestamp(r[0], tz=timezone.utc).isoformat(),
+        "battery_level": r[1],
+        "rssi": r[2],
+        "occupancy": OCCUPANCY_NAMES.get(r[3]),
+        "last_mag": {"x": r[4], "y": r[5], "z": r[6]} if r[4] is not None else None,
+    } for r in cursor.fetchall()]
+
+
+# Chartable metrics -> SQL expression over telemetry_readings ("occupied" is 1/0)
+SERIES_METRICS = {
+    "battery_level": "battery_level",
+    "rssi": "rssi",
+    "occupied": "occupancy = 1",
+}
+
+
+def series_sql(metrics: List[str]) -> str:
+    columns = ", ".join(SERIES_METRICS[m] for m in metrics)
+    return f'''
+        SELECT ts, {columns} FROM telemetry_readings
+        WHERE hardware_id = ? AND ts >= ? AND ts < ?
+        ORDER BY ts
+    '''
+
+
+def series_rows(cursor, hardware_id: str, since: float, until: float, metrics: List[str]) -> list:
+    """Raw ``(ts, metric...)`` rows in [since, until) for downsampling, oldest first."""
+    cursor.execute(series_sql(metrics), (hardware_id, since, until))
+    return cursor.fetchall()
+
+
+PURGE_SQL = '''
+    DELETE FROM telemetry_readings
+    WHERE (hardware_id, ts) IN (
+        SELECT hardware_id, ts FROM telemetry_readings WHERE ts < ? ORDER BY ts LIMIT ?
+    )
+'''
+
+
+def purge_batch(cursor, retention_days: float = TELEMETRY_RETENTION_DAYS, batch: int = TELEMETRY_PURGE_BATCH) -> int:
+    """Delete up to ``batch`` readings older than the retention window (uses idx_telemetry_readings_ts)."""
+    cutoff = time.time() - retention_days * 86400.0
+    cursor.execute(PURGE_SQL, (cutoff, batch))
+    return cursor.rowcount
@@ -48,7 +48,7 @@ unsigned long lastCommandPoll = 0;
 int16_t mag_baseline_x = 0;
 int16_t mag_baseline_y = 0;
 int16_t mag_baseline_z = 0;
-const int MAG_THRESHOLD = 500;
+int magThreshold = 500;  // per Command calibrate_mag vom Server nachgeführt
 
 // ========== MMC5603 FUNCTIONS ==========
 void initMMC5603() {
@@ -107,7 +107,7 @@ void updateOccupancy() {
   
   int diff = abs(x - mag_baseline_x) + abs(y - mag_baseline_y) + abs(z - mag_baseline_z);
   bool wasOccupied = isOccupied;
-  isOccupied = (diff > MAG_THRESHOLD);
+  isOccupied = (diff > magThreshold);
   
   if (isOccupied != wasOccupied) {
     Serial.printf("🚗 Belegung: %s (Diff: %d)\n", isOccupied ? "BELEGT" : "FREI", diff);
@@ -253,6 +253,8 @@ bool httpRequest(String method, String endpoint, String payload = "", String *ou
   return false;
 }
 
+void handleCommands(String &body);
+
 void sendTelemetry() {
   DynamicJsonDocument doc(512);
   doc["battery_level"] = 3.7;
@@ -270,14 +272,43 @@ void sendTelemetry() {
   serializeJson(doc, payload);
   
   Serial.println("📤 Sende Telemetrie...");
-  httpRequest("POST", "/hardware/" + String(DEVICE_ID) + "/telemetry", payload);
+  // ?commands=1: die Antwort enthält gleich die wartenden Commands, spart den Poll
+  String body;
+  if (httpRequest("POST", "/hardware/" + String(DEVICE_ID) + "/telemetry?commands=1", payload, &body)) {
+    lastCommandPoll = millis();
+    handleCommands(body);
+  }
+}
+
+// Ganzzahl nach "key": innerhalb src[from, to), sonst fallback
+long jsonLongField(String &src, const char *key, int from, int to, long fallback) {
+  int k = src.indexOf(String("\"") + key + String("\""), from);
+  if (k < 0 || k >= to) return fallback;
+  int colon = src.indexOf(':', k);
+  if (colon < 0 || colon >= to) return fallback;
+  return src.substring(colon + 1, min(colon + 12, to)).toInt();
+}
+
+// {"baseline": {"x":..,"y":..,"z":..}, "threshold":..} aus der serverseitigen Kalibrierung
+void applyMagCalibration(String &json, int from, int to) {
+  int b = json.indexOf("\"baseline\"", from);
+  if (b >= 0 && b < to) {
+    mag_baseline_x = jsonLongField(json, "x", b, to, mag_baseline_x);
+    mag_baseline_y = jsonLongField(json, "y", b, to, mag_baseline_y);
+    mag_baseline_z = jsonLongField(json, "z", b, to, mag_baseline_z);
+  }
+  magThreshold = jsonLongField(json, "threshold", from, to, magThreshold);
+  Serial.printf("🧲 Kalibrierung: Baseline X=%d, Y=%d, Z=%d, Schwelle %d\n",
+                mag_baseline_x, mag_baseline_y, mag_baseline_z, magThreshold);
 }
 
-void processCommand(const String &cmd) {
+void processCommand(const String &cmd, String &json, int paramsFrom, int paramsTo) {
   if (cmd == "raise_barrier") {
     raiseBarrier();
   } else if (cmd == "lower_barrier") {
     lowerBarrier();
+  } else if (cmd == "calibrate_mag") {
+    applyMagCalibration(json, paramsFrom, paramsTo);
   } else {
     Serial.println("ℹ️  Unbekannter Command: " + cmd);
   }
@@ -310,14 +341,8 @@ bool findNextCommand(String &src, int &pos, int &idOut, String &cmdOut) {
   return true;
 }
 
-void pollCommands() {
-  Serial.println("📥 Hole Commands...");
-  String body;
-  if (!httpRequest("GET", "/hardware/" + String(DEVICE_ID) + "/commands", "", &body)) {
-    Serial.println("❌ Commands holen fehlgeschlagen");
-    return;
-  }
-
+// Antwort von GET /commands oder POST /telemetry?commands=1: Commands ausführen und acken
+void handleCommands(String &body) {
   // Body enthält AT+HTTPREAD Ausgabe inkl. OK, filtere JSON grob heraus
   int lb = body.indexOf('{');
   int rb = body.lastIndexOf('}');
@@ -333,19 +358,35 @@ void pollCommands() {
     return;
   }
   int pos = arrStart;
+  String ackIds;
   while (true) {
     int idVal = 0; String cmd;
     if (!findNextCommand(json, pos, idVal, cmd)) break;
     Serial.printf("➡️  Command id=%d cmd=%s\n", idVal, cmd.c_str());
-    processCommand(cmd);
-    // Ack senden
-    String ackPath = "/hardware/" + String(DEVICE_ID) + "/commands/" + String(idVal) + "/ack";
-    if (httpRequest("POST", ackPath, "{}")) {
-      Serial.printf("✅ Ack gesendet für id=%d\n", idVal);
-    } else {
-      Serial.printf("⚠️  Ack fehlgeschlagen für id=%d\n", idVal);
-    }
+    // Parameter stehen zwischen dem Command und dem nächsten "id"
+    int paramsTo = json.indexOf("\"id\"", pos);
+    processCommand(cmd, json, pos, paramsTo < 0 ? json.length() : paramsTo);
+    if (ackIds.length() > 0) ackIds += ",";
+    ackIds += String(idVal);
+  }
+  if (ackIds.length() == 0) return;
+  // Ein Ack-Request für alle ausgeführten Commands
+  String ackPath = "/hardware/" + String(DEVICE_ID) + "/commands/ack";
+  if (httpRequest("POST", ackPath, "{\"ids\":[" + ackIds + "]}")) {
+    Serial.println("✅ Ack gesendet für id=" + ackIds);
+  } else {
+    Serial.println("⚠️  Ack fehlgeschlagen für id=" + ackIds);
+  }
+}
+
+void pollCommands() {
+  Serial.println("📥 Hole Commands...");
+  String body;
+  if (!httpRequest("GET", "/hardware/" + String(DEVICE_ID) + "/commands", "", &body)) {
+    Serial.println("❌ Commands holen fehlgeschlagen");
+    return;
   }
+  handleCommands(body);
 }
 
 // ========== SETUP ==========
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Fleet load generator: N simulated devices against server_gashis
+
+Every device behaves like parking_tinygsm.ino: telemetry every HEARTBEAT_INTERVAL,
+command poll every COMMAND_POLL_INTERVAL (both read from the sketch), one batch
+ack for the commands received. Telemetry asks for pending commands (?commands=1) and moves the
+next poll back by one interval, as the firmware does; --separate-polls turns that
+off to compare against the old two-requests-per-cycle pattern. Devices start at random phases so the load is spread evenly.
+Requests run either in-process (ASGI transport, no network, startup/shutdown
+tasks included) or over HTTP against a running server.
+
+The report (JSON on stdout, optionally --output) has per endpoint: requests,
+throughput, p50/p95/p99/max latency in ms, error rate and status codes, plus
+how late the generator itself started requests (if that grows, the client is
+the bottleneck, not the server).
+
+Usage:
+  python3 scripts/fleet_load.py --devices 2000 --duration 60
+  python3 scripts/fleet_load.py --base http://127.0.0.1:8000 --devices 5000 --speedup 10
+  python3 scripts/fleet_load.py --binary --output /tmp/load.json
+
+In-process mode writes to backend/parking.db; run it on a copy.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+SKETCH = os.path.join(ROOT, "hardware", "parking_tinygsm", "parking_tinygsm.ino")
+
+
+def firmware_intervals(path=SKETCH):
+    """HEARTBEAT_INTERVAL / COMMAND_POLL_INTERVAL of the sketch, in seconds."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    found = dict(re.findall(r"const\s+unsigned\s+long\s+(HEARTBEAT_INTERVAL|COMMAND_POLL_INTERVAL)\s*=\s*(\d+)", source))
+    if len(found) != 2:
+        sys.exit(f"HEARTBEAT_INTERVAL/COMMAND_POLL_INTERVAL not found in {path}")
+    return int(found["HEARTBEAT_INTERVAL"]) / 1000.0, int(found["COMMAND_POLL_INTERVAL"]) / 1000.0
+
+
+class Stats:
+    def __init__(self):
+        self.latency = defaultdict(list)  # endpoint -> [seconds]
+        self.status = defaultdict(Counter)  # endpoint -> {status code or exception name: count}
+        self.errors = Counter()
+        self.lag = []  # seconds between scheduled and actual start
+
+    def record(self, endpoint, started, status, ok):
+        self.latency[endpoint].append(time.perf_counter() - started)
+        self.status[endpoint][str(status)] += 1
+        if not ok:
+            self.errors[endpoint] += 1
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    i = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[i]
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class Device:
+    def __init__(self, hardware_id, rnd):
+        self.hardware_id = hardware_id
+        self.rnd = rnd
+        self.occupied = rnd.random() < 0.3
+        self.rest = (rnd.randint(-2000, 2000), rnd.randint(-2000, 2000), rnd.randint(-2000, 2000))
+        self.battery = round(rnd.uniform(3.5, 4.1), 2)
+
+    def reading(self):
+        # Roughly one arrival/departure per hour at a 30 s heartbeat
+        if self.rnd.random() < 0.008:
+            self.occupied = not self.occupied
+        offset = 800 if self.occupied else 0
+        x, y, z = self.rest
+        return {
+            "battery_level": self.battery,
+            "rssi": self.rnd.randint(8, 31),  # CSQ
+            "occupancy": "occupied" if self.occupied else "free",
+            "last_mag": {"x": x + offset + self.rnd.randint(-5, 5), "y": y + self.rnd.randint(-5, 5), "z": z + self.rnd.randint(-5, 5)},
+        }
+
+
+async def request(client, stats, endpoint, method, url, **kwargs):
+    started = time.perf_counter()
+    try:
+        r = await client.request(method, url, **kwargs)
+    except Exception as e:
+        stats.record(endpoint, started, type(e).__name__, False)
+        return None
+    stats.record(endpoint, started, r.status_code, r.status_code < 400)
+    return r
+
+
+async def run_device(device, client, stats, args, heartbeat, poll, deadline):
+    from backend import telemetry_codec
+    prefix = args.prefix
+    loop = asyncio.get_running_loop()
+    # Random phase per device, then fixed-rate schedules like the firmware's millis() checks
+    next_beat = loop.time() + device.rnd.uniform(0, heartbeat)
+    next_poll = loop.time() + device.rnd.uniform(0, poll)
+    while True:
+        due = min(next_beat, next_poll)
+        if due >= deadline:
+            return
+        await asyncio.sleep(max(0.0, due - loop.time()))
+        stats.lag.append(max(0.0, loop.time() - due))
+        if due == next_beat:
+            next_beat += heartbeat
+            reading = device.reading()
+            url = f"{prefix}/hardware/{device.hardware_id}/telemetry"
+            params = None if args.separate_polls else {"commands": 1}
+            if args.binary:
+                r = await request(client, stats, "telemetry", "POST", url, params=params,
+                                  content=telemetry_codec.encode([reading]),
+                                  headers={"Content-Type": telemetry_codec.CONTENT_TYPE})
+            else:
+                r = await request(client, stats, "telemetry", "POST", url, params=params, json=reading)
+            if args.separate_polls or r is None or r.status_code != 200:
+                continue
+            next_poll = loop.time() + poll
+        else:
+            next_poll += poll
+            r = await request(client, stats, "commands", "GET", f"{prefix}/hardware/{device.hardware_id}/commands")
+        try:
+            commands = r.json().get("commands", []) if r is not None and r.status_code == 200 else []
+        except ValueError:
+            commands = []
+        if commands:
+            await request(client, stats, "ack", "POST", f"{prefix}/hardware/{device.hardware_id}/commands/ack",
+                          json={"ids": [cmd["id"] for cmd in commands]})
+
+
+def report(stats, args, heartbeat, poll, elapsed):
+    endpoints = {}
+    for endpoint, values in sorted(stats.latency.items()):
+        values.sort()
+        n = len(values)
+        endpoints[endpoint] = {
+            "requests": n,
+            "throughput_rps": round(n / elapsed, 1),
+            "p50_ms": _ms(percentile(values, 50)),
+            "p95_ms": _ms(percentile(values, 95)),
+            "p99_ms": _ms(percentile(values, 99)),
+            "max_ms": _ms(values[-1]),
+            "error_rate": round(stats.errors[endpoint] / n, 4),
+            "status": dict(stats.status[endpoint]),
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    lag = sorted(stats.lag)
+    return {
+        "config": {
+            "target": args.base or "in-process",
+            "devices": args.devices,
+            "duration_s": args.duration,
+            "speedup": args.speedup,
+            "heartbeat_s": heartbeat,
+            "command_poll_s": poll,
+            "encoding": "binary" if args.binary else "json",
+            "piggyback_commands": not args.separate_polls,
+            "max_connections": args.max_connections,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "error_rate": round(sum(stats.errors.values()) / total, 4) if total else None,
+        "endpoints": endpoints,
+        "schedule_lag_ms": {"p50": _ms(percentile(lag, 50)), "p99": _ms(percentile(lag, 99)), "max": _ms(lag[-1] if lag else None)},
+    }
+
+
+async def main_async(args):
+    heartbeat, poll = firmware_intervals()
+    heartbeat /= args.speedup
+    poll /= args.speedup
+    rnd = random.Random(args.seed)
+    devices = [Device(f"{args.id_prefix}{i:05d}", random.Random(rnd.random())) for i in range(args.devices)]
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+
+    async def drive(client):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        deadline = loop.time() + args.duration
+        await asyncio.gather(*(run_device(d, client, stats, args, heartbeat, poll, deadline) for d in devices))
+        return time.perf_counter() - started
+
+    if args.base:
+        async with httpx.AsyncClient(base_url=args.base, limits=limits, timeout=args.timeout) as client:
+            elapsed = await drive(client)
+    else:
+        from backend import server_gashis
+        # lifespan runs the app's startup/shutdown handlers (buffer flush, background loops)
+        async with server_gashis.app.router.lifespan_context(server_gashis.app):
+            transport = httpx.ASGITransport(app=server_gashis.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://fleet", limits=limits, timeout=args.timeout) as client:
+                elapsed = await drive(client)
+    return report(stats, args, heartbeat, poll, elapsed)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--base", help="server URL (e.g. http://127.0.0.1:8000); default: server_gashis in-process")
+    ap.add_argument("--prefix", default="", help="path prefix in front of /hardware (e.g. /api behind the proxy)")
+    ap.add_argument("--devices", type=int, default=1000)
+    ap.add_argument("--duration", type=float, default=60.0, help="seconds")
+    ap.add_argument("--speedup", type=float, default=1.0, help="divide the firmware intervals by this")
+    ap.add_argument("--binary", action="store_true", help="send telemetry in the binary encoding")
+    ap.add_argument("--separate-polls", action="store_true", help="telemetry without ?commands=1 (old firmware behaviour)")
+    ap.add_argument("--max-connections", type=int, default=200)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--id-prefix", default="LOAD-", help="hardware_id prefix of the simulated devices")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--output", help="also write the JSON report to this file")
+    args = ap.parse_args()
+
+    result = asyncio.run(main_async(args))
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()